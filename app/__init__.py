@@ -1 +1,5 @@
-# This file makes the app directory a Python package 
\ No newline at end of file
+# This file makes the app directory a Python package
+import time
+
+# Start of the app's imports, for the startup time each worker reports
+STARTED = time.perf_counter()
@@ -0,0 +1,280 @@
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, NamedTuple, Optional, Tuple
+
+from . import metrics
+from .jobs import EXTRACTION_WORKERS
+
+# Limit concurrent requests and per-client request rates by route class (see ROUTE_CLASS_LIMITS)
+ADMISSION_CONTROL_ENABLED = os.getenv("ADMISSION_CONTROL_ENABLED", "true").lower() == "true"
+# Clients whose token buckets and in-flight counts are kept, least recently seen dropped first
+ADMISSION_MAX_CLIENTS = int(os.getenv("ADMISSION_MAX_CLIENTS", "10000"))
+
+# Never limited, so health checks and scrapes get through an overload
+EXEMPT_PATHS = {"/", "/metrics"}
+
+class RouteClassLimits(NamedTuple):
+    concurrency: int  # requests served at once by this worker (0 = unlimited)
+    queue: int  # requests waiting for a slot beyond that; more are answered 503 at once
+    queue_timeout: float  # seconds a request waits for a slot before 503
+    client_concurrency: int  # requests of one client served or queued at once (0 = unlimited); more get 429
+    rate: float  # requests per second per client (0 = no rate limit); more get 429
+    burst: int  # requests a client may send at once before rate applies
+
+def _limits(name: str, concurrency: int, queue: int, queue_timeout: float, client_concurrency: int,
+            rate: float, burst: int) -> RouteClassLimits:
+    """Limits of a route class, each overridable as ADMISSION_<NAME>_<SETTING>."""
+    prefix = f"ADMISSION_{name.upper()}_"
+    limits = RouteClassLimits(
+        concurrency=int(os.getenv(prefix + "CONCURRENCY", str(concurrency))),
+        queue=int(os.getenv(prefix + "QUEUE", str(queue))),
+        queue_timeout=float(os.getenv(prefix + "QUEUE_TIMEOUT", str(queue_timeout))),
+        client_concurrency=int(os.getenv(prefix + "CLIENT_CONCURRENCY", str(client_concurrency))),
+        rate=float(os.getenv(prefix + "RATE", str(rate))),
+        burst=int(os.getenv(prefix + "BURST", str(burst))),
+    )
+    if limits.rate < 0:
+        raise ValueError(f"{prefix}RATE must not be negative, got {limits.rate}")
+    # A bucket holding less than one token never admits a request, so fail at startup instead
+    if limits.rate > 0 and limits.burst < 1:
+        raise ValueError(f"{prefix}BURST must be at least 1 when {prefix}RATE is set, got {limits.burst}")
+    return limits
+
+# Route class -> limits. Uploads run OCR and are capped at the extraction workers, so they cannot take
+# the CPU from cheap reads; exports hold a connection for the whole download.
+ROUTE_CLASS_LIMITS: Dict[str, RouteClassLimits] = {
+    "upload": _limits("upload", concurrency=EXTRACTION_WORKERS, queue=4 * EXTRACTION_WORKERS, queue_timeout=30,
+                      client_concurrency=max(1, EXTRACTION_WORKERS // 2), rate=2, burst=10),
+    "export": _limits("export", concurrency=4, queue=8, queue_timeout=10, client_concurrency=1, rate=0.5, burst=3),
+    "default": _limits("default", concurrency=200, queue=400, queue_timeout=5, client_concurrency=0, rate=0, burst=0),
+}
+
+admission_requests_total = metrics.Counter(
+    "admission_requests_total",
+    "Requests by route class and admission result: admitted, rate_limited, client_limited, queue_full or queue_timeout",
+    ("route_class", "result")
+)
+admission_in_flight = metrics.Gauge(
+    "admission_in_flight", "Admitted requests being served, by route class", ("route_class",)
+)
+admission_queued = metrics.Gauge(
+    "admission_queued", "Requests waiting for a slot, by route class", ("route_class",)
+)
+admission_queue_wait_seconds = metrics.Histogram(
+    "admission_queue_wait_seconds", "Time admitted requests waited for a slot", ("route_class",)
+)
+
+def route_class(path: str) -> Optional[str]:
+    """Route class of a request, or None if it is exempt from admission control."""
+    if path in EXEMPT_PATHS:
+        return None
+    if path.startswith("/upload"):
+        return "upload"
+    if path.endswith("/export"):
+        return "export"
+    return "default"
+
+class Rejected(Exception):
+    """Raised when a request is not admitted; carries the status, reason and seconds for Retry-After."""
+
+    def __init__(self, status_code: int, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+class TokenBucket:
+    """rate tokens per second up to burst; each request takes one."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """0 if a token was taken, else seconds until one is available."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+class ConcurrencyLimiter:
+    """
+    At most `limit` holders at a time, the rest waiting in FIFO order in a bounded queue.
+    Used from the event loop only, so it needs no lock.
+    """
+
+    def __init__(self, name: str, limit: int, queue: int, queue_timeout: float):
+        self.name = name
+        self.limit = limit
+        self.queue = queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    async def acquire(self):
+        if self.limit <= 0:
+            return
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return
+        retry_after = max(1.0, self.queue_timeout)
+        if len(self._waiters) >= self.queue:
+            raise Rejected(503, "queue_full", retry_after)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        admission_queued.inc(self.name)
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as the wait ran out: give it to the next request
+                self.release()
+            else:
+                waiter.cancel()
+            raise Rejected(503, "queue_timeout", retry_after)
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                waiter.cancel()
+            raise
+        finally:
+            admission_queued.dec(self.name)
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+        admission_queue_wait_seconds.observe(time.perf_counter() - started, self.name)
+
+    def release(self):
+        if self.limit <= 0:
+            return
+        # Hand the slot straight to the first waiter still waiting, so active never drops below the queue
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+class AdmissionController:
+    """Per route class: a concurrency limiter with a queue, and per client a token bucket and an in-flight count."""
+
+    def __init__(self, limits: Dict[str, RouteClassLimits], max_clients: int):
+        self.limits = limits
+        self.max_clients = max_clients
+        self.limiters = {
+            name: ConcurrencyLimiter(name, class_limits.concurrency, class_limits.queue, class_limits.queue_timeout)
+            for name, class_limits in limits.items()
+        }
+        # (route class, client) -> [token bucket or None, requests in flight]
+        self._clients: "OrderedDict[Tuple[str, str], list]" = OrderedDict()
+
+    def _client_state(self, name: str, client: str) -> list:
+        key = (name, client)
+        state = self._clients.get(key)
+        if state is None:
+            class_limits = self.limits[name]
+            bucket = TokenBucket(class_limits.rate, class_limits.burst) if class_limits.rate > 0 else None
+            state = self._clients[key] = [bucket, 0]
+            # Forget the least recently seen clients, oldest first and one step per excess entry (usually one);
+            # a client with requests in flight is moved to the end instead and dropped on a later pass
+            for _ in range(len(self._clients) - self.max_clients):
+                stale_key, stale_state = next(iter(self._clients.items()))
+                if stale_state[1]:
+                    self._clients.move_to_end(stale_key)
+                else:
+                    self._clients.popitem(last=False)
+        else:
+            self._clients.move_to_end(key)
+        return state
+
+    async def admit(self, name: str, client: str):
+        """Wait for admission or raise Rejected; every admitted request must be released."""
+        class_limits = self.limits[name]
+        state = self._client_state(name, client)
+        bucket = state[0]
+        if bucket is not None:
+            wait = bucket.take()
+            if wait > 0:
+                raise Rejected(429, "rate_limited", wait)
+        if class_limits.client_concurrency > 0 and state[1] >= class_limits.client_concurrency:
+            raise Rejected(429, "client_limited", 1.0)
+        state[1] += 1
+        try:
+            await self.limiters[name].acquire()
+        except BaseException:
+            state[1] -= 1
+            raise
+
+    def release(self, name: str, client: str):
+        self.limiters[name].release()
+        state = self._clients.get((name, client))
+        if state is not None:
+            state[1] -= 1
+
+admission_controller = AdmissionController(ROUTE_CLASS_LIMITS, ADMISSION_MAX_CLIENTS)
+
+class AdmissionControlMiddleware:
+    """
+    ASGI middleware that admits requests by route class before the app reads their body.
+    Clients over their rate or concurrency get 429; requests that cannot get a slot within the queue timeout,
+    or find the queue full, get 503. Both carry Retry-After.
+    """
+
+    def __init__(self, app, controller: AdmissionController = admission_controller):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        name = route_class(scope["path"]) if scope["type"] == "http" else None
+        if name is None or not ADMISSION_CONTROL_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        client = scope["client"][0] if scope.get("client") else "unknown"
+        try:
+            await self.controller.admit(name, client)
+        except Rejected as e:
+            admission_requests_total.inc(name, e.reason)
+            await self._reject(send, e)
+            return
+
+        admission_requests_total.inc(name, "admitted")
+        admission_in_flight.inc(name)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            admission_in_flight.dec(name)
+            self.controller.release(name, client)
+
+    async def _reject(self, send, rejected: Rejected):
+        if rejected.status_code == 429:
+            detail = "Too many requests, please retry later"
+        else:
+            detail = "Server is busy, please retry later"
+        body = f'{{"detail":"{detail}"}}'.encode()
+        await send({
+            "type": "http.response.start",
+            "status": rejected.status_code,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(math.ceil(rejected.retry_after)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+metrics.CallbackMetric(
+    "admission_concurrency_limit", "Requests a route class serves at once (0 = unlimited)",
+    lambda: {(name,): limiter.limit for name, limiter in admission_controller.limiters.items()},
+    labels=("route_class",)
+)
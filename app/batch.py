@@ -0,0 +1,132 @@
+import asyncio
+import os
+import zipfile
+from functools import partial
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from fastapi import UploadFile
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from . import crud, schemas
+from .jobs import job_queue, EXTRACTION_WORKERS
+from .uploads import spool_to_file, check_pdf, remove_file, MAX_UPLOAD_SIZE
+
+# Documents extracted at the same time within one batch upload
+BATCH_UPLOAD_CONCURRENCY = int(os.getenv("BATCH_UPLOAD_CONCURRENCY", str(EXTRACTION_WORKERS)))
+# Maximum number of PDFs (including ZIP members) per batch upload
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "500"))
+
+class BatchTooLargeError(Exception):
+    """Raised when a batch upload contains more documents than allowed."""
+
+# (display name, spooler returning a temporary PDF path or None, error when the document is skipped)
+Document = Tuple[str, Optional[Callable[[], str]], Optional[str]]
+
+def _spool_upload(file: UploadFile) -> str:
+    file.file.seek(0)
+    return spool_to_file(file.file)
+
+def _spool_member(archive: zipfile.ZipFile, info: zipfile.ZipInfo) -> str:
+    with archive.open(info) as member:
+        return spool_to_file(member)
+
+def iter_documents(files: List[UploadFile], archives: List[zipfile.ZipFile]) -> Iterator[Document]:
+    """
+    Yield one lazy spooler per PDF in the uploaded files.
+    ZIP members are streamed to their own temporary files one by one, never as a whole archive.
+    """
+    for file in files:
+        name = file.filename or "upload"
+        if name.lower().endswith(".zip"):
+            try:
+                archive = zipfile.ZipFile(file.file)
+            except zipfile.BadZipFile as e:
+                yield name, None, f"Invalid ZIP archive: {str(e)}"
+                continue
+            archives.append(archive)
+            for info in archive.infolist():
+                if info.is_dir():
+                    continue
+                member_name = f"{name}/{info.filename}"
+                if not info.filename.lower().endswith(".pdf"):
+                    yield member_name, None, "Only PDF files are allowed"
+                    continue
+                if info.file_size > MAX_UPLOAD_SIZE:
+                    yield member_name, None, f"File is larger than {MAX_UPLOAD_SIZE} bytes"
+                    continue
+                yield member_name, partial(_spool_member, archive, info), None
+        elif name.lower().endswith(".pdf"):
+            yield name, partial(_spool_upload, file), None
+        else:
+            yield name, None, "Only PDF and ZIP files are allowed"
+
+async def process_batch(db: Session, files: List[UploadFile]) -> schemas.BatchUploadResult:
+    """Extract every PDF concurrently, then create all orders in one transaction."""
+    archives: List[zipfile.ZipFile] = []
+    try:
+        documents = list(iter_documents(files, archives))
+        if len(documents) > BATCH_MAX_FILES:
+            raise BatchTooLargeError(f"At most {BATCH_MAX_FILES} documents are allowed per batch")
+
+        semaphore = asyncio.Semaphore(BATCH_UPLOAD_CONCURRENCY)
+
+        async def extract(spool: Callable[[], str]):
+            async with semaphore:
+                pdf_path = None
+                try:
+                    pdf_path = await run_in_threadpool(spool)
+                    await run_in_threadpool(check_pdf, pdf_path)
+                    return await job_queue.extract(pdf_path), None
+                except Exception as e:
+                    return None, str(e)
+                finally:
+                    remove_file(pdf_path)
+
+        outcomes = await asyncio.gather(*(
+            extract(spool) if spool is not None else _skipped(error)
+            for _, spool, error in documents
+        ))
+    finally:
+        for archive in archives:
+            archive.close()
+
+    results = []
+    orders = []
+    for index, ((name, _, _), (patient_info, error)) in enumerate(zip(documents, outcomes)):
+        if patient_info is None:
+            results.append(schemas.BatchFileResult(
+                filename=name,
+                status="failed",
+                error=error or "Could not extract patient information from PDF"
+            ))
+            continue
+        results.append(schemas.BatchFileResult(filename=name, status="created", patient_info=patient_info))
+        orders.append((index, schemas.OrderCreate(
+            first_name=patient_info.first_name,
+            last_name=patient_info.last_name,
+            date_of_birth=patient_info.date_of_birth
+        )))
+
+    if orders:
+        for created in await run_in_threadpool(crud.bulk_create_orders, db, orders, True):
+            result = results[created.index]
+            if created.status in ("created", "existing"):
+                result.status = created.status
+                result.order_id = created.id
+            else:
+                result.status = "failed"
+                result.error = created.error or "Not saved because another document in the batch failed"
+
+    created_count = sum(1 for result in results if result.status == "created")
+    existing_count = sum(1 for result in results if result.status == "existing")
+    return schemas.BatchUploadResult(
+        total=len(results),
+        created=created_count,
+        existing=existing_count,
+        failed=len(results) - created_count - existing_count,
+        results=results
+    )
+
+async def _skipped(error: str):
+    return None, error
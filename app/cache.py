@@ -0,0 +1,376 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Hashable, Iterable, Optional, Tuple, Union
+
+from .database import SessionLocal
+from . import crud, metrics, schemas
+
+# Extraction cache settings
+EXTRACTION_CACHE_ENABLED = os.getenv("EXTRACTION_CACHE_ENABLED", "true").lower() == "true"
+EXTRACTION_CACHE_SIZE = int(os.getenv("EXTRACTION_CACHE_SIZE", "1024"))  # in-process entries
+EXTRACTION_CACHE_DB_SIZE = int(os.getenv("EXTRACTION_CACHE_DB_SIZE", "100000"))  # persisted entries
+EXTRACTION_CACHE_TTL = int(os.getenv("EXTRACTION_CACHE_TTL", str(7 * 24 * 3600)))  # seconds
+# Prune the persistent tier after this many writes
+EXTRACTION_CACHE_PRUNE_EVERY = 100
+
+# Order response cache settings (GET /orders/{id})
+ORDER_CACHE_ENABLED = os.getenv("ORDER_CACHE_ENABLED", "true").lower() == "true"
+ORDER_CACHE_BACKEND = os.getenv("ORDER_CACHE_BACKEND", "memory")  # memory or redis
+ORDER_CACHE_SIZE = int(os.getenv("ORDER_CACHE_SIZE", "10000"))  # entries, memory backend only
+ORDER_CACHE_TTL = int(os.getenv("ORDER_CACHE_TTL", "60"))  # seconds; also bounds staleness after a lost invalidation
+ORDER_CACHE_REDIS_URL = os.getenv("ORDER_CACHE_REDIS_URL", "redis://localhost:6379/0")
+# Workers serving the app; set by app.server. The memory backend cannot see other workers' invalidations.
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+
+class LRUCache:
+    """Thread-safe in-process LRU cache with optional TTL and hit/miss counters."""
+
+    def __init__(self, max_size: int, ttl: Optional[float] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                self.evictions += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+def content_hash(pdf: Union[bytes, str]) -> str:
+    """SHA-256 hex digest of uploaded file content (bytes or a file path, read in chunks)."""
+    if isinstance(pdf, (bytes, bytearray)):
+        return hashlib.sha256(pdf).hexdigest()
+    digest = hashlib.sha256()
+    with open(pdf, "rb") as pdf_file:
+        for chunk in iter(lambda: pdf_file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class ExtractionCache:
+    """
+    Two-tier cache of extracted patient information keyed by PDF content hash.
+    Lookups try the in-process LRU first and then the extraction_cache table.
+    """
+
+    def __init__(self, max_size: int, db_max_size: int, ttl: int):
+        self.memory = LRUCache(max_size=max_size, ttl=ttl)
+        self.db_max_size = db_max_size
+        self.ttl = ttl
+        self.db_hits = 0
+        self._writes = 0
+
+    def get(self, key: str) -> Optional[schemas.PatientInfo]:
+        patient_info = self.memory.get(key)
+        if patient_info is not None:
+            return patient_info
+
+        db = SessionLocal()
+        try:
+            db_entry = crud.get_extraction_cache_entry(db, key)
+            if db_entry is None:
+                return None
+            if db_entry.created_at < datetime.utcnow() - timedelta(seconds=self.ttl):
+                crud.delete_extraction_cache_entry(db, key)
+                return None
+            patient_info = schemas.PatientInfo(
+                first_name=db_entry.first_name,
+                last_name=db_entry.last_name,
+                date_of_birth=db_entry.date_of_birth
+            )
+            crud.touch_extraction_cache_entry(db, db_entry)
+        except Exception as e:
+            print(f"Error reading extraction cache: {str(e)}")
+            return None
+        finally:
+            db.close()
+
+        self.db_hits += 1
+        self.memory.set(key, patient_info)
+        return patient_info
+
+    def set(self, key: str, patient_info: schemas.PatientInfo):
+        self.memory.set(key, patient_info)
+
+        db = SessionLocal()
+        try:
+            crud.upsert_extraction_cache_entry(db, key, patient_info)
+            self._writes += 1
+            if self._writes % EXTRACTION_CACHE_PRUNE_EVERY == 0:
+                crud.prune_extraction_cache(
+                    db,
+                    max_entries=self.db_max_size,
+                    expired_before=datetime.utcnow() - timedelta(seconds=self.ttl)
+                )
+        except Exception as e:
+            print(f"Error writing extraction cache: {str(e)}")
+        finally:
+            db.close()
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.memory.stats()
+        # Persistent-tier hits were counted as in-memory misses
+        stats["hits"] += self.db_hits
+        stats["misses"] -= self.db_hits
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+extraction_cache = ExtractionCache(
+    max_size=EXTRACTION_CACHE_SIZE,
+    db_max_size=EXTRACTION_CACHE_DB_SIZE,
+    ttl=EXTRACTION_CACHE_TTL
+)
+
+class MemoryCacheBackend:
+    """
+    Per-process backend on top of LRUCache; each worker keeps its own copy, so it is only safe with one worker.
+    Generations come from one increasing sequence. An id whose generation was dropped to bound memory reads as
+    the newest dropped one, which is still later than any generation handed out before its last invalidation.
+    """
+    shared = False
+
+    def __init__(self, max_size: int, ttl: int):
+        self.cache = LRUCache(max_size=max_size, ttl=ttl)
+        self.max_generations = max_size
+        self._generations: "OrderedDict[str, int]" = OrderedDict()
+        self._sequence = 0
+        self._floor = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.cache.get(key)
+
+    def set(self, key: str, value: bytes):
+        self.cache.set(key, value)
+
+    def generation(self, key: str) -> int:
+        with self._lock:
+            return self._generations.get(key, self._floor)
+
+    def set_if_generation(self, key: str, value: bytes, generation: int):
+        with self._lock:
+            if self._generations.get(key, self._floor) == generation:
+                self.cache.set(key, value)
+
+    def delete(self, keys: Iterable[str]):
+        with self._lock:
+            for key in keys:
+                self._sequence += 1
+                self._generations[key] = self._sequence
+                self._generations.move_to_end(key)
+                self.cache.delete(key)
+            while len(self._generations) > self.max_generations:
+                _, self._floor = self._generations.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        return self.cache.stats()
+
+class RedisCacheBackend:
+    """
+    Backend for any Redis-compatible server, shared by all workers.
+    Errors are logged and treated as misses so the database stays the source of truth.
+    """
+    shared = True
+    # Seconds a generation is kept after its last invalidation; a read must finish within this to be cached
+    GENERATION_TTL = 3600
+    # Set the value only if the generation has not moved since the read began (a missing generation is "0")
+    SET_IF_GENERATION = """
+    if (redis.call('get', KEYS[2]) or '0') == ARGV[2] then
+        redis.call('set', KEYS[1], ARGV[1], 'EX', ARGV[3])
+        return 1
+    end
+    return 0
+    """
+
+    def __init__(self, url: str, ttl: int, prefix: str = "genhealth:"):
+        import redis  # optional dependency, only needed for this backend
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5)
+        self.ttl = ttl
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+        self._set_if_generation = self.client.register_script(self.SET_IF_GENERATION)
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            value = self.client.get(self.prefix + key)
+        except Exception as e:
+            print(f"Error reading order cache: {str(e)}")
+            value = None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key: str, value: bytes):
+        try:
+            self.client.set(self.prefix + key, value, ex=self.ttl)
+        except Exception as e:
+            print(f"Error writing order cache: {str(e)}")
+
+    def generation(self, key: str) -> Optional[str]:
+        try:
+            value = self.client.get(self.prefix + "generation:" + key)
+        except Exception as e:
+            print(f"Error reading order cache: {str(e)}")
+            return None
+        return value.decode() if value is not None else "0"
+
+    def set_if_generation(self, key: str, value: bytes, generation: Optional[str]):
+        if generation is None:
+            return
+        try:
+            self._set_if_generation(keys=[self.prefix + key, self.prefix + "generation:" + key],
+                                    args=[value, generation, self.ttl])
+        except Exception as e:
+            print(f"Error writing order cache: {str(e)}")
+
+    def delete(self, keys: Iterable[str]):
+        keys = list(keys)
+        if not keys:
+            return
+        try:
+            pipeline = self.client.pipeline()
+            for key in keys:
+                generation_key = self.prefix + "generation:" + key
+                pipeline.incr(generation_key)
+                pipeline.expire(generation_key, self.GENERATION_TTL)
+            pipeline.delete(*[self.prefix + key for key in keys])
+            pipeline.execute()
+        except Exception as e:
+            print(f"Error invalidating order cache: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_ratio": self.hits / lookups if lookups else 0.0}
+
+class OrderCache:
+    """
+    Serialized GET /orders/{id} response bodies with their ETags.
+    Every order write goes through crud, which invalidates the affected ids after committing.
+    Invalidation also bumps the id's generation; a response read from the database is only cached if the
+    generation is unchanged since before the read, so a write that lands in between is not overwritten.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend
+
+    @staticmethod
+    def _key(order_id: int) -> str:
+        return f"order:{order_id}"
+
+    @staticmethod
+    def etag(body: bytes) -> str:
+        return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+    def get(self, order_id: int) -> Optional[Tuple[str, bytes]]:
+        """(etag, body) of a cached response, or None."""
+        if self.backend is None:
+            return None
+        value = self.backend.get(self._key(order_id))
+        if value is None:
+            return None
+        etag, body = value.split(b" ", 1)
+        return etag.decode(), body
+
+    def generation(self, order_id: int):
+        """Token to take before reading an order from the database and pass to set."""
+        if self.backend is None:
+            return None
+        return self.backend.generation(self._key(order_id))
+
+    def set(self, order_id: int, body: bytes, generation=None) -> str:
+        """Cache a response body, unless the order was invalidated since generation was taken; returns its ETag."""
+        etag = self.etag(body)
+        if self.backend is not None:
+            self.backend.set_if_generation(self._key(order_id), etag.encode() + b" " + body, generation)
+        return etag
+
+    def invalidate(self, order_ids: Iterable[int]):
+        if self.backend is not None:
+            self.backend.delete([self._key(order_id) for order_id in order_ids])
+
+    def stats(self) -> Dict[str, Any]:
+        if self.backend is None:
+            return {"hits": 0, "misses": 0, "hit_ratio": 0.0}
+        return self.backend.stats()
+
+def _order_cache_backend():
+    if not ORDER_CACHE_ENABLED:
+        return None
+    if ORDER_CACHE_BACKEND == "redis":
+        try:
+            return RedisCacheBackend(ORDER_CACHE_REDIS_URL, ttl=ORDER_CACHE_TTL)
+        except ImportError:
+            print("redis is not installed, using the in-process order cache")
+    if WEB_CONCURRENCY > 1:
+        # Other workers would keep serving orders this one updated or deleted until their entries expire
+        print(f"⚠️ Order cache disabled: the memory backend is per process and WEB_CONCURRENCY is {WEB_CONCURRENCY}; "
+              "set ORDER_CACHE_BACKEND=redis to cache orders across workers")
+        return None
+    return MemoryCacheBackend(max_size=ORDER_CACHE_SIZE, ttl=ORDER_CACHE_TTL)
+
+order_cache = OrderCache(_order_cache_backend())
+
+def _cache_lookups() -> Dict[tuple, int]:
+    values = {}
+    for name, cache in (("extraction", extraction_cache), ("orders", order_cache)):
+        stats = cache.stats()
+        values[(name, "hit")] = stats["hits"]
+        values[(name, "miss")] = stats["misses"]
+    return values
+
+metrics.CallbackMetric(
+    "cache_lookups_total", "Extraction and order cache lookups by result", _cache_lookups,
+    labels=("cache", "result"), type="counter"
+)
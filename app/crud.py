@@ -1,25 +1,210 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, case, func, insert, or_, select, tuple_
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import Session, Query
+from sqlalchemy.sql import Select
 from . import models, schemas
-from datetime import datetime
-from typing import List, Optional
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple, Type, Union
+import base64
+import os
+import sys
+import unicodedata
+
+try:
+    from sqlalchemy.ext.asyncio import AsyncSession
+except ImportError:
+    AsyncSession = Session
+
+# Keyset pagination cursors
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    """Opaque cursor pointing just after the row with this (timestamp, id)."""
+    raw = f"{timestamp.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decode a cursor from encode_cursor; raises ValueError if it is malformed."""
+    try:
+        timestamp, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+def prefix_filter(column, prefix: str):
+    """
+    Case-sensitive prefix match as a range on column, which a btree index on it can serve (LIKE alone cannot
+    on PostgreSQL without text_pattern_ops, and SQLite's LIKE ignores case); the LIKE keeps results exact
+    under non-binary collations. Pass lower(column) and a lowered prefix for a case-insensitive match.
+    """
+    escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    match = (column >= prefix) & column.like(escaped + "%", escape="\\")
+    if prefix[-1] == chr(sys.maxunicode):
+        # No character sorts after the last one, so there is no upper bound to give
+        return match
+    return match & (column < prefix[:-1] + chr(ord(prefix[-1]) + 1))
+
+def _paginate(query: Union[Query, Select], timestamp_column, id_column, cursor: Optional[str], skip: int, limit: int) -> Union[Query, Select]:
+    """Order by (timestamp, id) and continue after the cursor row."""
+    if cursor:
+        timestamp, row_id = decode_cursor(cursor)
+        query = query.filter(tuple_(timestamp_column, id_column) > tuple_(timestamp, row_id))
+    query = query.order_by(timestamp_column, id_column)
+    if skip:
+        query = query.offset(skip)
+    return query.limit(limit)
+
+# What creating an order for a patient who already has one does:
+# upsert returns the existing order, reject raises DuplicatePatientError, allow creates another order
+DUPLICATE_PATIENT_MODE = os.getenv("DUPLICATE_PATIENT_MODE", "upsert")
+# Only orders created within this many seconds count as duplicates (0 = any age). Short by default:
+# it is meant to catch a re-sent fax, not to stop a patient from ever getting another order.
+DUPLICATE_PATIENT_WINDOW = int(os.getenv("DUPLICATE_PATIENT_WINDOW", "300"))
+
+class DuplicatePatientError(Exception):
+    """Raised in reject mode when the patient already has an order."""
+
+    def __init__(self, order_id: int):
+        super().__init__(f"Patient already has order {order_id}")
+        self.order_id = order_id
+
+# Patient identity
+def _normalize_name(name: str) -> str:
+    """Case-, accent-, space- and punctuation-insensitive form of a name."""
+    return "".join(char for char in unicodedata.normalize("NFKD", name) if char.isalnum()).casefold()
+
+def patient_key(first_name: str, last_name: str, date_of_birth: datetime) -> str:
+    return f"{_normalize_name(last_name)}|{_normalize_name(first_name)}|{date_of_birth:%Y-%m-%d}"
+
+def _patient_query(db: Session, key: str) -> Query:
+    # FOR UPDATE serializes concurrent creates for the same patient on PostgreSQL
+    return db.query(models.Patient).filter(models.Patient.patient_key == key).with_for_update()
+
+def get_or_create_patient(db: Session, key: str) -> models.Patient:
+    """
+    Find or insert the patient row for a key, locked until the transaction ends.
+    A concurrent insert of the same key fails on the unique index and reads the winner's row instead.
+    """
+    patient = _patient_query(db, key).first()
+    if patient is not None:
+        return patient
+    try:
+        with db.begin_nested():
+            patient = models.Patient(patient_key=key)
+            db.add(patient)
+        return patient
+    except IntegrityError:
+        return _patient_query(db, key).one()
+
+def _duplicate_cutoff() -> Optional[datetime]:
+    if DUPLICATE_PATIENT_WINDOW > 0:
+        return datetime.utcnow() - timedelta(seconds=DUPLICATE_PATIENT_WINDOW)
+    return None
+
+def latest_patient_order(db: Session, patient_id: int) -> Optional[models.Order]:
+    """Newest order of a patient that still counts as a duplicate target."""
+    query = db.query(models.Order).filter(models.Order.patient_id == patient_id)
+    cutoff = _duplicate_cutoff()
+    if cutoff is not None:
+        query = query.filter(models.Order.created_at >= cutoff)
+    return query.order_by(models.Order.created_at.desc(), models.Order.id.desc()).first()
+
+def _add_order(db: Session, order: schemas.OrderCreate) -> Tuple[models.Order, bool]:
+    """
+    Add an order linked to its patient without committing; returns (order, created).
+    In upsert mode an existing order of the patient is returned instead of adding one.
+    """
+    patient = get_or_create_patient(db, patient_key(order.first_name, order.last_name, order.date_of_birth))
+    if DUPLICATE_PATIENT_MODE != "allow":
+        existing = latest_patient_order(db, patient.id)
+        if existing is not None:
+            if DUPLICATE_PATIENT_MODE == "reject":
+                raise DuplicatePatientError(existing.id)
+            return existing, False
+    db_order = models.Order(**order.dict(), patient_id=patient.id)
+    db.add(db_order)
+    return db_order, True
 
 # Order CRUD operations
+def _invalidate_cached_orders(order_ids):
+    """Drop cached GET /orders/{id} responses once a write has been committed."""
+    from .cache import order_cache  # cache imports crud
+    order_cache.invalidate(order_ids)
+
 def create_order(db: Session, order: schemas.OrderCreate) -> models.Order:
-    db_order = models.Order(
-        first_name=order.first_name,
-        last_name=order.last_name,
-        date_of_birth=order.date_of_birth
-    )
-    db.add(db_order)
-    db.commit()
-    db.refresh(db_order)
-    return db_order
+    """Create an order, or apply DUPLICATE_PATIENT_MODE when the patient already has one."""
+    return create_or_get_order(db, order)[0]
+
+def create_or_get_order(db: Session, order: schemas.OrderCreate) -> Tuple[models.Order, bool]:
+    """Like create_order, returning (order, created); created is False when the patient's existing order is returned."""
+    try:
+        db_order, created = _add_order(db, order)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    if created:
+        db.refresh(db_order)
+        _invalidate_cached_orders([db_order.id])
+    return db_order, created
 
 def get_order(db: Session, order_id: int) -> Optional[models.Order]:
     return db.query(models.Order).filter(models.Order.id == order_id).first()
 
-def get_orders(db: Session, skip: int = 0, limit: int = 100) -> List[models.Order]:
-    return db.query(models.Order).offset(skip).limit(limit).all()
+def get_orders(
+    db: Session,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    last_name: Optional[str] = None,
+    columns: Optional[list] = None
+) -> List[models.Order]:
+    """
+    Orders in (created_at, id) order; pass the cursor of the last row to get the next page.
+    With columns, rows of just those columns (e.g. ORDER_RESPONSE_COLUMNS) instead of Order objects.
+    """
+    query = filter_orders(db.query(*(columns or [models.Order])), created_from, created_to, last_name)
+    return _paginate(query, models.Order.created_at, models.Order.id, cursor, skip, limit).all()
+
+def filter_orders(
+    query: Union[Query, Select],
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    last_name: Optional[str] = None
+) -> Union[Query, Select]:
+    """Apply order filters to an ORM query or a select() statement."""
+    if created_from:
+        query = query.filter(models.Order.created_at >= created_from)
+    if created_to:
+        query = query.filter(models.Order.created_at < created_to)
+    if last_name:
+        # Case-insensitive like /orders/search (for ASCII letters only on SQLite, whose lower() folds nothing else),
+        # and served by the same lower(last_name) index
+        query = query.filter(prefix_filter(func.lower(models.Order.last_name), last_name.lower()))
+    return query
+
+# Columns of schemas.Order in its field order, for list responses serialized straight from rows
+ORDER_RESPONSE_FIELDS = list(schemas.Order.__fields__)
+ORDER_RESPONSE_COLUMNS = [getattr(models.Order, field) for field in ORDER_RESPONSE_FIELDS]
+
+ORDER_EXPORT_COLUMNS = [
+    models.Order.id,
+    models.Order.first_name,
+    models.Order.last_name,
+    models.Order.date_of_birth,
+    models.Order.created_at,
+    models.Order.updated_at,
+]
+
+def iter_orders(db: Session, batch_size: int = 1000, **filters) -> Iterator[tuple]:
+    """Stream order rows as plain tuples from a server-side cursor."""
+    query = filter_orders(db.query(*ORDER_EXPORT_COLUMNS), **filters)
+    return query.order_by(models.Order.created_at, models.Order.id).yield_per(batch_size)
+
+def order_cursor(order: models.Order) -> str:
+    return encode_cursor(order.created_at, order.id)
+
+PATIENT_FIELDS = {"first_name", "last_name", "date_of_birth"}
 
 def update_order(db: Session, order_id: int, order: schemas.OrderUpdate) -> Optional[models.Order]:
     db_order = db.query(models.Order).filter(models.Order.id == order_id).first()
@@ -27,9 +212,14 @@ def update_order(db: Session, order_id: int, order: schemas.OrderUpdate) -> Opti
         update_data = order.dict(exclude_unset=True)
         for field, value in update_data.items():
             setattr(db_order, field, value)
+        if update_data.keys() & PATIENT_FIELDS and None not in update_data.values():
+            db_order.patient_id = get_or_create_patient(
+                db, patient_key(db_order.first_name, db_order.last_name, db_order.date_of_birth)
+            ).id
         db_order.updated_at = datetime.utcnow()
         db.commit()
         db.refresh(db_order)
+        _invalidate_cached_orders([order_id])
     return db_order
 
 def delete_order(db: Session, order_id: int) -> bool:
@@ -37,25 +227,596 @@ def delete_order(db: Session, order_id: int) -> bool:
     if db_order:
         db.delete(db_order)
         db.commit()
+        _invalidate_cached_orders([order_id])
         return True
     return False
 
 # Activity Log CRUD operations
 def create_activity_log(db: Session, activity_log: schemas.ActivityLogCreate) -> models.ActivityLog:
-    db_activity_log = models.ActivityLog(
-        order_id=activity_log.order_id,
-        action=activity_log.action,
-        endpoint=activity_log.endpoint,
-        method=activity_log.method,
-        details=activity_log.details
-    )
+    db_activity_log = models.ActivityLog(**activity_log.dict())
     db.add(db_activity_log)
     db.commit()
     db.refresh(db_activity_log)
     return db_activity_log
 
-def get_activity_logs(db: Session, skip: int = 0, limit: int = 100) -> List[models.ActivityLog]:
-    return db.query(models.ActivityLog).offset(skip).limit(limit).all()
+def create_activity_logs(db: Session, activity_logs: List[dict]) -> int:
+    """Insert many activity log rows in a single transaction without reloading them."""
+    db.bulk_insert_mappings(models.ActivityLog, activity_logs)
+    db.commit()
+    return len(activity_logs)
+
+def get_activity_logs(
+    db: Session,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    action: Optional[str] = None,
+    method: Optional[str] = None,
+    endpoint: Optional[str] = None,
+    columns: Optional[list] = None
+) -> List[models.ActivityLog]:
+    """
+    Activity logs in (timestamp, id) order; pass the cursor of the last row to get the next page.
+    With columns, rows of just those columns (e.g. ACTIVITY_LOG_RESPONSE_COLUMNS) instead of ActivityLog objects.
+    """
+    query = filter_activity_logs(db.query(*(columns or [models.ActivityLog])), start, end, action, method, endpoint)
+    return _paginate(query, models.ActivityLog.timestamp, models.ActivityLog.id, cursor, skip, limit).all()
+
+def filter_activity_logs(
+    query: Union[Query, Select],
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    action: Optional[str] = None,
+    method: Optional[str] = None,
+    endpoint: Optional[str] = None
+) -> Union[Query, Select]:
+    """Apply activity log filters to an ORM query or a select() statement."""
+    if start:
+        query = query.filter(models.ActivityLog.timestamp >= start)
+    if end:
+        query = query.filter(models.ActivityLog.timestamp < end)
+    if action:
+        query = query.filter(models.ActivityLog.action == action)
+    if method:
+        query = query.filter(models.ActivityLog.method == method.upper())
+    if endpoint:
+        # Paths are case-sensitive, on every backend
+        query = query.filter(prefix_filter(models.ActivityLog.endpoint, endpoint))
+    return query
+
+# Columns of schemas.ActivityLog in its field order, for list responses serialized straight from rows
+ACTIVITY_LOG_RESPONSE_FIELDS = list(schemas.ActivityLog.__fields__)
+ACTIVITY_LOG_RESPONSE_COLUMNS = [getattr(models.ActivityLog, field) for field in ACTIVITY_LOG_RESPONSE_FIELDS]
+
+ACTIVITY_LOG_EXPORT_COLUMNS = [
+    models.ActivityLog.id,
+    models.ActivityLog.order_id,
+    models.ActivityLog.action,
+    models.ActivityLog.endpoint,
+    models.ActivityLog.method,
+    models.ActivityLog.route,
+    models.ActivityLog.timestamp,
+    models.ActivityLog.details,
+    models.ActivityLog.duration_ms,
+    models.ActivityLog.status_code,
+    models.ActivityLog.response_bytes,
+    models.ActivityLog.client,
+]
+
+def iter_activity_logs(db: Session, batch_size: int = 1000, **filters) -> Iterator[tuple]:
+    """Stream activity log rows as plain tuples from a server-side cursor."""
+    query = filter_activity_logs(db.query(*ACTIVITY_LOG_EXPORT_COLUMNS), **filters)
+    return query.order_by(models.ActivityLog.timestamp, models.ActivityLog.id).yield_per(batch_size)
+
+def activity_log_cursor(activity_log: models.ActivityLog) -> str:
+    return encode_cursor(activity_log.timestamp, activity_log.id)
 
 def get_activity_logs_by_order(db: Session, order_id: int) -> List[models.ActivityLog]:
-    return db.query(models.ActivityLog).filter(models.ActivityLog.order_id == order_id).all() 
\ No newline at end of file
+    return db.query(models.ActivityLog).filter(models.ActivityLog.order_id == order_id).all() 
+
+def activity_log_stats_statement(start: datetime, end: datetime, method: Optional[str] = None) -> Select:
+    """
+    Request count, 5xx count and latency percentiles per endpoint and method, computed in the database.
+    Percentiles use the nearest-rank method over row_number() windows so they work on SQLite and PostgreSQL.
+    Rows logged before durations were recorded are skipped; endpoint is the route template when known.
+    """
+    log = models.ActivityLog
+    endpoint = func.coalesce(log.route, log.endpoint)
+    ranked = filter_activity_logs(
+        select(
+            endpoint.label("endpoint"),
+            log.method,
+            log.status_code,
+            log.duration_ms,
+            func.row_number().over(partition_by=(endpoint, log.method), order_by=log.duration_ms).label("position"),
+            func.count().over(partition_by=(endpoint, log.method)).label("total"),
+        ).where(log.duration_ms.isnot(None)),
+        start=start, end=end, method=method
+    ).subquery()
+
+    def percentile(fraction: float):
+        return func.min(case((ranked.c.position >= ranked.c.total * fraction, ranked.c.duration_ms)))
+
+    return (
+        select(
+            ranked.c.endpoint,
+            ranked.c.method,
+            func.count().label("count"),
+            func.sum(case((ranked.c.status_code >= 500, 1), else_=0)).label("errors"),
+            func.avg(ranked.c.duration_ms).label("avg_ms"),
+            percentile(0.5).label("p50_ms"),
+            percentile(0.95).label("p95_ms"),
+            percentile(0.99).label("p99_ms"),
+            func.max(ranked.c.duration_ms).label("max_ms"),
+        )
+        .group_by(ranked.c.endpoint, ranked.c.method)
+        .order_by(func.count().desc(), ranked.c.endpoint, ranked.c.method)
+    )
+
+def get_activity_log_stats(db: Session, start: datetime, end: datetime, method: Optional[str] = None) -> List[dict]:
+    return [dict(row) for row in db.execute(activity_log_stats_statement(start, end, method)).mappings()]
+
+# Activity log rollups and retention
+RollupModel = Union[Type[models.ActivityLogHourlyRollup], Type[models.ActivityLogDailyRollup]]
+
+def replace_activity_log_rollups(db: Session, model: RollupModel, bucket_start: datetime, rows: List[dict]):
+    """Replace the rollup rows of one bucket, so re-running a bucket is idempotent."""
+    db.query(model).filter(model.bucket_start == bucket_start).delete(synchronize_session=False)
+    db.bulk_insert_mappings(model, [dict(row, bucket_start=bucket_start) for row in rows])
+    db.commit()
+
+def latest_rollup_bucket(db: Session, model: RollupModel) -> Optional[datetime]:
+    return db.query(func.max(model.bucket_start)).scalar()
+
+def earliest_activity_log_timestamp(db: Session) -> Optional[datetime]:
+    return db.query(func.min(models.ActivityLog.timestamp)).scalar()
+
+def rollups_statement(
+    model: RollupModel,
+    start: datetime,
+    end: datetime,
+    endpoint: Optional[str] = None,
+    method: Optional[str] = None
+) -> Select:
+    statement = select(model).where(model.bucket_start >= start, model.bucket_start < end)
+    if endpoint:
+        statement = statement.where(model.endpoint == endpoint)
+    if method:
+        statement = statement.where(model.method == method.upper())
+    return statement.order_by(model.bucket_start, model.endpoint, model.method)
+
+def get_activity_log_rollups(db: Session, model: RollupModel, start: datetime, end: datetime,
+                             endpoint: Optional[str] = None, method: Optional[str] = None) -> list:
+    return db.execute(rollups_statement(model, start, end, endpoint, method)).scalars().all()
+
+def delete_activity_logs_before(db: Session, cutoff: datetime, batch_size: int = 10000) -> int:
+    """Delete activity logs older than cutoff in batches so no single transaction holds the table for long."""
+    deleted = 0
+    while True:
+        ids = [row_id for (row_id,) in db.query(models.ActivityLog.id)
+               .filter(models.ActivityLog.timestamp < cutoff)
+               .limit(batch_size)]
+        if not ids:
+            return deleted
+        db.query(models.ActivityLog).filter(models.ActivityLog.id.in_(ids)).delete(synchronize_session=False)
+        db.commit()
+        deleted += len(ids)
+
+def delete_rollups_before(db: Session, model: RollupModel, cutoff: datetime) -> int:
+    deleted = db.query(model).filter(model.bucket_start < cutoff).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+# Extraction Job CRUD operations
+def create_extraction_job(db: Session, job_id: str, filename: Optional[str] = None) -> models.ExtractionJob:
+    db_job = models.ExtractionJob(id=job_id, filename=filename, status="PENDING")
+    db.add(db_job)
+    db.commit()
+    db.refresh(db_job)
+    return db_job
+
+def get_extraction_job(db: Session, job_id: str) -> Optional[models.ExtractionJob]:
+    return db.query(models.ExtractionJob).filter(models.ExtractionJob.id == job_id).first()
+
+def update_extraction_job(db: Session, job_id: str, **fields) -> Optional[models.ExtractionJob]:
+    db_job = get_extraction_job(db, job_id)
+    if db_job:
+        for field, value in fields.items():
+            setattr(db_job, field, value)
+        db_job.updated_at = datetime.utcnow()
+        db.commit()
+        db.refresh(db_job)
+    return db_job
+
+# Extraction Cache CRUD operations
+def get_extraction_cache_entry(db: Session, content_hash: str) -> Optional[models.ExtractionCacheEntry]:
+    return db.query(models.ExtractionCacheEntry).filter(models.ExtractionCacheEntry.content_hash == content_hash).first()
+
+def upsert_extraction_cache_entry(db: Session, content_hash: str, patient_info: schemas.PatientInfo) -> models.ExtractionCacheEntry:
+    db_entry = get_extraction_cache_entry(db, content_hash)
+    if db_entry is None:
+        db_entry = models.ExtractionCacheEntry(content_hash=content_hash)
+        db.add(db_entry)
+    db_entry.first_name = patient_info.first_name
+    db_entry.last_name = patient_info.last_name
+    db_entry.date_of_birth = patient_info.date_of_birth
+    db_entry.created_at = datetime.utcnow()
+    db_entry.last_accessed_at = datetime.utcnow()
+    db.commit()
+    return db_entry
+
+def touch_extraction_cache_entry(db: Session, db_entry: models.ExtractionCacheEntry):
+    db_entry.last_accessed_at = datetime.utcnow()
+    db.commit()
+
+def delete_extraction_cache_entry(db: Session, content_hash: str):
+    db.query(models.ExtractionCacheEntry).filter(models.ExtractionCacheEntry.content_hash == content_hash).delete()
+    db.commit()
+
+def prune_extraction_cache(db: Session, max_entries: int, expired_before: Optional[datetime] = None) -> int:
+    """Delete expired entries and the least recently used ones beyond max_entries."""
+    deleted = 0
+    if expired_before is not None:
+        deleted += db.query(models.ExtractionCacheEntry).filter(
+            models.ExtractionCacheEntry.created_at < expired_before
+        ).delete(synchronize_session=False)
+    overflow = db.query(models.ExtractionCacheEntry).count() - max_entries
+    if overflow > 0:
+        oldest = [row.content_hash for row in db.query(models.ExtractionCacheEntry.content_hash).order_by(
+            models.ExtractionCacheEntry.last_accessed_at
+        ).limit(overflow)]
+        deleted += db.query(models.ExtractionCacheEntry).filter(
+            models.ExtractionCacheEntry.content_hash.in_(oldest)
+        ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+# Idempotency key CRUD operations
+def get_idempotency_key(db: Session, endpoint: str, key: str) -> Optional[models.IdempotencyKey]:
+    return db.query(models.IdempotencyKey).filter(
+        models.IdempotencyKey.endpoint == endpoint, models.IdempotencyKey.key == key
+    ).first()
+
+def claim_idempotency_key(db: Session, endpoint: str, key: str, fingerprint: str,
+                          expires_at: datetime, locked_until: datetime) -> Tuple[bool, models.IdempotencyKey]:
+    """
+    Insert an in-progress row for a key; returns (claimed, row).
+    An expired row, or an in-progress one whose lock has run out, is taken over; any other existing row is returned unclaimed.
+    """
+    now = datetime.utcnow()
+    try:
+        db_key = models.IdempotencyKey(
+            endpoint=endpoint, key=key, fingerprint=fingerprint, locked_until=locked_until, expires_at=expires_at
+        )
+        db.add(db_key)
+        db.commit()
+        return True, db_key
+    except IntegrityError:
+        db.rollback()
+    # Conditional update, so only one of several concurrent takeovers wins
+    taken_over = db.query(models.IdempotencyKey).filter(
+        models.IdempotencyKey.endpoint == endpoint,
+        models.IdempotencyKey.key == key,
+        or_(
+            models.IdempotencyKey.expires_at < now,
+            and_(models.IdempotencyKey.status_code.is_(None), models.IdempotencyKey.locked_until < now)
+        )
+    ).update({
+        "fingerprint": fingerprint, "status_code": None, "response_body": None, "created_at": now,
+        "locked_until": locked_until, "expires_at": expires_at
+    }, synchronize_session=False)
+    db.commit()
+    return taken_over == 1, get_idempotency_key(db, endpoint, key)
+
+def complete_idempotency_key(db: Session, endpoint: str, key: str, status_code: int, response_body: str,
+                             response_headers: Optional[str] = None):
+    db.query(models.IdempotencyKey).filter(
+        models.IdempotencyKey.endpoint == endpoint, models.IdempotencyKey.key == key
+    ).update({"status_code": status_code, "response_body": response_body, "response_headers": response_headers,
+              "locked_until": None}, synchronize_session=False)
+    db.commit()
+
+def delete_idempotency_key(db: Session, endpoint: str, key: str):
+    db.query(models.IdempotencyKey).filter(
+        models.IdempotencyKey.endpoint == endpoint, models.IdempotencyKey.key == key
+    ).delete(synchronize_session=False)
+    db.commit()
+
+def prune_idempotency_keys(db: Session, expired_before: datetime) -> int:
+    deleted = db.query(models.IdempotencyKey).filter(
+        models.IdempotencyKey.expires_at < expired_before
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+# Bulk Order operations
+BULK_IN_CHUNK_SIZE = 500
+
+def _chunks(items: list, size: int = BULK_IN_CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def _existing_order_ids(db: Session, ids: List[int]) -> set:
+    existing = set()
+    for chunk in _chunks(ids):
+        existing.update(row.id for row in db.query(models.Order.id).filter(models.Order.id.in_(chunk)))
+    return existing
+
+def _failed_batch(items: List[Tuple[int, object]], error: Exception) -> List[schemas.BulkItemResult]:
+    return [schemas.BulkItemResult(index=index, status="error", error=str(error)) for index, _ in items]
+
+def _get_or_create_patients(db: Session, keys: List[str]) -> Dict[str, models.Patient]:
+    """get_or_create_patient for many keys with one query per chunk and one insert."""
+    patients = {}
+    for chunk in _chunks(sorted(set(keys))):
+        patients.update(
+            (patient.patient_key, patient) for patient in
+            db.query(models.Patient).filter(models.Patient.patient_key.in_(chunk)).with_for_update()
+        )
+    missing = [models.Patient(patient_key=key) for key in sorted(set(keys) - patients.keys())]
+    if not missing:
+        return patients
+    try:
+        with db.begin_nested():
+            db.add_all(missing)
+    except IntegrityError:
+        # Another request inserted some of them; take the slow path for these keys
+        missing = [get_or_create_patient(db, patient.patient_key) for patient in missing]
+    patients.update((patient.patient_key, patient) for patient in missing)
+    return patients
+
+def _latest_patient_order_ids(db: Session, patient_ids: List[int]) -> Dict[int, int]:
+    """Newest duplicate-target order id per patient."""
+    latest = {}
+    cutoff = _duplicate_cutoff()
+    for chunk in _chunks(patient_ids):
+        query = db.query(models.Order.patient_id, func.max(models.Order.id)).filter(models.Order.patient_id.in_(chunk))
+        if cutoff is not None:
+            query = query.filter(models.Order.created_at >= cutoff)
+        latest.update(query.group_by(models.Order.patient_id))
+    return latest
+
+def _bulk_add_orders(db: Session, orders: List[Tuple[int, schemas.OrderCreate]]) -> List[schemas.BulkItemResult]:
+    """
+    Add orders linked to their patients and flush; duplicates (also within the request) are answered
+    per DUPLICATE_PATIENT_MODE with existing or error results.
+    """
+    keys = [patient_key(order.first_name, order.last_name, order.date_of_birth) for _, order in orders]
+    patients = _get_or_create_patients(db, keys)
+    dedupe = DUPLICATE_PATIENT_MODE != "allow"
+    latest = _latest_patient_order_ids(db, [patient.id for patient in patients.values()]) if dedupe else {}
+    outcomes = []
+    for (index, order), key in zip(orders, keys):
+        patient_id = patients[key].id
+        if dedupe and patient_id in latest:
+            outcomes.append((index, latest[patient_id], "error" if DUPLICATE_PATIENT_MODE == "reject" else "existing"))
+            continue
+        db_order = models.Order(**order.dict(), patient_id=patient_id)
+        db.add(db_order)
+        if dedupe:
+            latest[patient_id] = db_order
+        outcomes.append((index, db_order, "created"))
+    db.flush()
+
+    results = []
+    for index, target, status in outcomes:
+        order_id = target if isinstance(target, int) else target.id
+        if status == "error":
+            results.append(schemas.BulkItemResult(index=index, status="error", error=str(DuplicatePatientError(order_id))))
+        else:
+            results.append(schemas.BulkItemResult(index=index, id=order_id, status=status))
+    return results
+
+def bulk_create_orders(
+    db: Session, orders: List[Tuple[int, schemas.OrderCreate]], atomic: bool = True
+) -> List[schemas.BulkItemResult]:
+    """
+    Insert orders in one transaction. orders are (request index, order) pairs.
+    DUPLICATE_PATIENT_MODE applies to each order, including repeats of a patient within the request.
+    Without atomic, a failing batch is retried row by row in savepoints so only bad rows fail.
+    """
+    try:
+        results = _bulk_add_orders(db, orders)
+        if atomic and any(result.status == "error" for result in results):
+            db.rollback()
+            return [
+                result if result.status == "error" else schemas.BulkItemResult(index=result.index, status="rolled_back")
+                for result in results
+            ]
+        db.commit()
+        _invalidate_cached_orders([result.id for result in results if result.status == "created"])
+        return results
+    except SQLAlchemyError as e:
+        db.rollback()
+        if atomic:
+            return _failed_batch(orders, e)
+
+    results = []
+    for index, order in orders:
+        try:
+            with db.begin_nested():
+                db_order, created = _add_order(db, order)
+            results.append(schemas.BulkItemResult(index=index, id=db_order.id, status="created" if created else "existing"))
+        except (SQLAlchemyError, DuplicatePatientError) as e:
+            results.append(schemas.BulkItemResult(index=index, status="error", error=str(e)))
+    db.commit()
+    _invalidate_cached_orders([result.id for result in results if result.status == "created"])
+    return results
+
+def _relink_patients(db: Session, mappings: List[dict]):
+    """Set patient_id on update mappings that change a patient's name or date of birth."""
+    changed = [mapping for mapping in mappings if mapping.keys() & PATIENT_FIELDS]
+    if not changed:
+        return
+    current = {}
+    for chunk in _chunks([mapping["id"] for mapping in changed]):
+        current.update((row.id, row) for row in db.query(
+            models.Order.id, models.Order.first_name, models.Order.last_name, models.Order.date_of_birth
+        ).filter(models.Order.id.in_(chunk)))
+    keys = {}
+    for mapping in changed:
+        fields = {field: mapping.get(field, getattr(current[mapping["id"]], field)) for field in PATIENT_FIELDS}
+        # A null name fails the update itself
+        if None not in fields.values():
+            keys[mapping["id"]] = patient_key(**fields)
+    patients = _get_or_create_patients(db, list(keys.values()))
+    for mapping in changed:
+        if mapping["id"] in keys:
+            mapping["patient_id"] = patients[keys[mapping["id"]]].id
+
+def bulk_update_orders(
+    db: Session, updates: List[Tuple[int, schemas.OrderBulkUpdate]], atomic: bool = True
+) -> List[schemas.BulkItemResult]:
+    """
+    Apply partial updates with executemany UPDATEs. updates are (request index, update) pairs.
+    Without atomic, a failing batch is retried row by row in savepoints so only bad rows fail.
+    """
+    existing = _existing_order_ids(db, [update.id for _, update in updates])
+    results = []
+    mappings = []
+    now = datetime.utcnow()
+    for index, update in updates:
+        if update.id not in existing:
+            results.append(schemas.BulkItemResult(index=index, id=update.id, status="error", error="Order not found"))
+            continue
+        mapping = update.dict(exclude_unset=True)
+        mapping["updated_at"] = now
+        mappings.append((index, mapping))
+
+    if atomic and results:
+        return results + [
+            schemas.BulkItemResult(index=index, id=mapping["id"], status="rolled_back") for index, mapping in mappings
+        ]
+
+    try:
+        _relink_patients(db, [mapping for _, mapping in mappings])
+        db.bulk_update_mappings(models.Order, [mapping for _, mapping in mappings])
+        db.commit()
+        _invalidate_cached_orders([mapping["id"] for _, mapping in mappings])
+    except SQLAlchemyError as e:
+        db.rollback()
+        if atomic:
+            return results + _failed_batch(mappings, e)
+    else:
+        return results + [
+            schemas.BulkItemResult(index=index, id=mapping["id"], status="updated") for index, mapping in mappings
+        ]
+
+    updated = []
+    for index, mapping in mappings:
+        try:
+            with db.begin_nested():
+                _relink_patients(db, [mapping])
+                db.bulk_update_mappings(models.Order, [mapping])
+            results.append(schemas.BulkItemResult(index=index, id=mapping["id"], status="updated"))
+            updated.append(mapping["id"])
+        except SQLAlchemyError as e:
+            results.append(schemas.BulkItemResult(index=index, id=mapping["id"], status="error", error=str(e)))
+    db.commit()
+    _invalidate_cached_orders(updated)
+    return results
+
+def bulk_delete_orders(
+    db: Session, order_ids: List[Tuple[int, int]], atomic: bool = True
+) -> List[schemas.BulkItemResult]:
+    """
+    Delete orders by id with chunked DELETE ... WHERE id IN statements.
+    Without atomic, a failing batch is retried row by row in savepoints so only bad rows fail.
+    """
+    existing = _existing_order_ids(db, [order_id for _, order_id in order_ids])
+    results = [
+        schemas.BulkItemResult(index=index, id=order_id, status="error", error="Order not found")
+        for index, order_id in order_ids if order_id not in existing
+    ]
+    found = [(index, order_id) for index, order_id in order_ids if order_id in existing]
+
+    if atomic and results:
+        return results + [
+            schemas.BulkItemResult(index=index, id=order_id, status="rolled_back") for index, order_id in found
+        ]
+
+    try:
+        for chunk in _chunks(sorted(existing)):
+            db.query(models.Order).filter(models.Order.id.in_(chunk)).delete(synchronize_session=False)
+        db.commit()
+        _invalidate_cached_orders(existing)
+    except SQLAlchemyError as e:
+        db.rollback()
+        if atomic:
+            return results + _failed_batch(found, e)
+    else:
+        return results + [
+            schemas.BulkItemResult(index=index, id=order_id, status="deleted") for index, order_id in found
+        ]
+
+    deleted = []
+    for index, order_id in found:
+        try:
+            with db.begin_nested():
+                db.query(models.Order).filter(models.Order.id == order_id).delete(synchronize_session=False)
+            results.append(schemas.BulkItemResult(index=index, id=order_id, status="deleted"))
+            deleted.append(order_id)
+        except SQLAlchemyError as e:
+            results.append(schemas.BulkItemResult(index=index, id=order_id, status="error", error=str(e)))
+    db.commit()
+    _invalidate_cached_orders(deleted)
+    return results
+
+# Async operations, used instead of the sync versions when DB_ASYNC is enabled
+async def get_order_async(db: AsyncSession, order_id: int) -> Optional[models.Order]:
+    result = await db.execute(select(models.Order).where(models.Order.id == order_id))
+    return result.scalars().first()
+
+async def get_orders_async(
+    db: AsyncSession,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    last_name: Optional[str] = None,
+    columns: Optional[list] = None
+) -> List[models.Order]:
+    statement = filter_orders(select(*(columns or [models.Order])), created_from, created_to, last_name)
+    statement = _paginate(statement, models.Order.created_at, models.Order.id, cursor, skip, limit)
+    result = await db.execute(statement)
+    return result.all() if columns else result.scalars().all()
+
+async def get_activity_logs_async(
+    db: AsyncSession,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    action: Optional[str] = None,
+    method: Optional[str] = None,
+    endpoint: Optional[str] = None,
+    columns: Optional[list] = None
+) -> List[models.ActivityLog]:
+    statement = filter_activity_logs(select(*(columns or [models.ActivityLog])), start, end, action, method, endpoint)
+    statement = _paginate(statement, models.ActivityLog.timestamp, models.ActivityLog.id, cursor, skip, limit)
+    result = await db.execute(statement)
+    return result.all() if columns else result.scalars().all()
+
+async def get_activity_logs_by_order_async(db: AsyncSession, order_id: int) -> List[models.ActivityLog]:
+    result = await db.execute(select(models.ActivityLog).where(models.ActivityLog.order_id == order_id))
+    return result.scalars().all()
+
+async def get_activity_log_stats_async(
+    db: AsyncSession, start: datetime, end: datetime, method: Optional[str] = None
+) -> List[dict]:
+    result = await db.execute(activity_log_stats_statement(start, end, method))
+    return [dict(row) for row in result.mappings()]
+
+async def get_activity_log_rollups_async(db: AsyncSession, model: RollupModel, start: datetime, end: datetime,
+                                         endpoint: Optional[str] = None, method: Optional[str] = None) -> list:
+    return (await db.execute(rollups_statement(model, start, end, endpoint, method))).scalars().all()
+
+async def create_activity_logs_async(db: AsyncSession, activity_logs: List[dict]) -> int:
+    """Insert many activity log rows with one executemany INSERT."""
+    await db.execute(insert(models.ActivityLog), activity_logs)
+    await db.commit()
+    return len(activity_logs)
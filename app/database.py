@@ -1,23 +1,156 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from starlette.concurrency import run_in_threadpool
 import os
+import time
+from typing import Any, Callable, Dict
 from dotenv import load_dotenv
+from . import metrics
 
 load_dotenv()
 
 # Database URL from environment variable
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./genhealth.db")
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
+# Connection pool settings (ignored for SQLite, which does not pool file connections)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))  # seconds to wait for a connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds before a connection is replaced
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+
+# Serve reads and activity log writes through an async engine (asyncpg / aiosqlite); other writes stay on the
+# sync engine in the threadpool
+DB_ASYNC = os.getenv("DB_ASYNC", "false").lower() == "true"
+
+def _engine_kwargs() -> Dict[str, Any]:
+    if IS_SQLITE:
+        # SQLite connections are shared with the extraction job threads
+        return {"connect_args": {"check_same_thread": False}}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+def async_database_url(url: str) -> str:
+    """Swap the sync driver in a database URL for its async counterpart."""
+    scheme, rest = url.split("://", 1)
+    base = scheme.split("+", 1)[0]
+    if base in ("postgres", "postgresql"):
+        return f"postgresql+asyncpg://{rest}"
+    if base == "sqlite":
+        return f"sqlite+aiosqlite://{rest}"
+    return url
 
 # Create SQLAlchemy engine
-engine = create_engine(DATABASE_URL)
+engine = create_engine(DATABASE_URL, **_engine_kwargs())
 
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Optional async engine
+async_engine = None
+AsyncSessionLocal = None
+if DB_ASYNC:
+    try:
+        from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+        async_engine = create_async_engine(async_database_url(DATABASE_URL), **_engine_kwargs())
+        AsyncSessionLocal = sessionmaker(
+            async_engine, class_=AsyncSession, autocommit=False, autoflush=False, expire_on_commit=False
+        )
+    except ImportError as e:
+        print(f"⚠️ DB_ASYNC is set but the async database driver is not available, using the sync engine: {str(e)}")
+
 # Create Base class
 Base = declarative_base()
 
+# Pool usage counters, updated by engine events
+pool_counters = {"connects": 0, "checkouts": 0, "invalidations": 0}
+
+def _track_pool(pool_engine):
+    @event.listens_for(pool_engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        pool_counters["connects"] += 1
+
+    @event.listens_for(pool_engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        pool_counters["checkouts"] += 1
+
+    @event.listens_for(pool_engine, "invalidate")
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        pool_counters["invalidations"] += 1
+
+db_query_duration_seconds = metrics.Histogram(
+    "db_query_duration_seconds", "Database statement execution time by statement type", ("operation",)
+)
+QUERY_OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE"}
+
+def _time_queries(query_engine):
+    @event.listens_for(query_engine, "before_cursor_execute")
+    def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+        connection.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(query_engine, "after_cursor_execute")
+    def after_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+        started = connection.info["query_started"].pop()
+        words = statement.lstrip().split(None, 1)
+        operation = words[0].upper() if words else ""
+        if operation not in QUERY_OPERATIONS:
+            operation = "OTHER"
+        db_query_duration_seconds.observe(time.perf_counter() - started, operation)
+
+    @event.listens_for(query_engine, "handle_error")
+    def handle_error(exception_context):
+        connection = exception_context.connection
+        if connection is not None and connection.info.get("query_started"):
+            connection.info["query_started"].pop()
+
+def _instrument(instrumented_engine):
+    _track_pool(instrumented_engine)
+    if metrics.METRICS_ENABLED:
+        _time_queries(instrumented_engine)
+
+_instrument(engine)
+if async_engine is not None:
+    _instrument(async_engine.sync_engine)
+
+def _pool_status(pool) -> Dict[str, Any]:
+    status = {"pool": type(pool).__name__}
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        if hasattr(pool, name):
+            status[name] = getattr(pool, name)()
+    return status
+
+def pool_status() -> Dict[str, Any]:
+    """Current pool occupancy for each engine plus lifetime counters."""
+    status = {"sync": _pool_status(engine.pool), "counters": dict(pool_counters)}
+    if async_engine is not None:
+        status["async"] = _pool_status(async_engine.sync_engine.pool)
+    return status
+
+def _pool_gauges() -> Dict[tuple, int]:
+    values = {}
+    for name, status in pool_status().items():
+        if name == "counters":
+            continue
+        for state in ("size", "checkedin", "checkedout", "overflow"):
+            if state in status:
+                values[(name, state)] = status[state]
+    return values
+
+metrics.CallbackMetric(
+    "db_pool_connections", "Connection pool occupancy per engine", _pool_gauges, labels=("engine", "state")
+)
+metrics.CallbackMetric(
+    "db_pool_events_total", "Connections opened, checked out and invalidated",
+    lambda: {(name,): count for name, count in pool_counters.items()}, labels=("event",), type="counter"
+)
+
 # Dependency to get database session
 def get_db():
     db = SessionLocal()
@@ -26,7 +159,79 @@ def get_db():
     finally:
         db.close()
 
+async def run_db(sync_func: Callable, async_func: Callable, *args, **kwargs):
+    """
+    Run a crud operation with the async engine when it is enabled,
+    otherwise run the sync version in the threadpool.
+    """
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as session:
+            return await async_func(session, *args, **kwargs)
+
+    def call():
+        db = SessionLocal()
+        try:
+            return sync_func(db, *args, **kwargs)
+        finally:
+            db.close()
+
+    return await run_in_threadpool(call)
+
 # Create all tables
 def create_tables():
     from .models import Base
-    Base.metadata.create_all(bind=engine) 
\ No newline at end of file
+    from .log_storage import create_partitioned_activity_logs, ensure_partitions
+    from .search import create_search_indexes
+    create_partitioned_activity_logs()
+    Base.metadata.create_all(bind=engine)
+    ensure_partitions()
+    # create_all skips tables that already exist, so add columns and indexes introduced later
+    # and drop foreign keys that were removed
+    _drop_removed_foreign_keys()
+    for table in Base.metadata.sorted_tables:
+        _add_missing_columns(table)
+        for index in table.indexes:
+            if not _index_exists(index.name):
+                index.create(bind=engine)
+    create_search_indexes()
+
+def _index_exists(name: str) -> bool:
+    """Look indexes up in the catalog, since reflection skips expression indexes."""
+    if engine.dialect.name == "sqlite":
+        query = "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = :name"
+    elif engine.dialect.name == "postgresql":
+        query = "SELECT 1 FROM pg_indexes WHERE indexname = :name"
+    else:
+        return any(index["name"] == name for table in inspect(engine).get_table_names()
+                   for index in inspect(engine).get_indexes(table))
+    with engine.connect() as connection:
+        return connection.execute(text(query), {"name": name}).first() is not None
+
+# (table, column) pairs whose foreign key to orders was removed, so deleting an order is not blocked by them
+REMOVED_FOREIGN_KEYS = [("activity_logs", "order_id"), ("extraction_jobs", "order_id")]
+
+def _drop_removed_foreign_keys():
+    """Drop REMOVED_FOREIGN_KEYS from existing tables; SQLite does not enforce them, so only other databases."""
+    if IS_SQLITE:
+        return
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+    for table, column in REMOVED_FOREIGN_KEYS:
+        if table not in tables:
+            continue
+        for foreign_key in inspector.get_foreign_keys(table):
+            if foreign_key["constrained_columns"] == [column] and foreign_key.get("name"):
+                with engine.begin() as connection:
+                    connection.execute(text(f'ALTER TABLE {table} DROP CONSTRAINT "{foreign_key["name"]}"'))
+                print(f"Dropped foreign key {table}.{foreign_key['name']}")
+
+def _add_missing_columns(table):
+    """Add nullable columns that were added to a model after its table was created."""
+    existing = {column["name"] for column in inspect(engine).get_columns(table.name)}
+    for column in table.columns:
+        if column.name in existing or not column.nullable:
+            continue
+        column_type = column.type.compile(dialect=engine.dialect)
+        with engine.begin() as connection:
+            connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+        print(f"Added column {table.name}.{column.name}")
@@ -0,0 +1,65 @@
+import csv
+import io
+import json
+import os
+from datetime import datetime
+from typing import Callable, Iterable, Iterator, List
+
+from sqlalchemy.orm import Session
+
+from .database import SessionLocal
+
+# Rows fetched per round-trip and written per response chunk
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+def _json_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def _ndjson_chunks(rows: Iterable[tuple], fields: List[str]) -> Iterator[str]:
+    lines = []
+    for row in rows:
+        lines.append(json.dumps({field: _json_value(value) for field, value in zip(fields, row)}))
+        if len(lines) >= EXPORT_BATCH_SIZE:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+def _csv_chunks(rows: Iterable[tuple], fields: List[str]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    count = 0
+    for row in rows:
+        writer.writerow([_csv_value(value) for value in row])
+        count += 1
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def export_rows(rows_factory: Callable[[Session], Iterable[tuple]], fields: List[str], fmt: str) -> Iterator[str]:
+    """
+    Serialize rows from rows_factory(db) as NDJSON or CSV chunks.
+    Opens its own session so it stays valid for the whole streaming response.
+    """
+    db = SessionLocal()
+    try:
+        rows = rows_factory(db)
+        chunks = _csv_chunks(rows, fields) if fmt == "csv" else _ndjson_chunks(rows, fields)
+        for chunk in chunks:
+            yield chunk
+    finally:
+        db.close()
@@ -0,0 +1,178 @@
+import re
+from datetime import datetime
+from typing import List, NamedTuple, Optional, Pattern, Tuple
+
+# Words that look like names in form labels but never are
+NON_NAME_WORDS = {'patient', 'name', 'first', 'last', 'given', 'surname'}
+HEADER_NON_NAME_WORDS = NON_NAME_WORDS | {'and', 'address'}
+
+class FieldMatch(NamedTuple):
+    value: object
+    rule: str
+    confidence: float
+
+class PatientFields(NamedTuple):
+    first_name: Optional[FieldMatch]
+    last_name: Optional[FieldMatch]
+    date_of_birth: Optional[FieldMatch]
+
+    @property
+    def complete(self) -> bool:
+        return bool(self.first_name and self.last_name and self.date_of_birth)
+
+    @property
+    def confidence(self) -> float:
+        """Lowest confidence of the three fields (0.0 when any is missing)."""
+        if not self.complete:
+            return 0.0
+        return min(self.first_name.confidence, self.last_name.confidence, self.date_of_birth.confidence)
+
+class Rule(NamedTuple):
+    name: str
+    pattern: Pattern
+    confidence: float
+    # Rules that start with a label are only tried where a label occurs in the text
+    labelled: bool = True
+
+def _rule(name: str, pattern: str, confidence: float, labelled: bool = True) -> Rule:
+    return Rule(name, re.compile(pattern, re.IGNORECASE), confidence, labelled)
+
+# Every labelled rule starts with one of these words
+LABELS = ("patient", "name", "first", "given", "last", "surname", "fname", "f.name",
+          "lname", "l.name", "date of birth", "dob", "birth", "born")
+LABEL_PATTERN = re.compile("|".join(f"(?={re.escape(label)})" for label in LABELS), re.IGNORECASE)
+
+# "Patient Name ... Patient Date of Birth John Doe" table header layout
+HEADER_RULE = _rule(
+    "header",
+    r"Patient Name[^:]*?Patient Date of Birth\s*([A-Z][a-z]+)\s+([A-Z][a-z]+)",
+    0.95
+)
+
+# Rules are listed in priority order; the first rule that matches wins
+FIRST_NAME_RULES = [
+    _rule("name", r"Name[:\s]*([A-Z][a-z]+)\s+[A-Z][a-z]+", 0.8),
+    _rule("first_name", r"First Name[:\s]*([A-Za-z]+)", 0.9),
+    _rule("given_name", r"Given Name[:\s]*([A-Za-z]+)", 0.9),
+    _rule("patient_first_name", r"Patient First Name[:\s]*([A-Za-z]+)", 0.9),
+    _rule("first", r"First[:\s]*([A-Za-z]+)", 0.6),
+    _rule("fname", r"F\.?Name[:\s]*([A-Za-z]+)", 0.7),
+    _rule("patient", r"Patient[:\s]*([A-Za-z]+)\s+[A-Za-z]+", 0.5),
+    _rule("capitalized_words", r"([A-Z][a-z]+)\s+[A-Z][a-z]+", 0.2, labelled=False),
+]
+
+LAST_NAME_RULES = [
+    _rule("name", r"Name[:\s]*[A-Za-z]+\s+([A-Za-z]+)", 0.8),
+    _rule("last_name", r"Last Name[:\s]*([A-Za-z]+)", 0.9),
+    _rule("surname", r"Surname[:\s]*([A-Za-z]+)", 0.9),
+    _rule("patient_last_name", r"Patient Last Name[:\s]*([A-Za-z]+)", 0.9),
+    _rule("last", r"Last[:\s]*([A-Za-z]+)", 0.6),
+    _rule("lname", r"L\.?Name[:\s]*([A-Za-z]+)", 0.7),
+    _rule("patient", r"Patient[:\s]*[A-Za-z]+\s+([A-Za-z]+)", 0.5),
+    _rule("capitalized_words", r"[A-Z][a-z]+\s+([A-Z][a-z]+)", 0.2, labelled=False),
+]
+
+DATE_OF_BIRTH_RULES = [
+    _rule("date_of_birth", r"Date of Birth[:\s]*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})", 0.95),
+    _rule("dob", r"DOB[:\s]*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})", 0.95),
+    _rule("birth_date", r"Birth Date[:\s]*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})", 0.9),
+    _rule("born", r"Born[:\s]*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})", 0.8),
+    _rule("birth", r"Birth[:\s]*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})", 0.7),
+    _rule("any_date", r"(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})", 0.3, labelled=False),
+    _rule("iso_date", r"(\d{4}-\d{2}-\d{2})", 0.3, labelled=False),
+]
+
+US_DATE_PATTERN = re.compile(r"(\d{1,2})([/-])(\d{1,2})\2(\d{2}|\d{4})")
+ISO_DATE_PATTERN = re.compile(r"(\d{4})-(\d{1,2})-(\d{1,2})")
+
+def parse_date(date_str: str) -> Optional[datetime]:
+    """
+    Parse MM/DD/YYYY, MM/DD/YY (with / or -) and YYYY-MM-DD dates.
+    Two-digit years follow strptime's %y rule (69-99 -> 1900s, 00-68 -> 2000s).
+    """
+    try:
+        match = US_DATE_PATTERN.fullmatch(date_str)
+        if match:
+            year = int(match.group(4))
+            if len(match.group(4)) == 2:
+                year += 1900 if year >= 69 else 2000
+            return datetime(year, int(match.group(1)), int(match.group(3)))
+        match = ISO_DATE_PATTERN.fullmatch(date_str)
+        if match:
+            return datetime(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+    except ValueError:
+        pass
+    return None
+
+def find_label_positions(text: str) -> List[int]:
+    """Sorted start positions of every label in the text, as the IGNORECASE rules would match them."""
+    if not text.isascii():
+        # re.IGNORECASE matches characters str.lower() does not map to ASCII letters (e.g. "ſ" for "s", the
+        # Kelvin sign for "k"), and some change length when lowercased; the regex scan finds exactly those
+        return [match.start() for match in LABEL_PATTERN.finditer(text)]
+    lowered = text.lower()
+    positions = set()
+    for label in LABELS:
+        position = lowered.find(label)
+        while position != -1:
+            positions.add(position)
+            position = lowered.find(label, position + 1)
+    return sorted(positions)
+
+def _first_match(rule: Rule, text: str, label_positions: List[int]):
+    """Leftmost match of a rule; equivalent to rule.pattern.search(text) given find_label_positions(text)."""
+    if not rule.labelled:
+        return rule.pattern.search(text)
+    for position in label_positions:
+        match = rule.pattern.match(text, position)
+        if match:
+            return match
+    return None
+
+def _match_name(rules: List[Rule], text: str, label_positions: List[int]) -> Optional[FieldMatch]:
+    for rule in rules:
+        match = _first_match(rule, text, label_positions)
+        if match:
+            name = match.group(1).strip()
+            if name.lower() not in NON_NAME_WORDS:
+                return FieldMatch(name, rule.name, rule.confidence)
+    return None
+
+def _match_header(text: str, label_positions: List[int]) -> Tuple[Optional[FieldMatch], Optional[FieldMatch]]:
+    match = _first_match(HEADER_RULE, text, label_positions)
+    if match:
+        first_name = match.group(1).strip()
+        last_name = match.group(2).strip()
+        if (first_name.lower() not in HEADER_NON_NAME_WORDS and
+            last_name.lower() not in HEADER_NON_NAME_WORDS):
+            return (FieldMatch(first_name, HEADER_RULE.name, HEADER_RULE.confidence),
+                    FieldMatch(last_name, HEADER_RULE.name, HEADER_RULE.confidence))
+    return None, None
+
+def _match_date_of_birth(text: str, label_positions: List[int]) -> Optional[FieldMatch]:
+    for rule in DATE_OF_BIRTH_RULES:
+        match = _first_match(rule, text, label_positions)
+        if match:
+            date_of_birth = parse_date(match.group(1))
+            if date_of_birth:
+                return FieldMatch(date_of_birth, rule.name, rule.confidence)
+    return None
+
+def extract_fields(text: str) -> PatientFields:
+    """
+    Extract first name, last name and date of birth in one pass over the text.
+    Label positions are found once and every labelled rule is only tried there;
+    results match trying each rule with re.search in priority order.
+    """
+    label_positions = find_label_positions(text)
+
+    first_name, last_name = _match_header(text, label_positions)
+    if first_name is None:
+        first_name = _match_name(FIRST_NAME_RULES, text, label_positions)
+        last_name = _match_name(LAST_NAME_RULES, text, label_positions)
+
+    return PatientFields(
+        first_name=first_name,
+        last_name=last_name,
+        date_of_birth=_match_date_of_birth(text, label_positions)
+    )
@@ -0,0 +1,178 @@
+import asyncio
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, NamedTuple, Optional, Tuple
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+
+from .database import SessionLocal
+from . import crud, metrics
+
+# Idempotency-Key settings (POST /orders/ and POST /upload/)
+IDEMPOTENCY_ENABLED = os.getenv("IDEMPOTENCY_ENABLED", "true").lower() == "true"
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", str(24 * 3600)))  # seconds a stored response is replayed
+# Seconds a retry waits for the first request of its key when that runs in another worker, before answering 409
+IDEMPOTENCY_WAIT_TIMEOUT = float(os.getenv("IDEMPOTENCY_WAIT_TIMEOUT", "60"))
+# Seconds after which an unfinished first request is taken to have died, so a retry runs it again
+IDEMPOTENCY_LOCK_TIMEOUT = int(os.getenv("IDEMPOTENCY_LOCK_TIMEOUT", "600"))
+# Delete expired keys after this many stored responses
+IDEMPOTENCY_PRUNE_EVERY = 100
+
+MAX_KEY_LENGTH = 255
+REPLAYED_HEADER = "Idempotent-Replayed"
+POLL_INTERVAL = 0.2
+
+idempotent_requests_total = metrics.Counter(
+    "idempotent_requests_total",
+    "Requests with an Idempotency-Key: executed, replayed from the table, coalesced with one in flight, or conflicting",
+    ("endpoint", "result")
+)
+
+class IdempotencyConflictError(Exception):
+    """Raised when a key cannot be used for a request; carries the HTTP status to answer with."""
+
+    def __init__(self, message: str, status_code: int = 409):
+        super().__init__(message)
+        self.status_code = status_code
+
+class StoredResponse(NamedTuple):
+    status_code: int
+    content: object  # JSON-compatible body
+    headers: Optional[Dict[str, str]] = None
+
+def fingerprint(*parts) -> str:
+    """SHA-256 of the parts of a request that must match for a key to be replayed."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+def _response(stored: StoredResponse, replayed: bool) -> JSONResponse:
+    headers = dict(stored.headers or {})
+    if replayed:
+        headers[REPLAYED_HEADER] = "true"
+    return JSONResponse(status_code=stored.status_code, content=stored.content, headers=headers or None)
+
+class IdempotencyStore:
+    """
+    Runs a request once per (endpoint, Idempotency-Key) and replays its response to retries until it expires.
+    Concurrent requests with a key already in flight in this worker await the same execution;
+    across workers the idempotency_keys row serializes them.
+    """
+
+    def __init__(self, ttl: int, wait_timeout: float, lock_timeout: int):
+        self.ttl = ttl
+        self.wait_timeout = wait_timeout
+        self.lock_timeout = lock_timeout
+        self._inflight: Dict[Tuple[str, str], Tuple[str, asyncio.Task]] = {}
+        self._writes = 0
+
+    async def run(self, endpoint: str, key: Optional[str], request_fingerprint: Optional[str],
+                  handler: Callable[[], Awaitable[StoredResponse]]) -> JSONResponse:
+        """
+        Answer a request with handler's response, or the stored one of an earlier request with the same key.
+        Without a key (or with IDEMPOTENCY_ENABLED off) handler just runs.
+        Raises IdempotencyConflictError for an invalid key, a key reused for a different request (422)
+        or a key whose first request is still running elsewhere (409).
+        """
+        if key is None or not IDEMPOTENCY_ENABLED:
+            return _response(await handler(), replayed=False)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            raise IdempotencyConflictError(f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters", status_code=400)
+
+        scope = (endpoint, key)
+        inflight = self._inflight.get(scope)
+        if inflight is not None:
+            _check_fingerprint(endpoint, inflight[0], request_fingerprint)
+            idempotent_requests_total.inc(endpoint, "coalesced")
+            stored, _ = await asyncio.shield(inflight[1])
+            return _response(stored, replayed=True)
+
+        task = asyncio.ensure_future(self._execute(endpoint, key, request_fingerprint, handler))
+        self._inflight[scope] = (request_fingerprint, task)
+        task.add_done_callback(lambda _: self._inflight.pop(scope, None))
+        stored, replayed = await asyncio.shield(task)
+        return _response(stored, replayed)
+
+    async def _execute(self, endpoint: str, key: str, request_fingerprint: str,
+                       handler: Callable[[], Awaitable[StoredResponse]]) -> Tuple[StoredResponse, bool]:
+        """(response, replayed): the stored response of the key, else handler's, stored for retries."""
+        deadline = asyncio.get_running_loop().time() + self.wait_timeout
+        while True:
+            claimed, db_key = await run_in_threadpool(self._claim, endpoint, key, request_fingerprint)
+            if claimed:
+                break
+            _check_fingerprint(endpoint, db_key.fingerprint, request_fingerprint)
+            if db_key.status_code is not None:
+                idempotent_requests_total.inc(endpoint, "replayed")
+                headers = json.loads(db_key.response_headers) if db_key.response_headers else None
+                return StoredResponse(db_key.status_code, json.loads(db_key.response_body), headers), True
+            # Another worker is running the first request; wait for its response or for its lock to run out
+            if asyncio.get_running_loop().time() >= deadline:
+                idempotent_requests_total.inc(endpoint, "conflict")
+                raise IdempotencyConflictError("A request with this Idempotency-Key is still being processed")
+            await asyncio.sleep(POLL_INTERVAL)
+
+        try:
+            stored = await handler()
+        except HTTPException as e:
+            if e.status_code >= 500:
+                await run_in_threadpool(self._release, endpoint, key)
+                raise
+            # Client errors are part of the outcome and are replayed like successes
+            stored = StoredResponse(e.status_code, {"detail": e.detail})
+        except BaseException:
+            # Nothing to replay: let a retry run the request again
+            await run_in_threadpool(self._release, endpoint, key)
+            raise
+        await run_in_threadpool(self._complete, endpoint, key, stored)
+        idempotent_requests_total.inc(endpoint, "executed")
+        return stored, False
+
+    def _claim(self, endpoint: str, key: str, request_fingerprint: str):
+        now = datetime.utcnow()
+        db = SessionLocal()
+        try:
+            return crud.claim_idempotency_key(
+                db, endpoint, key, request_fingerprint,
+                expires_at=now + timedelta(seconds=self.ttl),
+                locked_until=now + timedelta(seconds=self.lock_timeout)
+            )
+        finally:
+            db.close()
+
+    def _complete(self, endpoint: str, key: str, stored: StoredResponse):
+        db = SessionLocal()
+        try:
+            crud.complete_idempotency_key(
+                db, endpoint, key, stored.status_code, json.dumps(stored.content),
+                json.dumps(stored.headers) if stored.headers else None
+            )
+            self._writes += 1
+            if self._writes % IDEMPOTENCY_PRUNE_EVERY == 0:
+                crud.prune_idempotency_keys(db, expired_before=datetime.utcnow())
+        except Exception as e:
+            print(f"Error storing idempotent response: {str(e)}")
+        finally:
+            db.close()
+
+    def _release(self, endpoint: str, key: str):
+        db = SessionLocal()
+        try:
+            crud.delete_idempotency_key(db, endpoint, key)
+        except Exception as e:
+            print(f"Error releasing idempotency key: {str(e)}")
+        finally:
+            db.close()
+
+def _check_fingerprint(endpoint: str, stored_fingerprint: str, request_fingerprint: str):
+    if stored_fingerprint != request_fingerprint:
+        idempotent_requests_total.inc(endpoint, "conflict")
+        raise IdempotencyConflictError("Idempotency-Key was already used for a different request", status_code=422)
+
+idempotency_store = IdempotencyStore(
+    ttl=IDEMPOTENCY_TTL,
+    wait_timeout=IDEMPOTENCY_WAIT_TIMEOUT,
+    lock_timeout=IDEMPOTENCY_LOCK_TIMEOUT
+)
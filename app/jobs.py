@@ -0,0 +1,241 @@
+import asyncio
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, Optional, Set
+
+from sqlalchemy.orm import Session
+
+from .database import SessionLocal
+from .uploads import link_file, remove_file
+from .cache import extraction_cache, content_hash, EXTRACTION_CACHE_ENABLED
+from . import crud, metrics, models, schemas, utils
+
+# Number of worker processes used for PDF extraction (defaults to one per core)
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", str(os.cpu_count() or 1)))
+# Maximum number of accepted jobs that have not finished yet
+MAX_PENDING_JOBS = int(os.getenv("MAX_PENDING_JOBS", "100"))
+
+extraction_duration_seconds = metrics.Histogram(
+    "extraction_duration_seconds", "Time to extract one PDF, including cache lookups and waiting for a worker or an identical extraction in flight", ("result",)
+)
+extraction_stage_seconds = metrics.Histogram(
+    "extraction_stage_seconds", "Time per extraction stage: pdf_parse per document, rasterize and tesseract per OCR'd page, field_extraction per call", ("stage",)
+)
+extraction_pages_total = metrics.Counter(
+    "extraction_pages_total", "Pages read from the text layer or by OCR", ("source",)
+)
+
+class QueueFullError(Exception):
+    """Raised when the extraction queue cannot accept more jobs."""
+
+class ExtractionJobQueue:
+    """Runs PDF extraction in a bounded process pool off the event loop."""
+
+    def __init__(self, max_workers: int, max_pending: int):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._tasks: Set[asyncio.Task] = set()
+        # Jobs whose row is being inserted, counted as pending so concurrent submits cannot overfill the queue
+        self._submitting = 0
+        # Content hash -> extraction in flight, awaited by every request for the same PDF
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    @property
+    def pending(self) -> int:
+        """Number of background jobs that have not finished yet."""
+        return len(self._tasks) + self._submitting
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_worker)
+        return self._executor
+
+    async def extract(self, pdf: utils.PDFSource) -> Optional[schemas.PatientInfo]:
+        """
+        Extract patient information in a worker process and wait for the result.
+        Results are cached by content hash so re-sent PDFs skip parsing and OCR,
+        and concurrent requests for the same content await a single extraction.
+        The shared extraction reads its own link to a file, so it survives the first request being cancelled
+        and its file removed while other requests wait for the result.
+        """
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        key = await loop.run_in_executor(None, content_hash, pdf)
+        inflight = self._inflight.get(key)
+        if inflight is None and isinstance(pdf, str):
+            pdf = await loop.run_in_executor(None, link_file, pdf)
+            # Another request may have started the extraction while the link was made
+            inflight = self._inflight.get(key)
+            if inflight is not None:
+                remove_file(pdf)
+        if inflight is not None:
+            patient_info = await asyncio.shield(inflight)
+            extraction_duration_seconds.observe(time.perf_counter() - started, "coalesced")
+            return patient_info
+
+        task = asyncio.ensure_future(self._extract(pdf, key, started))
+        self._inflight[key] = task
+        task.add_done_callback(lambda _: self._extraction_done(key, pdf))
+        return await asyncio.shield(task)
+
+    def _extraction_done(self, key: str, pdf: utils.PDFSource):
+        self._inflight.pop(key, None)
+        if isinstance(pdf, str):
+            remove_file(pdf)
+
+    async def _extract(self, pdf: utils.PDFSource, key: str, started: float) -> Optional[schemas.PatientInfo]:
+        loop = asyncio.get_running_loop()
+        if EXTRACTION_CACHE_ENABLED:
+            cached = await loop.run_in_executor(None, extraction_cache.get, key)
+            if cached is not None:
+                extraction_duration_seconds.observe(time.perf_counter() - started, "cache_hit")
+                return cached
+
+        patient_info, report = await loop.run_in_executor(
+            self._get_executor(), utils.extract_patient_info_with_report, pdf
+        )
+        _observe_report(report)
+        if EXTRACTION_CACHE_ENABLED and patient_info is not None:
+            await loop.run_in_executor(None, extraction_cache.set, key, patient_info)
+        result = "extracted" if patient_info is not None else "failed"
+        extraction_duration_seconds.observe(time.perf_counter() - started, result)
+        return patient_info
+
+    async def submit(self, db: Session, pdf_path: str, filename: Optional[str] = None) -> models.ExtractionJob:
+        """
+        Record a new job (off the event loop) and schedule its extraction in the background.
+        Once this returns, the job owns the file at pdf_path and removes it when done.
+        """
+        if self.pending >= self.max_pending:
+            raise QueueFullError(f"{self.pending} extraction jobs are already pending")
+
+        self._submitting += 1
+        try:
+            job = await asyncio.get_running_loop().run_in_executor(
+                None, crud.create_extraction_job, db, str(uuid.uuid4()), filename
+            )
+        finally:
+            self._submitting -= 1
+        task = asyncio.create_task(self._run(job.id, pdf_path))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    async def _run(self, job_id: str, pdf_path: str):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_workers)
+
+        loop = asyncio.get_running_loop()
+        try:
+            async with self._semaphore:
+                await loop.run_in_executor(None, _update_job, job_id, {"status": "RUNNING"})
+                patient_info = None
+                error = None
+                try:
+                    patient_info = await self.extract(pdf_path)
+                except Exception as e:
+                    error = f"Extraction failed: {str(e)}"
+                await loop.run_in_executor(None, _finish_job, job_id, patient_info, error)
+        except asyncio.CancelledError:
+            _update_job(job_id, {
+                "status": "FAILED", "error": "Server shut down before the job finished", "completed_at": datetime.utcnow()
+            })
+            raise
+        finally:
+            remove_file(pdf_path)
+
+    def warm_up(self):
+        """Start the worker processes and load the PDF stack in them, so the first upload does not pay for it."""
+        executor = self._get_executor()
+        for future in [executor.submit(utils.warm_up) for _ in range(self.max_workers)]:
+            future.result()
+
+    async def shutdown(self, wait: bool = True, timeout: Optional[float] = None):
+        """
+        Wait up to timeout seconds for pending jobs (optionally) and stop the worker processes.
+        Jobs still running after the timeout are cancelled and marked failed.
+        """
+        if wait and self._tasks:
+            _, unfinished = await asyncio.wait(set(self._tasks), timeout=timeout)
+            if unfinished:
+                print(f"⚠️ Cancelling {len(unfinished)} extraction jobs that did not finish before shutdown")
+                for task in unfinished:
+                    task.cancel()
+                await asyncio.gather(*unfinished, return_exceptions=True)
+                wait = False
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=not wait)
+            self._executor = None
+
+def _observe_report(report: utils.ExtractionReport):
+    """Record the stage timings a worker process measured."""
+    for stage, durations in report.stages.items():
+        for seconds in durations:
+            extraction_stage_seconds.observe(seconds, stage)
+    for page in report.pages:
+        extraction_pages_total.inc(page.source)
+
+def _init_worker():
+    """Share the cores between extraction workers so per-page OCR does not oversubscribe them."""
+    cores_per_worker = max(1, (os.cpu_count() or 1) // EXTRACTION_WORKERS)
+    utils.OCR_WORKERS = min(utils.OCR_WORKERS, cores_per_worker)
+
+def _update_job(job_id: str, fields: dict):
+    db = SessionLocal()
+    try:
+        crud.update_extraction_job(db, job_id, **fields)
+    except Exception as e:
+        print(f"Error updating extraction job {job_id}: {str(e)}")
+    finally:
+        db.close()
+
+def _finish_job(job_id: str, patient_info: Optional[schemas.PatientInfo], error: Optional[str]):
+    """Create the order for a finished job and store its outcome."""
+    db = SessionLocal()
+    try:
+        if patient_info is None:
+            crud.update_extraction_job(
+                db, job_id,
+                status="FAILED",
+                error=error or "Could not extract patient information from PDF",
+                completed_at=datetime.utcnow()
+            )
+            return
+
+        try:
+            order_id = crud.create_order(db, schemas.OrderCreate(
+                first_name=patient_info.first_name,
+                last_name=patient_info.last_name,
+                date_of_birth=patient_info.date_of_birth
+            )).id
+            status, error = "COMPLETED", None
+        except crud.DuplicatePatientError as e:
+            # Rejected as a duplicate; the job still points at the patient's existing order
+            order_id, status, error = e.order_id, "FAILED", str(e)
+        crud.update_extraction_job(
+            db, job_id,
+            status=status,
+            error=error,
+            order_id=order_id,
+            first_name=patient_info.first_name,
+            last_name=patient_info.last_name,
+            date_of_birth=patient_info.date_of_birth,
+            completed_at=datetime.utcnow()
+        )
+    except Exception as e:
+        print(f"Error finishing extraction job {job_id}: {str(e)}")
+        db.rollback()
+        _update_job(job_id, {"status": "FAILED", "error": str(e), "completed_at": datetime.utcnow()})
+    finally:
+        db.close()
+
+job_queue = ExtractionJobQueue(max_workers=EXTRACTION_WORKERS, max_pending=MAX_PENDING_JOBS)
+
+metrics.CallbackMetric(
+    "extraction_jobs_pending", "Background extraction jobs that have not finished", lambda: {(): job_queue.pending}
+)
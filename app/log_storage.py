@@ -0,0 +1,237 @@
+import asyncio
+import os
+import re
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import Column, MetaData, PrimaryKeyConstraint, Table, inspect, text
+from sqlalchemy.schema import CreateTable
+
+from .database import SessionLocal, engine
+from . import crud, models
+
+# Partition activity_logs by timestamp (PostgreSQL only; other databases delete expired rows instead)
+ACTIVITY_LOG_PARTITIONING = os.getenv("ACTIVITY_LOG_PARTITIONING", "true").lower() == "true"
+ACTIVITY_LOG_PARTITION_INTERVAL = os.getenv("ACTIVITY_LOG_PARTITION_INTERVAL", "day")  # day or month
+ACTIVITY_LOG_PARTITIONS_AHEAD = int(os.getenv("ACTIVITY_LOG_PARTITIONS_AHEAD", "3"))  # future partitions kept ready
+# Days of raw activity logs and rollups to keep (0 = keep forever)
+ACTIVITY_LOG_RETENTION_DAYS = int(os.getenv("ACTIVITY_LOG_RETENTION_DAYS", "0"))
+ACTIVITY_LOG_ROLLUP_RETENTION_DAYS = int(os.getenv("ACTIVITY_LOG_ROLLUP_RETENTION_DAYS", "0"))
+# Seconds between maintenance runs (partitions, rollups, retention)
+ACTIVITY_LOG_MAINTENANCE_INTERVAL = float(os.getenv("ACTIVITY_LOG_MAINTENANCE_INTERVAL", "300"))
+
+ACTIVITY_LOG_TABLE = models.ActivityLog.__tablename__
+DEFAULT_PARTITION = f"{ACTIVITY_LOG_TABLE}_default"
+# activity_logs_pYYYYMMDD for daily partitions, activity_logs_pYYYYMM for monthly ones
+PARTITION_NAME_PATTERN = re.compile(rf"^{ACTIVITY_LOG_TABLE}_p(\d{{6}}|\d{{8}})$")
+
+ROLLUP_GRACE = timedelta(minutes=1)
+
+ROLLUP_MODELS = {
+    "hour": models.ActivityLogHourlyRollup,
+    "day": models.ActivityLogDailyRollup,
+}
+
+def period_start(moment: datetime, period: str) -> datetime:
+    """Start of the hour, day or month containing moment."""
+    if period == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    if period == "day":
+        return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    if period == "month":
+        return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError(f"Unknown period: {period}")
+
+def next_period(start: datetime, period: str) -> datetime:
+    if period == "hour":
+        return start + timedelta(hours=1)
+    if period == "day":
+        return start + timedelta(days=1)
+    if period == "month":
+        return start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
+    raise ValueError(f"Unknown period: {period}")
+
+def _uses_partitions() -> bool:
+    return ACTIVITY_LOG_PARTITIONING and engine.dialect.name == "postgresql"
+
+def _is_partitioned(connection) -> bool:
+    return connection.execute(text(
+        "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid WHERE c.relname = :name"
+    ), {"name": ACTIVITY_LOG_TABLE}).first() is not None
+
+def create_partitioned_activity_logs():
+    """
+    Create activity_logs as a table range-partitioned on timestamp, before create_all would create a plain one.
+    PostgreSQL requires the partition key in the primary key, so it becomes (id, timestamp).
+    An existing plain table is left alone; converting it needs a migration.
+    """
+    if not _uses_partitions() or inspect(engine).has_table(ACTIVITY_LOG_TABLE):
+        return
+    columns = [
+        Column(column.name, column.type, nullable=column.nullable, autoincrement=column.name == "id")
+        for column in models.ActivityLog.__table__.columns
+    ]
+    partitioned = Table(
+        ACTIVITY_LOG_TABLE, MetaData(), *columns,
+        PrimaryKeyConstraint("id", "timestamp"),
+        postgresql_partition_by="RANGE (timestamp)"
+    )
+    with engine.begin() as connection:
+        connection.execute(CreateTable(partitioned))
+    print(f"Created partitioned table {ACTIVITY_LOG_TABLE}")
+
+def ensure_partitions(now: Optional[datetime] = None) -> List[str]:
+    """Create the current and next ACTIVITY_LOG_PARTITIONS_AHEAD partitions, plus a default partition."""
+    if not _uses_partitions():
+        return []
+    now = now or datetime.utcnow()
+    created = []
+    with engine.begin() as connection:
+        if not _is_partitioned(connection):
+            return []
+        connection.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {ACTIVITY_LOG_TABLE} DEFAULT"
+        ))
+        start = period_start(now, ACTIVITY_LOG_PARTITION_INTERVAL)
+        for _ in range(ACTIVITY_LOG_PARTITIONS_AHEAD + 1):
+            end = next_period(start, ACTIVITY_LOG_PARTITION_INTERVAL)
+            name = _partition_name(start)
+            if not inspect(connection).has_table(name):
+                connection.execute(text(
+                    f"CREATE TABLE {name} PARTITION OF {ACTIVITY_LOG_TABLE} "
+                    f"FOR VALUES FROM ('{start.isoformat(' ')}') TO ('{end.isoformat(' ')}')"
+                ))
+                created.append(name)
+            start = end
+    return created
+
+def _partition_name(start: datetime) -> str:
+    suffix = start.strftime("%Y%m") if ACTIVITY_LOG_PARTITION_INTERVAL == "month" else start.strftime("%Y%m%d")
+    return f"{ACTIVITY_LOG_TABLE}_p{suffix}"
+
+def _partition_end(name: str) -> Optional[datetime]:
+    match = PARTITION_NAME_PATTERN.match(name)
+    if not match:
+        return None
+    suffix = match.group(1)
+    if len(suffix) == 6:
+        return next_period(datetime.strptime(suffix, "%Y%m"), "month")
+    return next_period(datetime.strptime(suffix, "%Y%m%d"), "day")
+
+def drop_expired_partitions(cutoff: datetime) -> List[str]:
+    """Drop every partition whose whole range is older than cutoff."""
+    dropped = []
+    with engine.begin() as connection:
+        partitions = connection.execute(text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = :name"
+        ), {"name": ACTIVITY_LOG_TABLE}).scalars().all()
+        for name in partitions:
+            end = _partition_end(name)
+            if end is not None and end <= cutoff:
+                connection.execute(text(f"DROP TABLE {name}"))
+                dropped.append(name)
+    return dropped
+
+def roll_up(period: str, now: Optional[datetime] = None, include_current: bool = False) -> int:
+    """
+    Compute rollups for every finished bucket since the last stored one; with include_current the
+    latest stored bucket and the current, still partial one are recomputed too. Returns the buckets written.
+    """
+    model = ROLLUP_MODELS[period]
+    now = now or datetime.utcnow()
+    # Leave queued activity logs time to be written before a bucket counts as finished
+    current = period_start(now - ROLLUP_GRACE, period)
+    db = SessionLocal()
+    try:
+        latest = crud.latest_rollup_bucket(db, model)
+        if latest is not None:
+            bucket = latest if include_current else next_period(latest, period)
+        else:
+            earliest = crud.earliest_activity_log_timestamp(db)
+            if earliest is None:
+                return 0
+            bucket = period_start(earliest, period)
+        buckets = 0
+        while bucket < current or (include_current and bucket == current):
+            bucket_end = next_period(bucket, period)
+            rows = crud.get_activity_log_stats(db, start=bucket, end=bucket_end)
+            crud.replace_activity_log_rollups(db, model, bucket, rows)
+            buckets += 1
+            bucket = bucket_end
+        return buckets
+    finally:
+        db.close()
+
+def apply_retention(now: Optional[datetime] = None) -> Dict[str, int]:
+    """Drop (or delete) raw logs and rollups older than their retention periods."""
+    now = now or datetime.utcnow()
+    removed = {}
+    if ACTIVITY_LOG_RETENTION_DAYS > 0:
+        cutoff = now - timedelta(days=ACTIVITY_LOG_RETENTION_DAYS)
+        if _uses_partitions() and _partitioned():
+            removed["partitions"] = len(drop_expired_partitions(cutoff))
+        # Deletes what is left: rows in the default partition, or everything without partitioning
+        db = SessionLocal()
+        try:
+            removed["activity_logs"] = crud.delete_activity_logs_before(db, cutoff)
+        finally:
+            db.close()
+    if ACTIVITY_LOG_ROLLUP_RETENTION_DAYS > 0:
+        cutoff = now - timedelta(days=ACTIVITY_LOG_ROLLUP_RETENTION_DAYS)
+        db = SessionLocal()
+        try:
+            for period, model in ROLLUP_MODELS.items():
+                removed[f"rollups_{period}"] = crud.delete_rollups_before(db, model, cutoff)
+        finally:
+            db.close()
+    return removed
+
+def _partitioned() -> bool:
+    with engine.connect() as connection:
+        return _is_partitioned(connection)
+
+def run_maintenance(now: Optional[datetime] = None) -> dict:
+    """One maintenance pass. Rollups run before retention so no row is dropped before it is rolled up."""
+    now = now or datetime.utcnow()
+    return {
+        "partitions_created": ensure_partitions(now),
+        # Hourly rollups include the current hour; daily ones only finished days
+        "rollup_buckets": {
+            "hour": roll_up("hour", now, include_current=True),
+            "day": roll_up("day", now),
+        },
+        "removed": apply_retention(now),
+    }
+
+class ActivityLogMaintenance:
+    """Runs run_maintenance in the background every interval seconds."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await loop.run_in_executor(None, run_maintenance)
+            except Exception as e:
+                print(f"Error maintaining activity logs: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+activity_log_maintenance = ActivityLogMaintenance(interval=ACTIVITY_LOG_MAINTENANCE_INTERVAL)
@@ -1,97 +1,137 @@
 from fastapi import Request, Response
 from sqlalchemy.orm import Session
-from .database import SessionLocal
-from .crud import create_activity_log
-from .schemas import ActivityLogCreate
+from .database import SessionLocal, AsyncSessionLocal
+from .crud import create_activity_logs, create_activity_logs_async
+from . import metrics
+import asyncio
+import os
 import time
-from typing import Callable
+from datetime import datetime
+from typing import AsyncIterator, Callable, List, Optional
 import json
+import re
 
-class ActivityLogger:
-    """Middleware to log all user activity to database."""
-    
-    def __init__(self, app):
-        self.app = app
-    
-    async def __call__(self, scope, receive, send):
-        if scope["type"] == "http":
-            request = Request(scope, receive)
-            
-            # Get request details
-            method = request.method
-            url = str(request.url)
-            path = request.url.path
-            
-            # Determine action based on method and path
-            action = self._determine_action(method, path)
-            
-            # Process the request
-            start_time = time.time()
-            
-            # Create a custom response class to capture response details
-            response_body = b""
-            
-            async def custom_send(message):
-                if message["type"] == "http.response.body":
-                    response_body = message.get("body", b"")
-                await send(message)
-            
-            # Process request
-            await self.app(scope, receive, custom_send)
-            
-            # Calculate response time
-            response_time = time.time() - start_time
-            
-            # Log the activity
-            await self._log_activity(
-                action=action,
-                endpoint=path,
-                method=method,
-                details=f"Response time: {response_time:.3f}s"
-            )
-    
-    def _determine_action(self, method: str, path: str) -> str:
-        """Determine the action based on HTTP method and path."""
-        if method == "GET":
-            if path == "/orders":
-                return "READ_ALL"
-            elif path.startswith("/orders/"):
-                return "READ_ONE"
-            elif path == "/activity-logs":
-                return "READ_LOGS"
-            else:
-                return "READ"
-        elif method == "POST":
-            if path == "/orders":
-                return "CREATE"
-            elif path == "/upload":
-                return "UPLOAD"
+# Activity log queue settings
+ACTIVITY_LOG_QUEUE_SIZE = int(os.getenv("ACTIVITY_LOG_QUEUE_SIZE", "10000"))
+ACTIVITY_LOG_BATCH_SIZE = int(os.getenv("ACTIVITY_LOG_BATCH_SIZE", "500"))
+ACTIVITY_LOG_FLUSH_INTERVAL = float(os.getenv("ACTIVITY_LOG_FLUSH_INTERVAL", "1.0"))  # seconds
+# What to do when the queue is full: drop_newest, drop_oldest or block
+ACTIVITY_LOG_DROP_POLICY = os.getenv("ACTIVITY_LOG_DROP_POLICY", "drop_newest")
+
+ORDER_PATH_PATTERN = re.compile(r"^/orders/(\d+)/?$")
+
+class ActivityLogQueue:
+    """
+    Bounded in-memory queue of activity log rows with a background writer.
+    Rows are bulk inserted when a batch fills up or the flush interval elapses.
+    """
+
+    def __init__(self, max_size: int, batch_size: int, flush_interval: float, drop_policy: str):
+        if drop_policy not in ("drop_newest", "drop_oldest", "block"):
+            raise ValueError(f"Unknown activity log drop policy: {drop_policy}")
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.drop_policy = drop_policy
+        self.written = 0
+        self.dropped = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._writer: Optional[asyncio.Task] = None
+
+    @property
+    def depth(self) -> int:
+        """Number of rows waiting to be written."""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def start(self):
+        """Start the background writer on the running event loop."""
+        if self._writer is None:
+            self._queue = asyncio.Queue(maxsize=self.max_size)
+            self._writer = asyncio.create_task(self._run())
+
+    async def put(self, entry: dict):
+        """Queue a row for writing, applying the drop policy when the queue is full."""
+        self.start()
+        if self.drop_policy == "block":
+            await self._queue.put(entry)
+            return
+        if self._queue.full():
+            if self.drop_policy == "drop_newest":
+                self.dropped += 1
+                return
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(entry)
+
+    async def stop(self):
+        """Flush everything still queued and stop the writer."""
+        if self._writer is None:
+            return
+        await self._queue.put(None)
+        await self._writer
+        self._writer = None
+        self._queue = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            batch: List[dict] = []
+            entry = await self._queue.get()
+            if entry is None:
+                break
+            batch.append(entry)
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    entry = await asyncio.wait_for(self._queue.get(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    break
+                if entry is None:
+                    stopping = True
+                    break
+                batch.append(entry)
+            if AsyncSessionLocal is not None:
+                await self._write_batch_async(batch)
             else:
-                return "CREATE"
-        elif method == "PUT":
-            return "UPDATE"
-        elif method == "DELETE":
-            return "DELETE"
-        else:
-            return "UNKNOWN"
-    
-    async def _log_activity(self, action: str, endpoint: str, method: str, details: str = None):
-        """Log activity to database."""
+                await loop.run_in_executor(None, self._write_batch, batch)
+
+    def _write_batch(self, batch: List[dict]):
+        db = SessionLocal()
         try:
-            db = SessionLocal()
-            activity_log = ActivityLogCreate(
-                action=action,
-                endpoint=endpoint,
-                method=method,
-                details=details
-            )
-            create_activity_log(db, activity_log)
+            self.written += create_activity_logs(db, batch)
         except Exception as e:
             print(f"Error logging activity: {str(e)}")
         finally:
             db.close()
 
-def log_activity_middleware(request: Request, call_next: Callable) -> Response:
+    async def _write_batch_async(self, batch: List[dict]):
+        try:
+            async with AsyncSessionLocal() as db:
+                self.written += await create_activity_logs_async(db, batch)
+        except Exception as e:
+            print(f"Error logging activity: {str(e)}")
+
+activity_log_queue = ActivityLogQueue(
+    max_size=ACTIVITY_LOG_QUEUE_SIZE,
+    batch_size=ACTIVITY_LOG_BATCH_SIZE,
+    flush_interval=ACTIVITY_LOG_FLUSH_INTERVAL,
+    drop_policy=ACTIVITY_LOG_DROP_POLICY
+)
+
+metrics.CallbackMetric(
+    "activity_log_queue_depth", "Activity log rows waiting to be written", lambda: {(): activity_log_queue.depth}
+)
+metrics.CallbackMetric(
+    "activity_log_rows_total", "Activity log rows written or dropped because the queue was full",
+    lambda: {("written",): activity_log_queue.written, ("dropped",): activity_log_queue.dropped},
+    labels=("outcome",), type="counter"
+)
+
+async def log_activity_middleware(request: Request, call_next: Callable) -> Response:
     """FastAPI middleware function for logging activity."""
     # Get request details
     method = request.method
@@ -101,21 +141,43 @@ def log_activity_middleware(request: Request, call_next: Callable) -> Response:
     action = _determine_action(method, path)
     
     # Process request
-    start_time = time.time()
-    response = call_next(request)
-    response_time = time.time() - start_time
-    
-    # Log activity asynchronously
-    import asyncio
-    asyncio.create_task(_log_activity_async(
-        action=action,
-        endpoint=path,
-        method=method,
-        details=f"Response time: {response_time:.3f}s"
-    ))
+    start_time = time.perf_counter()
+    response = await call_next(request)
     
+    entry = {
+        "action": action,
+        "endpoint": path,
+        "route": metrics.route_template(request.scope),
+        "method": method,
+        "order_id": _order_id_from_path(path),
+        "status_code": response.status_code,
+        "client": request.client.host if request.client else None,
+    }
+    # The row is queued once the body has been sent, so duration and size cover streamed responses too
+    response.body_iterator = _log_after_body(response.body_iterator, entry, start_time)
     return response
 
+async def _log_after_body(body_iterator: AsyncIterator[bytes], entry: dict, start_time: float) -> AsyncIterator[bytes]:
+    response_bytes = 0
+    try:
+        async for chunk in body_iterator:
+            response_bytes += len(chunk)
+            yield chunk
+    finally:
+        response_time = time.perf_counter() - start_time
+        # Queue the log row; the database write happens in the background writer
+        await _log_activity_async(
+            details=f"Response time: {response_time:.3f}s",
+            duration_ms=response_time * 1000,
+            response_bytes=response_bytes,
+            **entry
+        )
+
+def _order_id_from_path(path: str) -> Optional[int]:
+    """Order ID of /orders/{id} requests."""
+    match = ORDER_PATH_PATTERN.match(path)
+    return int(match.group(1)) if match else None
+
 def _determine_action(method: str, path: str) -> str:
     """Determine the action based on HTTP method and path."""
     if method == "GET":
@@ -141,18 +203,13 @@ def _determine_action(method: str, path: str) -> str:
     else:
         return "UNKNOWN"
 
-async def _log_activity_async(action: str, endpoint: str, method: str, details: str = None):
-    """Asynchronously log activity to database."""
-    try:
-        db = SessionLocal()
-        activity_log = ActivityLogCreate(
-            action=action,
-            endpoint=endpoint,
-            method=method,
-            details=details
-        )
-        create_activity_log(db, activity_log)
-    except Exception as e:
-        print(f"Error logging activity: {str(e)}")
-    finally:
-        db.close() 
\ No newline at end of file
+async def _log_activity_async(action: str, endpoint: str, method: str, details: str = None, **fields):
+    """Queue activity for the background database writer; fields are extra ActivityLog columns."""
+    await activity_log_queue.put({
+        "action": action,
+        "endpoint": endpoint,
+        "method": method,
+        "details": details,
+        "timestamp": datetime.utcnow(),
+        **fields
+    })
@@ -1,13 +1,40 @@
-from fastapi import FastAPI, Depends, HTTPException, UploadFile, File
+from fastapi import FastAPI, Depends, Header, HTTPException, UploadFile, File, Response, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import ValidationError
 from sqlalchemy.orm import Session
-from typing import List
-import uvicorn
+from starlette.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+import json
+import os
+import time
 
-from .database import get_db, create_tables
+from . import STARTED
+
+from .database import get_db, create_tables, run_db, pool_status
 from .models import Base
-from . import crud, schemas, utils
-from .logger import log_activity_middleware
+from . import crud, metrics, models, schemas, serialization, server, utils
+from . import search as order_search
+from .jobs import job_queue, QueueFullError
+from .cache import extraction_cache, order_cache, content_hash
+from .batch import process_batch, BatchTooLargeError
+from .uploads import (
+    UploadSizeLimitMiddleware, InvalidUploadError, spool_to_file, check_pdf, remove_file,
+    MAX_UPLOAD_SIZE, MAX_BATCH_UPLOAD_SIZE
+)
+from .admission import AdmissionControlMiddleware
+from .idempotency import idempotency_store, fingerprint, IdempotencyConflictError, StoredResponse
+from .export import export_rows, EXPORT_BATCH_SIZE, EXPORT_MEDIA_TYPES
+from .logger import log_activity_middleware, activity_log_queue
+from .log_storage import activity_log_maintenance, ROLLUP_MODELS
+
+# Maximum number of items accepted by the bulk order endpoints
+BULK_MAX_ITEMS = int(os.getenv("BULK_MAX_ITEMS", "10000"))
+# Set (to the order id) when POST /orders/ or /upload/ returned the patient's existing order instead of creating one
+EXISTING_ORDER_HEADER = "X-Existing-Order"
 
 # Create FastAPI app
 app = FastAPI(
@@ -16,6 +43,18 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Reject oversized upload bodies while they stream in (with room for multipart framing)
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    limits={
+        "/upload/batch": MAX_BATCH_UPLOAD_SIZE,
+        "/upload": MAX_UPLOAD_SIZE + 1024 * 1024,
+    },
+)
+
+# Limit concurrency and per-client request rates of expensive endpoints, so OCR load cannot starve light reads
+app.add_middleware(AdmissionControlMiddleware)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -23,15 +62,49 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Retry-After", EXISTING_ORDER_HEADER],
 )
 
 # Add activity logging middleware
 app.middleware("http")(log_activity_middleware)
 
-# Create database tables on startup
-@app.on_event("startup")
-async def startup_event():
-    create_tables()
+# Record request metrics around everything else, including rejected uploads
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Worker lifecycle
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Create tables, warm up and start background writers before the worker accepts requests;
+    on shutdown finish background jobs and flush queued activity logs.
+    Under app.server the supervisor has already created the tables and runs activity log maintenance.
+    """
+    started = time.perf_counter()
+    phases = {"imports": started - STARTED}
+    if not server.supervised():
+        create_tables()
+    else:
+        await run_in_threadpool(order_search.detect_search_indexes)
+    phases["tables"] = time.perf_counter() - started
+    if server.WARMUP_ENABLED:
+        warmup_started = time.perf_counter()
+        await run_in_threadpool(utils.warm_up)
+        await run_in_threadpool(job_queue.warm_up)
+        phases["warmup"] = time.perf_counter() - warmup_started
+    activity_log_queue.start()
+    if not server.supervised():
+        activity_log_maintenance.start()
+    server.report_startup(phases)
+
+    yield
+
+    # uvicorn has already let in-flight requests, uploads included, finish
+    await job_queue.shutdown(timeout=server.SHUTDOWN_TIMEOUT)
+    await activity_log_maintenance.stop()
+    await activity_log_queue.stop()
+
+# FastAPI 0.88 has no lifespan argument; the router runs this instead of startup/shutdown events
+app.router.lifespan_context = lifespan
 
 # Health check endpoint
 @app.get("/")
@@ -39,28 +112,235 @@ async def root():
     return {"message": "GenHealth API is running!", "docs": "/docs", "endpoints": {
         "orders": "/orders/",
         "upload": "/upload/",
+        "jobs": "/jobs/{job_id}",
         "activity_logs": "/activity-logs/"
     }}
 
 # Order CRUD endpoints
-@app.post("/orders/", response_model=schemas.Order)
-def create_order(order: schemas.OrderCreate, db: Session = Depends(get_db)):
-    """Create a new order."""
-    return crud.create_order(db=db, order=order)
+@app.post("/orders/", response_model=schemas.Order, responses={
+    409: {"description": "Patient already has an order, or the Idempotency-Key's first request is still running"},
+    422: {"description": "Idempotency-Key was used for a different request"}
+})
+async def create_order(order: schemas.OrderCreate, db: Session = Depends(get_db), idempotency_key: Optional[str] = Header(None)):
+    """
+    Create a new order. If the patient (normalized name and date of birth) already has one created within
+    DUPLICATE_PATIENT_WINDOW, DUPLICATE_PATIENT_MODE decides: upsert returns the existing order
+    (marked with the X-Existing-Order header), reject answers 409.
+    Retries with the same Idempotency-Key get the first response back instead of creating another order.
+    """
+    async def handler() -> StoredResponse:
+        try:
+            db_order, created = await run_in_threadpool(crud.create_or_get_order, db=db, order=order)
+        except crud.DuplicatePatientError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        return StoredResponse(200, jsonable_encoder(schemas.Order.from_orm(db_order)), _existing_order_headers(db_order, created))
+
+    return await _idempotent("POST /orders/", idempotency_key, fingerprint(jsonable_encoder(order)), handler)
+
+def _existing_order_headers(db_order, created: bool) -> Optional[Dict[str, str]]:
+    # An upserted duplicate is answered 200 like a new order; the header tells the client which one it got
+    return None if created else {EXISTING_ORDER_HEADER: str(db_order.id)}
+
+async def _idempotent(endpoint: str, key: Optional[str], request_fingerprint: Optional[str], handler) -> Response:
+    try:
+        return await idempotency_store.run(endpoint, key, request_fingerprint, handler)
+    except IdempotencyConflictError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
 
 @app.get("/orders/", response_model=List[schemas.Order])
-def read_orders(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """Get all orders with pagination."""
-    orders = crud.get_orders(db, skip=skip, limit=limit)
-    return orders
-
-@app.get("/orders/{order_id}", response_model=schemas.Order)
-def read_order(order_id: int, db: Session = Depends(get_db)):
-    """Get a specific order by ID."""
-    order = crud.get_order(db, order_id=order_id)
-    if order is None:
-        raise HTTPException(status_code=404, detail="Order not found")
-    return order
+async def read_orders(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    last_name: Optional[str] = None
+):
+    """
+    Get orders with pagination, oldest first.
+    Pass the X-Next-Cursor response header back as cursor to fetch the next page.
+    """
+    fast = serialization.FAST_LIST_RESPONSES
+    columns = crud.ORDER_RESPONSE_COLUMNS if fast else None
+    try:
+        orders = await run_db(
+            crud.get_orders, crud.get_orders_async, skip=skip, limit=limit, cursor=cursor,
+            created_from=created_from, created_to=created_to, last_name=last_name, columns=columns
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if fast:
+        # Straight from row tuples to JSON; the returned response replaces the injected one, headers included
+        response = serialization.rows_response(orders, crud.ORDER_RESPONSE_FIELDS)
+    if limit > 0 and len(orders) == limit:
+        response.headers["X-Next-Cursor"] = crud.order_cursor(orders[-1])
+    return response if fast else orders
+
+@app.get("/orders/export")
+def export_orders(
+    export_format: str = Query("ndjson", alias="format", regex="^(ndjson|csv)$"),
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    last_name: Optional[str] = None
+):
+    """Stream all matching orders as NDJSON or CSV."""
+    filters = {"created_from": created_from, "created_to": created_to, "last_name": last_name}
+    return _export_response(
+        lambda db: crud.iter_orders(db, batch_size=EXPORT_BATCH_SIZE, **filters),
+        crud.ORDER_EXPORT_COLUMNS, export_format, "orders"
+    )
+
+@app.get("/orders/search", response_model=List[schemas.OrderSearchResult])
+async def search_orders(
+    last_name: Optional[str] = Query(None, min_length=1),
+    first_name: Optional[str] = Query(None, min_length=1),
+    date_of_birth: Optional[date] = None,
+    fuzzy: bool = False,
+    limit: int = Query(20, ge=1, le=100)
+):
+    """
+    Find orders by case-insensitive name prefix and/or date of birth, best matches first.
+    With fuzzy=true names are matched by trigram similarity (needs ORDER_SEARCH_FUZZY).
+    """
+    if not last_name and not date_of_birth and not (fuzzy and first_name):
+        raise HTTPException(status_code=400, detail="Search needs last_name or date_of_birth")
+    if fuzzy and not order_search.fuzzy_search_available():
+        raise HTTPException(status_code=400, detail="Fuzzy search is not enabled")
+    try:
+        results = await run_db(
+            order_search.search_orders, order_search.search_orders_async, last_name=last_name,
+            first_name=first_name, date_of_birth=date_of_birth, fuzzy=fuzzy, limit=limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return [{**schemas.Order.from_orm(order).dict(), "score": score} for order, score in results]
+
+# Bulk order endpoints
+@app.post("/orders/bulk", response_model=schemas.BulkResult)
+async def create_orders_bulk(request: Request, atomic: bool = True, db: Session = Depends(get_db)):
+    """
+    Create many orders in one transaction from a JSON array or NDJSON body.
+    With atomic=false, valid orders are saved even when others fail.
+    """
+    items = await _read_bulk_items(request)
+    orders, results = _validate_bulk_items(items, schemas.OrderCreate)
+    if not (atomic and results) and orders:
+        results += await run_in_threadpool(crud.bulk_create_orders, db, orders, atomic)
+    return _bulk_response(results, orders, atomic)
+
+@app.put("/orders/bulk", response_model=schemas.BulkResult)
+async def update_orders_bulk(request: Request, atomic: bool = True, db: Session = Depends(get_db)):
+    """Update many orders (each item needs an id) in one transaction."""
+    items = await _read_bulk_items(request)
+    updates, results = _validate_bulk_items(items, schemas.OrderBulkUpdate)
+    if not (atomic and results) and updates:
+        results += await run_in_threadpool(crud.bulk_update_orders, db, updates, atomic)
+    return _bulk_response(results, updates, atomic)
+
+@app.delete("/orders/bulk", response_model=schemas.BulkResult)
+async def delete_orders_bulk(request: Request, atomic: bool = True, db: Session = Depends(get_db)):
+    """Delete many orders; the body lists order ids or objects with an id."""
+    items = await _read_bulk_items(request)
+    order_ids = []
+    results = []
+    for index, item in enumerate(items):
+        order_id = item.get("id") if isinstance(item, dict) else item
+        if isinstance(order_id, int) and not isinstance(order_id, bool):
+            order_ids.append((index, order_id))
+        else:
+            results.append(schemas.BulkItemResult(index=index, status="error", error="Expected an order id"))
+    if not (atomic and results) and order_ids:
+        results += await run_in_threadpool(crud.bulk_delete_orders, db, order_ids, atomic)
+    return _bulk_response(results, order_ids, atomic)
+
+async def _read_bulk_items(request: Request) -> list:
+    """Parse a JSON array or NDJSON request body."""
+    body = await request.body()
+    try:
+        if "ndjson" in request.headers.get("content-type", ""):
+            items = [json.loads(line) for line in body.splitlines() if line.strip()]
+        else:
+            items = json.loads(body)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON: {str(e)}")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array or NDJSON body")
+    if len(items) > BULK_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {BULK_MAX_ITEMS} items are allowed per request")
+    return items
+
+def _validate_bulk_items(items: list, schema):
+    """Validate each item on its own so one bad item does not hide the others."""
+    valid = []
+    errors = []
+    for index, item in enumerate(items):
+        try:
+            valid.append((index, schema.parse_obj(item)))
+        except ValidationError as e:
+            errors.append(schemas.BulkItemResult(index=index, status="error", error=str(e)))
+    return valid, errors
+
+def _bulk_response(results: List[schemas.BulkItemResult], items: list, atomic: bool):
+    """Build the bulk report; atomic requests that failed return 422 with nothing committed."""
+    handled = {result.index for result in results}
+    results += [
+        schemas.BulkItemResult(
+            index=index,
+            id=item if isinstance(item, int) else getattr(item, "id", None),
+            status="rolled_back"
+        )
+        for index, item in items if index not in handled
+    ]
+    results.sort(key=lambda result: result.index)
+    failed = sum(1 for result in results if result.status == "error")
+    succeeded = sum(1 for result in results if result.status not in ("error", "rolled_back"))
+    report = schemas.BulkResult(
+        atomic=atomic,
+        committed=succeeded > 0,
+        succeeded=succeeded,
+        failed=failed,
+        results=results
+    )
+    if atomic and failed:
+        return JSONResponse(status_code=422, content=jsonable_encoder(report))
+    return report
+
+@app.get("/orders/{order_id}", response_model=schemas.Order, responses={304: {"description": "Not modified"}})
+async def read_order(order_id: int, request: Request):
+    """
+    Get a specific order by ID.
+    Responses are cached until the order changes and carry an ETag; send it as If-None-Match to get a 304.
+    """
+    cached = await _order_cache_call(order_cache.get, order_id)
+    if cached is None:
+        # Taken before the read, so an update committed meanwhile keeps this (possibly stale) body out of the cache
+        generation = await _order_cache_call(order_cache.generation, order_id)
+        order = await run_db(crud.get_order, crud.get_order_async, order_id=order_id)
+        if order is None:
+            raise HTTPException(status_code=404, detail="Order not found")
+        body = JSONResponse(content=jsonable_encoder(schemas.Order.from_orm(order))).body
+        etag = await _order_cache_call(order_cache.set, order_id, body, generation)
+    else:
+        etag, body = cached
+    
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
+async def _order_cache_call(func, *args):
+    # Shared backends do network I/O, so keep them off the event loop
+    if order_cache.backend is not None and order_cache.backend.shared:
+        return await run_in_threadpool(func, *args)
+    return func(*args)
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison, as If-None-Match requires
+    return any(tag.strip().replace("W/", "", 1) == etag for tag in if_none_match.split(","))
 
 @app.put("/orders/{order_id}", response_model=schemas.Order)
 def update_order(order_id: int, order: schemas.OrderUpdate, db: Session = Depends(get_db)):
@@ -79,21 +359,62 @@ def delete_order(order_id: int, db: Session = Depends(get_db)):
     return {"message": "Order deleted successfully"}
 
 # File upload endpoint
-@app.post("/upload/", response_model=schemas.PatientInfo)
-async def upload_pdf(file: UploadFile = File(...), db: Session = Depends(get_db)):
-    """Upload a PDF file and extract patient information."""
+@app.post("/upload/", response_model=schemas.PatientInfo, responses={
+    202: {"model": schemas.ExtractionJob},
+    409: {"description": "Patient already has an order, or the Idempotency-Key's first request is still running"},
+    422: {"description": "Idempotency-Key was used for a different request"}
+})
+async def upload_pdf(file: UploadFile = File(...), background: bool = False, db: Session = Depends(get_db),
+                     idempotency_key: Optional[str] = Header(None)):
+    """
+    Upload a PDF file and extract patient information.
+    With background=true the file is queued and a job is returned immediately; poll /jobs/{job_id} for the result.
+    Retries with the same Idempotency-Key get the first response back (or wait for it) instead of extracting again.
+    """
     # Validate file type
     if not file.filename.lower().endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Only PDF files are allowed")
     
-    # Read file content
+    # Spool the upload to a temporary file and validate it before any parsing
+    pdf_path = None
     try:
-        content = await file.read()
+        pdf_path = await run_in_threadpool(spool_to_file, file.file)
+        await run_in_threadpool(check_pdf, pdf_path)
+    except InvalidUploadError as e:
+        remove_file(pdf_path)
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except Exception as e:
+        remove_file(pdf_path)
         raise HTTPException(status_code=500, detail=f"Error reading file: {str(e)}")
     
-    # Extract patient information
-    patient_info = utils.extract_patient_info_from_pdf(content)
+    # A queued job owns the file from then on; otherwise it is removed once answered
+    queued = False
+    
+    async def handler() -> StoredResponse:
+        nonlocal queued
+        if background:
+            try:
+                job = await job_queue.submit(db, pdf_path, filename=file.filename)
+            except QueueFullError:
+                raise HTTPException(status_code=503, detail="Extraction queue is full, please retry later")
+            queued = True
+            return StoredResponse(202, jsonable_encoder(schemas.ExtractionJob.from_orm(job)))
+        patient_info, db_order, created = await _extract_and_create_order(pdf_path, db)
+        return StoredResponse(200, jsonable_encoder(patient_info), _existing_order_headers(db_order, created))
+    
+    try:
+        request_fingerprint = None
+        if idempotency_key is not None:
+            request_fingerprint = fingerprint(await run_in_threadpool(content_hash, pdf_path), background)
+        return await _idempotent("POST /upload/", idempotency_key, request_fingerprint, handler)
+    finally:
+        if not queued:
+            remove_file(pdf_path)
+
+async def _extract_and_create_order(pdf_path: str, db: Session) -> Tuple[schemas.PatientInfo, models.Order, bool]:
+    """(extracted info, order, created); created is False when the patient's existing order was returned."""
+    # Extract patient information in a worker process so OCR does not block the event loop
+    patient_info = await job_queue.extract(pdf_path)
     
     if patient_info is None:
         raise HTTPException(
@@ -109,22 +430,144 @@ async def upload_pdf(file: UploadFile = File(...), db: Session = Depends(get_db)
     )
     
     # Save to database
-    created_order = crud.create_order(db=db, order=order_data)
+    try:
+        db_order, created = await run_in_threadpool(crud.create_or_get_order, db=db, order=order_data)
+    except crud.DuplicatePatientError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     
-    return patient_info
+    return patient_info, db_order, created
+
+@app.post("/upload/batch", response_model=schemas.BatchUploadResult)
+async def upload_pdf_batch(files: List[UploadFile] = File(...), db: Session = Depends(get_db)):
+    """
+    Upload many PDFs and/or ZIP archives of PDFs.
+    Documents are extracted concurrently and all resulting orders are created in one transaction.
+    """
+    try:
+        return await process_batch(db, files)
+    except BatchTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+# Extraction job endpoints
+@app.get("/jobs/{job_id}", response_model=schemas.ExtractionJob)
+def read_extraction_job(job_id: str, db: Session = Depends(get_db)):
+    """Get the status and result of a background extraction job."""
+    job = crud.get_extraction_job(db, job_id=job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/cache/stats", response_model=Dict[str, schemas.CacheStats])
+def read_cache_stats():
+    """Get hit/miss counters for the extraction and order caches."""
+    return {"extraction": extraction_cache.stats(), "orders": order_cache.stats()}
+
+@app.get("/db/stats")
+def read_db_stats():
+    """Get connection pool occupancy and counters."""
+    return pool_status()
+
+@app.get("/metrics")
+def read_metrics():
+    """Get request, extraction, database and logging queue metrics in the Prometheus text format."""
+    return Response(content=metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
 
 # Activity logs endpoint
 @app.get("/activity-logs/", response_model=List[schemas.ActivityLog])
-def read_activity_logs(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """Get all activity logs with pagination."""
-    logs = crud.get_activity_logs(db, skip=skip, limit=limit)
-    return logs
+async def read_activity_logs(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    action: Optional[str] = None,
+    method: Optional[str] = None,
+    endpoint: Optional[str] = None
+):
+    """
+    Get activity logs with pagination, oldest first.
+    Pass the X-Next-Cursor response header back as cursor to fetch the next page.
+    """
+    fast = serialization.FAST_LIST_RESPONSES
+    columns = crud.ACTIVITY_LOG_RESPONSE_COLUMNS if fast else None
+    try:
+        logs = await run_db(
+            crud.get_activity_logs, crud.get_activity_logs_async, skip=skip, limit=limit, cursor=cursor,
+            start=start, end=end, action=action, method=method, endpoint=endpoint, columns=columns
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if fast:
+        # Straight from row tuples to JSON; the returned response replaces the injected one, headers included
+        response = serialization.rows_response(logs, crud.ACTIVITY_LOG_RESPONSE_FIELDS)
+    if limit > 0 and len(logs) == limit:
+        response.headers["X-Next-Cursor"] = crud.activity_log_cursor(logs[-1])
+    return response if fast else logs
+
+@app.get("/activity-logs/export")
+def export_activity_logs(
+    export_format: str = Query("ndjson", alias="format", regex="^(ndjson|csv)$"),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    action: Optional[str] = None,
+    method: Optional[str] = None,
+    endpoint: Optional[str] = None
+):
+    """Stream all matching activity logs as NDJSON or CSV."""
+    filters = {"start": start, "end": end, "action": action, "method": method, "endpoint": endpoint}
+    return _export_response(
+        lambda db: crud.iter_activity_logs(db, batch_size=EXPORT_BATCH_SIZE, **filters),
+        crud.ACTIVITY_LOG_EXPORT_COLUMNS, export_format, "activity_logs"
+    )
+
+def _export_response(rows_factory, columns, export_format: str, name: str) -> StreamingResponse:
+    fields = [column.key for column in columns]
+    return StreamingResponse(
+        export_rows(rows_factory, fields, export_format),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{export_format}"'}
+    )
+
+@app.get("/activity-logs/stats", response_model=schemas.ActivityLogStats)
+async def read_activity_log_stats(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    method: Optional[str] = None
+):
+    """Get request counts and latency percentiles per endpoint over a time window (default: the last hour)."""
+    end = end or datetime.utcnow()
+    start = start or end - timedelta(hours=1)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    endpoints = await run_db(
+        crud.get_activity_log_stats, crud.get_activity_log_stats_async, start=start, end=end, method=method
+    )
+    return {"start": start, "end": end, "endpoints": endpoints}
+
+@app.get("/activity-logs/rollups", response_model=List[schemas.ActivityLogRollup])
+async def read_activity_log_rollups(
+    period: str = Query("hour", regex="^(hour|day)$"),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    endpoint: Optional[str] = None,
+    method: Optional[str] = None
+):
+    """Get hourly or daily request counts and latency percentiles per endpoint (default: the last day / 30 days)."""
+    end = end or datetime.utcnow()
+    start = start or end - (timedelta(days=1) if period == "hour" else timedelta(days=30))
+    return await run_db(
+        crud.get_activity_log_rollups, crud.get_activity_log_rollups_async, ROLLUP_MODELS[period],
+        start=start, end=end, endpoint=endpoint, method=method
+    )
 
 @app.get("/activity-logs/order/{order_id}", response_model=List[schemas.ActivityLog])
-def read_activity_logs_by_order(order_id: int, db: Session = Depends(get_db)):
+async def read_activity_logs_by_order(order_id: int):
     """Get activity logs for a specific order."""
-    logs = crud.get_activity_logs_by_order(db, order_id=order_id)
+    logs = await run_db(crud.get_activity_logs_by_order, crud.get_activity_logs_by_order_async, order_id=order_id)
     return logs
 
 if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
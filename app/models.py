@@ -1,8 +1,18 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey
+from sqlalchemy import Column, Integer, Float, String, DateTime, Text, ForeignKey, Index, func
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .database import Base
 
+class Patient(Base):
+    """One row per patient identity, so duplicate orders are found with a single unique-key lookup."""
+    __tablename__ = "patients"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    patient_key = Column(String(220), nullable=False, unique=True)  # normalized last name|first name|date of birth
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    orders = relationship("Order", back_populates="patient")
+
 class Order(Base):
     __tablename__ = "orders"
     
@@ -10,22 +20,122 @@ class Order(Base):
     first_name = Column(String(100), nullable=False)
     last_name = Column(String(100), nullable=False)
     date_of_birth = Column(DateTime, nullable=False)
+    patient_id = Column(Integer, ForeignKey("patients.id"), nullable=True)  # null for orders created before patients existed
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    # Relationship with ActivityLog
-    activity_logs = relationship("ActivityLog", back_populates="order")
+    patient = relationship("Patient", back_populates="orders")
+    
+    # Relationship with ActivityLog (logs outlive deleted orders, so there is no foreign key)
+    activity_logs = relationship(
+        "ActivityLog", primaryjoin="Order.id == foreign(ActivityLog.order_id)", back_populates="order", viewonly=True
+    )
+    
+    # Keyset pagination and filter indexes
+    __table_args__ = (
+        Index("ix_orders_created_at_id", "created_at", "id"),
+        Index("ix_orders_date_of_birth", "date_of_birth"),
+        Index("ix_orders_patient_id_created_at", "patient_id", "created_at"),
+    )
+
+# Case-insensitive patient search and the /orders/ last_name filter: prefix ranges on lowered names, then date of birth
+Index(
+    "ix_orders_name_search",
+    func.lower(Order.last_name), func.lower(Order.first_name), Order.date_of_birth
+)
 
 class ActivityLog(Base):
     __tablename__ = "activity_logs"
     
     id = Column(Integer, primary_key=True, index=True)
-    order_id = Column(Integer, ForeignKey("orders.id"), nullable=True)
+    order_id = Column(Integer, nullable=True)  # parsed from /orders/{id} paths
     action = Column(String(100), nullable=False)  # CREATE, READ, UPDATE, DELETE, UPLOAD
     endpoint = Column(String(200), nullable=False)
+    route = Column(String(200), nullable=True)  # route template, e.g. /orders/{order_id}
     method = Column(String(10), nullable=False)
     timestamp = Column(DateTime, default=datetime.utcnow)
     details = Column(Text, nullable=True)
+    duration_ms = Column(Float, nullable=True)
+    status_code = Column(Integer, nullable=True)
+    response_bytes = Column(Integer, nullable=True)
+    client = Column(String(100), nullable=True)
     
     # Relationship with Order
-    order = relationship("Order", back_populates="activity_logs") 
\ No newline at end of file
+    order = relationship(
+        "Order", primaryjoin="Order.id == foreign(ActivityLog.order_id)", back_populates="activity_logs", viewonly=True
+    )
+    
+    # Keyset pagination and filter indexes
+    __table_args__ = (
+        Index("ix_activity_logs_timestamp_id", "timestamp", "id"),
+        Index("ix_activity_logs_action_timestamp", "action", "timestamp", "id"),
+        Index("ix_activity_logs_endpoint_timestamp", "endpoint", "timestamp", "id"),
+        Index("ix_activity_logs_order_id_timestamp", "order_id", "timestamp", "id"),
+    )
+
+class ActivityLogRollupMixin:
+    """Request counts and latency percentiles per endpoint and method for one time bucket."""
+    id = Column(Integer, primary_key=True, index=True)
+    bucket_start = Column(DateTime, nullable=False)
+    endpoint = Column(String(200), nullable=False)  # route template when known
+    method = Column(String(10), nullable=False)
+    count = Column(Integer, nullable=False)
+    errors = Column(Integer, nullable=False)  # 5xx responses
+    avg_ms = Column(Float, nullable=False)
+    p50_ms = Column(Float, nullable=False)
+    p95_ms = Column(Float, nullable=False)
+    p99_ms = Column(Float, nullable=False)
+    max_ms = Column(Float, nullable=False)
+
+class ActivityLogHourlyRollup(ActivityLogRollupMixin, Base):
+    __tablename__ = "activity_log_rollups_hourly"
+    
+    __table_args__ = (
+        Index("ix_activity_log_rollups_hourly_bucket", "bucket_start", "endpoint", "method", unique=True),
+    )
+
+class ActivityLogDailyRollup(ActivityLogRollupMixin, Base):
+    __tablename__ = "activity_log_rollups_daily"
+    
+    __table_args__ = (
+        Index("ix_activity_log_rollups_daily_bucket", "bucket_start", "endpoint", "method", unique=True),
+    )
+
+class ExtractionJob(Base):
+    __tablename__ = "extraction_jobs"
+    
+    id = Column(String(36), primary_key=True, index=True)
+    filename = Column(String(255), nullable=True)
+    status = Column(String(20), nullable=False, default="PENDING")  # PENDING, RUNNING, COMPLETED, FAILED
+    order_id = Column(Integer, nullable=True)  # no foreign key: jobs outlive the orders they created
+    first_name = Column(String(100), nullable=True)
+    last_name = Column(String(100), nullable=True)
+    date_of_birth = Column(DateTime, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    completed_at = Column(DateTime, nullable=True)
+
+class ExtractionCacheEntry(Base):
+    __tablename__ = "extraction_cache"
+    
+    content_hash = Column(String(64), primary_key=True)  # SHA-256 of the uploaded PDF
+    first_name = Column(String(100), nullable=False)
+    last_name = Column(String(100), nullable=False)
+    date_of_birth = Column(DateTime, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    last_accessed_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+class IdempotencyKey(Base):
+    """Stored response of a POST sent with an Idempotency-Key header, replayed to retries until it expires."""
+    __tablename__ = "idempotency_keys"
+    
+    endpoint = Column(String(100), primary_key=True)  # e.g. "POST /orders/"
+    key = Column(String(255), primary_key=True)
+    fingerprint = Column(String(64), nullable=False)  # SHA-256 of the request, to detect a key reused for another request
+    status_code = Column(Integer, nullable=True)  # null while the first request is in progress
+    response_body = Column(Text, nullable=True)  # JSON
+    response_headers = Column(Text, nullable=True)  # JSON object of headers to replay, if any
+    created_at = Column(DateTime, default=datetime.utcnow)
+    locked_until = Column(DateTime, nullable=True)  # an in-progress request older than this is taken to have died
+    expires_at = Column(DateTime, nullable=False, index=True)
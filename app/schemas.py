@@ -1,6 +1,6 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, validator
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 class OrderBase(BaseModel):
     first_name: str = Field(..., min_length=1, max_length=100)
@@ -15,14 +15,28 @@ class OrderUpdate(BaseModel):
     last_name: Optional[str] = Field(None, min_length=1, max_length=100)
     date_of_birth: Optional[datetime] = None
 
+    @validator("first_name", "last_name", "date_of_birth", pre=True)
+    def not_null(cls, value):
+        # Fields may be left out, but the columns are NOT NULL, so an explicit null is invalid
+        if value is None:
+            raise ValueError("may be omitted but not null")
+        return value
+
+class OrderBulkUpdate(OrderUpdate):
+    id: int
+
 class Order(OrderBase):
     id: int
+    patient_id: Optional[int] = None
     created_at: datetime
     updated_at: datetime
     
     class Config:
         orm_mode = True
 
+class OrderSearchResult(Order):
+    score: float  # higher is better; 1.0 is an exact match on every name given
+
 class ActivityLogBase(BaseModel):
     action: str
     endpoint: str
@@ -31,16 +45,99 @@ class ActivityLogBase(BaseModel):
 
 class ActivityLogCreate(ActivityLogBase):
     order_id: Optional[int] = None
+    route: Optional[str] = None
+    duration_ms: Optional[float] = None
+    status_code: Optional[int] = None
+    response_bytes: Optional[int] = None
+    client: Optional[str] = None
 
 class ActivityLog(ActivityLogBase):
     id: int
     order_id: Optional[int]
+    route: Optional[str] = None
     timestamp: datetime
+    duration_ms: Optional[float] = None
+    status_code: Optional[int] = None
+    response_bytes: Optional[int] = None
+    client: Optional[str] = None
+    
+    class Config:
+        orm_mode = True
+
+class EndpointStats(BaseModel):
+    endpoint: str
+    method: str
+    count: int
+    errors: int  # 5xx responses
+    avg_ms: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    max_ms: float
+
+class ActivityLogRollup(EndpointStats):
+    bucket_start: datetime
     
     class Config:
         orm_mode = True
 
+class ActivityLogStats(BaseModel):
+    start: datetime
+    end: datetime
+    endpoints: List[EndpointStats]
+
 class PatientInfo(BaseModel):
     first_name: str
     last_name: str
-    date_of_birth: datetime 
\ No newline at end of file
+    date_of_birth: datetime
+
+class ExtractionJob(BaseModel):
+    id: str
+    filename: Optional[str] = None
+    status: str
+    order_id: Optional[int] = None
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    date_of_birth: Optional[datetime] = None
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+    completed_at: Optional[datetime] = None
+    
+    class Config:
+        orm_mode = True
+
+class CacheStats(BaseModel):
+    size: Optional[int] = None  # not reported by shared backends
+    max_size: Optional[int] = None
+    hits: int
+    misses: int
+    evictions: Optional[int] = None
+    hit_ratio: float
+
+class BulkItemResult(BaseModel):
+    index: int
+    id: Optional[int] = None
+    status: str  # created, existing (duplicate patient), updated, deleted, rolled_back, error
+    error: Optional[str] = None
+
+class BulkResult(BaseModel):
+    atomic: bool
+    committed: bool
+    succeeded: int
+    failed: int
+    results: List[BulkItemResult]
+
+class BatchFileResult(BaseModel):
+    filename: str
+    status: str  # created, existing (order of the same patient), failed
+    order_id: Optional[int] = None
+    patient_info: Optional[PatientInfo] = None
+    error: Optional[str] = None
+
+class BatchUploadResult(BaseModel):
+    total: int
+    created: int
+    existing: int = 0
+    failed: int
+    results: List[BatchFileResult]
@@ -0,0 +1,210 @@
+import os
+from datetime import date, datetime, timedelta
+from typing import List, Optional, Tuple
+
+from sqlalchemy import func, inspect, select, text
+from sqlalchemy.orm import Session
+
+from .database import engine
+from . import crud, models
+
+try:
+    from sqlalchemy.ext.asyncio import AsyncSession
+except ImportError:
+    AsyncSession = Session
+
+# Maintain a trigram index for fuzzy name search (pg_trgm on PostgreSQL, an FTS5 table on SQLite)
+ORDER_SEARCH_FUZZY = os.getenv("ORDER_SEARCH_FUZZY", "false").lower() == "true"
+# Lowest pg_trgm similarity returned by fuzzy search
+ORDER_SEARCH_MIN_SIMILARITY = float(os.getenv("ORDER_SEARCH_MIN_SIMILARITY", "0.3"))
+
+FTS_TABLE = "orders_fts"
+
+_fuzzy_available = False
+
+def create_search_indexes():
+    """Create the fuzzy search index when ORDER_SEARCH_FUZZY is enabled; called from create_tables."""
+    global _fuzzy_available
+    if not ORDER_SEARCH_FUZZY:
+        return
+    try:
+        if engine.dialect.name == "postgresql":
+            _create_trigram_index()
+        elif engine.dialect.name == "sqlite":
+            _create_fts_table()
+        else:
+            print(f"Fuzzy order search is not supported on {engine.dialect.name}")
+            return
+        _fuzzy_available = True
+    except Exception as e:
+        print(f"Could not create the fuzzy order search index: {str(e)}")
+
+def detect_search_indexes():
+    """
+    Find the fuzzy search index another process created, without DDL; called by workers under app.server,
+    where only the supervisor runs create_tables.
+    """
+    global _fuzzy_available
+    if not ORDER_SEARCH_FUZZY:
+        return
+    try:
+        if engine.dialect.name == "postgresql":
+            with engine.connect() as connection:
+                _fuzzy_available = connection.execute(
+                    text("SELECT 1 FROM pg_indexes WHERE indexname = 'ix_orders_name_trgm'")
+                ).first() is not None
+        elif engine.dialect.name == "sqlite":
+            _fuzzy_available = inspect(engine).has_table(FTS_TABLE)
+    except Exception as e:
+        print(f"Could not check for the fuzzy order search index: {str(e)}")
+    if not _fuzzy_available:
+        print("Fuzzy order search is enabled but its index was not found")
+
+def fuzzy_search_available() -> bool:
+    return _fuzzy_available
+
+def _create_trigram_index():
+    with engine.begin() as connection:
+        connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        connection.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_orders_name_trgm ON orders "
+            "USING gin ((lower(last_name) || ' ' || lower(first_name)) gin_trgm_ops)"
+        ))
+
+def _create_fts_table():
+    """External-content FTS5 table over order names, kept in sync by triggers."""
+    created = not inspect(engine).has_table(FTS_TABLE)
+    with engine.begin() as connection:
+        connection.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            f"last_name, first_name, content='orders', content_rowid='id', tokenize='trigram')"
+        ))
+        connection.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON orders BEGIN "
+            f"INSERT INTO {FTS_TABLE}(rowid, last_name, first_name) VALUES (new.id, new.last_name, new.first_name); END"
+        ))
+        connection.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON orders BEGIN "
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, last_name, first_name) "
+            f"VALUES ('delete', old.id, old.last_name, old.first_name); END"
+        ))
+        connection.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update AFTER UPDATE ON orders BEGIN "
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, last_name, first_name) "
+            f"VALUES ('delete', old.id, old.last_name, old.first_name); "
+            f"INSERT INTO {FTS_TABLE}(rowid, last_name, first_name) VALUES (new.id, new.last_name, new.first_name); END"
+        ))
+        if created:
+            # Index the orders that existed before the table
+            connection.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+
+def _prefix_filter(column, prefix: str):
+    """
+    Case-insensitive prefix match on lower(column) as a range, which the expression index can serve.
+    SQLite's lower() folds ASCII letters only, so other letters match case-sensitively there.
+    """
+    return crud.prefix_filter(func.lower(column), prefix.lower())
+
+def _date_of_birth_filter(date_of_birth: date):
+    start = datetime.combine(date_of_birth, datetime.min.time())
+    return (models.Order.date_of_birth >= start) & (models.Order.date_of_birth < start + timedelta(days=1))
+
+def _prefix_score(value: str, query: Optional[str]) -> Optional[float]:
+    if not query:
+        return None
+    return len(query) / max(len(value), len(query))
+
+def _score(order: models.Order, last_name: Optional[str], first_name: Optional[str]) -> float:
+    scores = [score for score in (_prefix_score(order.last_name, last_name), _prefix_score(order.first_name, first_name))
+              if score is not None]
+    return sum(scores) / len(scores) if scores else 1.0
+
+def prefix_search_statement(
+    last_name: Optional[str] = None,
+    first_name: Optional[str] = None,
+    date_of_birth: Optional[date] = None,
+    limit: int = 20
+):
+    """Orders in (lower(last_name), lower(first_name), date_of_birth) index order, so exact names come first."""
+    statement = select(models.Order)
+    if last_name:
+        statement = statement.where(_prefix_filter(models.Order.last_name, last_name))
+    if first_name:
+        statement = statement.where(_prefix_filter(models.Order.first_name, first_name))
+    if date_of_birth:
+        statement = statement.where(_date_of_birth_filter(date_of_birth))
+    if last_name:
+        order_by = (func.lower(models.Order.last_name), func.lower(models.Order.first_name), models.Order.date_of_birth)
+    else:
+        order_by = (models.Order.date_of_birth,)
+    return statement.order_by(*order_by, models.Order.id).limit(limit)
+
+def _trigram_match(*terms: Optional[str]) -> str:
+    """FTS5 query matching any trigram of the terms, so bm25 ranks by trigram overlap."""
+    trigrams = []
+    for term in terms:
+        term = (term or "").lower()
+        trigrams.extend(term[position:position + 3] for position in range(len(term) - 2))
+    return " OR ".join('"' + trigram.replace('"', '""') + '"' for trigram in dict.fromkeys(trigrams))
+
+def _fuzzy_candidates(
+    db: Session, last_name: Optional[str], first_name: Optional[str], date_of_birth: Optional[date], limit: int
+) -> List[Tuple[int, float]]:
+    """(order id, score) pairs from the trigram index, best first."""
+    params = {"limit": limit}
+    dob_clause = ""
+    if date_of_birth:
+        params["dob_start"] = datetime.combine(date_of_birth, datetime.min.time())
+        params["dob_end"] = params["dob_start"] + timedelta(days=1)
+        dob_clause = "AND o.date_of_birth >= :dob_start AND o.date_of_birth < :dob_end "
+
+    if engine.dialect.name == "postgresql":
+        params["query"] = " ".join(term.lower() for term in (last_name, first_name) if term)
+        params["min_similarity"] = ORDER_SEARCH_MIN_SIMILARITY
+        name = "lower(o.last_name) || ' ' || lower(o.first_name)"
+        rows = db.execute(text(
+            f"SELECT o.id, similarity({name}, :query) AS score FROM orders o "
+            f"WHERE {name} % :query {dob_clause}"
+            f"AND similarity({name}, :query) >= :min_similarity "
+            f"ORDER BY score DESC, o.id LIMIT :limit"
+        ), params)
+        return [(row_id, float(score)) for row_id, score in rows]
+
+    params["match"] = _trigram_match(last_name, first_name)
+    if not params["match"]:
+        raise ValueError("Fuzzy search needs a name of at least 3 characters")
+    rows = db.execute(text(
+        f"SELECT o.id, bm25({FTS_TABLE}) AS rank FROM {FTS_TABLE} JOIN orders o ON o.id = {FTS_TABLE}.rowid "
+        f"WHERE {FTS_TABLE} MATCH :match {dob_clause}"
+        f"ORDER BY rank, o.id LIMIT :limit"
+    ), params)
+    # bm25 is negative, lower is better
+    return [(row_id, -float(rank)) for row_id, rank in rows]
+
+def search_orders(
+    db: Session,
+    last_name: Optional[str] = None,
+    first_name: Optional[str] = None,
+    date_of_birth: Optional[date] = None,
+    fuzzy: bool = False,
+    limit: int = 20
+) -> List[Tuple[models.Order, float]]:
+    """
+    Find orders by name prefix and/or date of birth, ranked best first.
+    With fuzzy, names are matched by trigram similarity instead of prefix.
+    """
+    if fuzzy:
+        candidates = _fuzzy_candidates(db, last_name, first_name, date_of_birth, limit)
+        orders = {order.id: order for order in db.query(models.Order).filter(
+            models.Order.id.in_([order_id for order_id, _ in candidates])
+        )}
+        return [(orders[order_id], score) for order_id, score in candidates if order_id in orders]
+
+    orders = db.execute(prefix_search_statement(last_name, first_name, date_of_birth, limit)).scalars().all()
+    results = [(order, _score(order, last_name, first_name)) for order in orders]
+    # Stable sort keeps index order among equal scores
+    results.sort(key=lambda result: -result[1])
+    return results
+
+async def search_orders_async(db: AsyncSession, **kwargs) -> List[Tuple[models.Order, float]]:
+    return await db.run_sync(lambda session: search_orders(session, **kwargs))
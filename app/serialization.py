@@ -0,0 +1,35 @@
+import json
+import os
+from datetime import date, datetime
+from typing import Any, Iterable, List, Sequence
+
+from starlette.responses import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Serialize list endpoints (/orders/, /activity-logs/) from row tuples instead of validating a Pydantic model per row
+FAST_LIST_RESPONSES = os.getenv("FAST_LIST_RESPONSES", "true").lower() == "true"
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(content: Any) -> bytes:
+    """Compact JSON bytes, via orjson when installed; naive datetimes are written like Pydantic's isoformat()."""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, default=_default, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+def rows_response(rows: Iterable[Sequence], fields: List[str]) -> FastJSONResponse:
+    """JSON array of objects, one per row tuple, with fields as keys in order."""
+    return FastJSONResponse([dict(zip(fields, row)) for row in rows])
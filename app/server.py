@@ -0,0 +1,87 @@
+"""
+Production entry point: python -m app.server
+
+Creates the tables once, then starts WEB_CONCURRENCY uvicorn workers that warm up before accepting
+requests. Activity log maintenance runs in this supervising process instead of in every worker.
+"""
+
+import os
+import threading
+import time
+from typing import Dict
+
+# Server settings (PORT is also what Railway sets)
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8000"))
+# Proxy addresses trusted to set X-Forwarded-For, comma separated; the client address (and so the per-client
+# admission limits) comes from that header only for these. "*" is safe only if the app is reachable
+# solely through the proxy, otherwise any client can pick its own address.
+FORWARDED_ALLOW_IPS = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
+# Load the PDF stack and start extraction processes before a worker accepts requests
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+# Seconds a stopping worker waits for background extraction jobs (in-flight requests are drained by uvicorn first)
+SHUTDOWN_TIMEOUT = float(os.getenv("SHUTDOWN_TIMEOUT", "30"))
+
+# Set for the workers of a supervisor that already created the tables and runs maintenance
+SUPERVISOR_ENV = "GENHEALTH_SUPERVISOR_PID"
+
+def supervised() -> bool:
+    return bool(os.getenv(SUPERVISOR_ENV))
+
+def report_startup(phases: Dict[str, float]):
+    """Print and export how long this worker took to start."""
+    from . import metrics
+
+    phases["total"] = sum(phases.values())
+    for phase, seconds in phases.items():
+        metrics.worker_startup_seconds.set(seconds, phase)
+    details = ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in phases.items() if phase != "total")
+    print(f"🚀 Worker {os.getpid()} ready in {phases['total']:.2f}s ({details})")
+
+def _maintenance_loop(stop: threading.Event, interval: float):
+    from .log_storage import run_maintenance
+
+    while True:
+        try:
+            run_maintenance()
+        except Exception as e:
+            print(f"Error maintaining activity logs: {str(e)}")
+        if stop.wait(interval):
+            return
+
+def main():
+    import uvicorn
+
+    from .database import create_tables
+    from .log_storage import ACTIVITY_LOG_MAINTENANCE_INTERVAL
+
+    # Each web worker has its own extraction processes; share the cores unless configured explicitly
+    os.environ.setdefault("EXTRACTION_WORKERS", str(max(1, (os.cpu_count() or 1) // WEB_CONCURRENCY)))
+    # Tell the workers how many of them there are (the per-process order cache is unsafe with more than one)
+    os.environ["WEB_CONCURRENCY"] = str(WEB_CONCURRENCY)
+
+    started = time.perf_counter()
+    create_tables()
+    os.environ[SUPERVISOR_ENV] = str(os.getpid())
+    print(f"🗄️  Tables ready in {time.perf_counter() - started:.2f}s")
+
+    stop = threading.Event()
+    if ACTIVITY_LOG_MAINTENANCE_INTERVAL > 0:
+        threading.Thread(
+            target=_maintenance_loop, args=(stop, ACTIVITY_LOG_MAINTENANCE_INTERVAL), name="activity-log-maintenance",
+            daemon=True
+        ).start()
+
+    print(f"🚀 Starting {WEB_CONCURRENCY} workers on {HOST}:{PORT}")
+    try:
+        # On SIGTERM uvicorn stops accepting connections and lets in-flight requests finish before shutdown
+        uvicorn.run(
+            "app.main:app", host=HOST, port=PORT, workers=WEB_CONCURRENCY, proxy_headers=True,
+            forwarded_allow_ips=FORWARDED_ALLOW_IPS
+        )
+    finally:
+        stop.set()
+
+if __name__ == "__main__":
+    main()
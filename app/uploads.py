@@ -0,0 +1,156 @@
+import os
+import shutil
+import tempfile
+from typing import IO, Dict, Optional
+
+from .utils import open_pdf_stream
+
+# Upload limits
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", str(50 * 1024 * 1024)))  # bytes per PDF
+MAX_BATCH_UPLOAD_SIZE = int(os.getenv("MAX_BATCH_UPLOAD_SIZE", str(1024 * 1024 * 1024)))  # bytes per batch request
+MAX_PDF_PAGES = int(os.getenv("MAX_PDF_PAGES", "200"))
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# PDF readers accept the header anywhere in the first 1024 bytes
+PDF_HEADER = b"%PDF-"
+PDF_HEADER_WINDOW = 1024
+
+class InvalidUploadError(Exception):
+    """Raised when an uploaded file is rejected; carries the HTTP status to answer with."""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+def spool_to_file(source: IO[bytes], max_size: int = MAX_UPLOAD_SIZE) -> str:
+    """
+    Copy an upload stream to a temporary file in fixed-size chunks and return its path.
+    The caller owns the file and must remove it with remove_file.
+    """
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as target:
+        try:
+            size = 0
+            while True:
+                chunk = source.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_size:
+                    raise InvalidUploadError(f"File is larger than {max_size} bytes", status_code=413)
+                target.write(chunk)
+        except Exception:
+            remove_file(target.name)
+            raise
+    return target.name
+
+def link_file(path: str) -> str:
+    """
+    Give the file at path a second name (a hard link, or a copy where links are not supported) and return it.
+    The caller owns the new name and must remove it with remove_file; removing the original does not affect it.
+    """
+    directory, name = os.path.split(path)
+    descriptor, target = tempfile.mkstemp(suffix=os.path.splitext(name)[1], dir=directory or None)
+    os.close(descriptor)
+    os.remove(target)
+    try:
+        os.link(path, target)
+    except OSError:
+        shutil.copyfile(path, target)
+    return target
+
+def check_pdf(path: str, max_pages: int = MAX_PDF_PAGES) -> int:
+    """Check the PDF header and page count before any text extraction; returns the page count."""
+    import PyPDF2
+
+    with open(path, "rb") as pdf_file:
+        if PDF_HEADER not in pdf_file.read(PDF_HEADER_WINDOW):
+            raise InvalidUploadError("File is not a PDF")
+    try:
+        with open_pdf_stream(path) as pdf_stream:
+            page_count = len(PyPDF2.PdfReader(pdf_stream).pages)
+    except Exception as e:
+        raise InvalidUploadError(f"Could not read PDF: {str(e)}")
+    if page_count > max_pages:
+        raise InvalidUploadError(f"PDF has {page_count} pages; at most {max_pages} are allowed", status_code=413)
+    return page_count
+
+def remove_file(path: Optional[str]):
+    if path:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+class UploadSizeLimitMiddleware:
+    """
+    ASGI middleware that caps request bodies for upload routes while they stream in.
+    Requests over the limit are answered with 413 without reading the rest of the body.
+    """
+
+    def __init__(self, app, limits: Dict[str, int]):
+        self.app = app
+        # Longest prefix first so /upload/batch wins over /upload/
+        self.limits = sorted(limits.items(), key=lambda item: len(item[0]), reverse=True)
+
+    def _limit_for(self, path: str) -> Optional[int]:
+        for prefix, limit in self.limits:
+            if path.startswith(prefix):
+                return limit
+        return None
+
+    async def __call__(self, scope, receive, send):
+        limit = self._limit_for(scope["path"]) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        content_length = headers.get(b"content-length")
+        if content_length and content_length.isdigit() and int(content_length) > limit:
+            await self._reject(send, limit)
+            return
+
+        received = 0
+        too_large = False
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received, too_large
+            if too_large:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    too_large = True
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message):
+            nonlocal response_started
+            if too_large:
+                # Replace whatever the app answers after the body was cut off
+                if not response_started:
+                    response_started = True
+                    await self._reject(send, limit)
+                return
+            response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not too_large:
+                raise
+            if not response_started:
+                response_started = True
+                await self._reject(send, limit)
+
+    async def _reject(self, send, limit: int):
+        body = f'{{"detail":"Request body is larger than {limit} bytes"}}'.encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -1,204 +1,500 @@
-import PyPDF2
+import importlib
+import mmap
 import re
 import os
+import shlex
 import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Optional
+from io import BytesIO
+from typing import IO, Dict, Iterator, List, NamedTuple, Optional, Tuple, Type, Union
 from .schemas import PatientInfo
+from .extractor import extract_fields, PatientFields
 
-# OCR imports
-try:
-    import pytesseract
-    from pdf2image import convert_from_bytes
-    from PIL import Image
-    OCR_AVAILABLE = True
-except ImportError:
-    OCR_AVAILABLE = False
-    print("OCR libraries not available. Install pytesseract, pdf2image, and Pillow for OCR support.")
-
-def extract_patient_info_from_pdf(pdf_content: bytes) -> Optional[PatientInfo]:
+# OCR settings
+OCR_DPI = int(os.getenv("OCR_DPI", "300"))  # full-quality pass
+OCR_FAST_DPI = int(os.getenv("OCR_FAST_DPI", "150"))  # first pass over scanned pages (0 = skip it)
+OCR_CONFIG = os.getenv("OCR_CONFIG", r'--oem 3 --psm 6')
+# Pages whose text layer has fewer characters than this are treated as scanned and OCR'd
+OCR_MIN_TEXT_CHARS = int(os.getenv("OCR_MIN_TEXT_CHARS", "20"))
+# Lowest field confidence (see extractor rules) accepted without OCRing more pages or re-OCRing at OCR_DPI
+OCR_CONFIDENCE_THRESHOLD = float(os.getenv("OCR_CONFIDENCE_THRESHOLD", "0.5"))
+# Number of processes used to OCR pages in parallel (1 = OCR pages in this process)
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(os.cpu_count() or 1)))
+
+# OCR backends: "auto" picks the first installed one in OCR_RENDERERS / OCR_ENGINES order,
+# a name picks that one, and "package.module:ClassName" loads a custom PageRenderer / OCREngine
+OCR_RENDERER = os.getenv("OCR_RENDERER", "auto")
+OCR_ENGINE = os.getenv("OCR_ENGINE", "auto")
+
+def _importable(*modules: str) -> bool:
+    try:
+        for module in modules:
+            importlib.import_module(module)
+        return True
+    except ImportError:
+        return False
+
+class PageRenderer:
+    """Rasterizes one page (1-based) of a PDF file into an in-memory grayscale PIL image."""
+    name = ""
+
+    @classmethod
+    def available(cls) -> bool:
+        return False
+
+    def render(self, pdf_path: str, page_number: int, dpi: int):
+        raise NotImplementedError
+
+class PdfiumRenderer(PageRenderer):
+    """PDFium through pypdfium2: renders in this process, with no subprocess or image files."""
+    name = "pdfium"
+
+    @classmethod
+    def available(cls) -> bool:
+        return _importable("pypdfium2", "PIL")
+
+    def __init__(self):
+        import pypdfium2
+        self._pdfium = pypdfium2
+        # PDFium is not thread-safe
+        self._lock = threading.Lock()
+
+    def render(self, pdf_path: str, page_number: int, dpi: int):
+        with self._lock:
+            document = self._pdfium.PdfDocument(pdf_path)
+            try:
+                return document[page_number - 1].render(scale=dpi / 72, grayscale=True).to_pil()
+            finally:
+                document.close()
+
+class PdftoppmRenderer(PageRenderer):
+    """Poppler's pdftoppm through pdf2image: one subprocess per page, its image piped back in memory."""
+    name = "pdftoppm"
+
+    @classmethod
+    def available(cls) -> bool:
+        return _importable("pdf2image", "PIL")
+
+    def render(self, pdf_path: str, page_number: int, dpi: int):
+        from pdf2image import convert_from_path
+        return convert_from_path(pdf_path, dpi=dpi, first_page=page_number, last_page=page_number, grayscale=True)[0]
+
+class OCREngine:
+    """Reads the text of a page image. Created once per process and reused for every page."""
+    name = ""
+
+    @classmethod
+    def available(cls) -> bool:
+        return False
+
+    def image_to_string(self, image) -> str:
+        raise NotImplementedError
+
+def _parse_tesseract_config(config: str) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """Split tesseract command line options into (--oem/--psm/-l options, -c variables)."""
+    options, variables = {}, {}
+    args = shlex.split(config)
+    for index, arg in enumerate(args[:-1]):
+        if arg in ("--oem", "--psm", "-l"):
+            options[arg.lstrip("-")] = args[index + 1]
+        elif arg == "-c" and "=" in args[index + 1]:
+            name, value = args[index + 1].split("=", 1)
+            variables[name] = value
+    return options, variables
+
+class TesserocrEngine(OCREngine):
+    """libtesseract through tesserocr: the model is loaded once per process, with no tesseract process per page."""
+    name = "tesserocr"
+
+    @classmethod
+    def available(cls) -> bool:
+        return _importable("tesserocr", "PIL")
+
+    def __init__(self, config: str = OCR_CONFIG):
+        from tesserocr import PyTessBaseAPI
+
+        options, variables = _parse_tesseract_config(config)
+        kwargs = {"lang": options.get("l", "eng")}
+        if "oem" in options:
+            kwargs["oem"] = int(options["oem"])
+        if "psm" in options:
+            kwargs["psm"] = int(options["psm"])
+        self._api = PyTessBaseAPI(**kwargs)
+        for name, value in variables.items():
+            self._api.SetVariable(name, value)
+        # One TessBaseAPI handles one image at a time
+        self._lock = threading.Lock()
+
+    def image_to_string(self, image) -> str:
+        with self._lock:
+            self._api.SetImage(image)
+            return self._api.GetUTF8Text()
+
+class PytesseractEngine(OCREngine):
+    """The tesseract command through pytesseract: one process per page, which reloads the model every time."""
+    name = "pytesseract"
+
+    @classmethod
+    def available(cls) -> bool:
+        return _importable("pytesseract", "PIL")
+
+    def __init__(self, config: str = OCR_CONFIG):
+        self.config = config
+
+    def image_to_string(self, image) -> str:
+        import pytesseract
+        return pytesseract.image_to_string(image, config=self.config)
+
+# Fastest first, as tried by "auto"; add entries to make more backends selectable by name
+OCR_RENDERERS: Dict[str, Type[PageRenderer]] = {"pdfium": PdfiumRenderer, "pdftoppm": PdftoppmRenderer}
+OCR_ENGINES: Dict[str, Type[OCREngine]] = {"tesserocr": TesserocrEngine, "pytesseract": PytesseractEngine}
+
+def _select_backend(backends: Dict[str, type], setting: str) -> Optional[type]:
+    if setting == "auto":
+        return next((backend for backend in backends.values() if backend.available()), None)
+    if setting in backends:
+        backend = backends[setting]
+    else:
+        module_name, _, class_name = setting.partition(":")
+        backend = getattr(importlib.import_module(module_name), class_name)
+    return backend if backend.available() else None
+
+# (renderer class, engine class) once selected, False when OCR is not available
+_ocr_backend_classes = None
+# This process's renderer and engine, created on first use
+_ocr_backends: Optional[Tuple[PageRenderer, OCREngine]] = None
+_ocr_backends_lock = threading.Lock()
+
+def ocr_available() -> bool:
+    """Whether a page renderer and an OCR engine are installed; imports them on the first call."""
+    global _ocr_backend_classes
+    if _ocr_backend_classes is None:
+        try:
+            renderer = _select_backend(OCR_RENDERERS, OCR_RENDERER)
+            engine = _select_backend(OCR_ENGINES, OCR_ENGINE)
+        except (ImportError, AttributeError, ValueError) as e:
+            print(f"❌ Invalid OCR_RENDERER / OCR_ENGINE: {str(e)}")
+            renderer = engine = None
+        _ocr_backend_classes = (renderer, engine) if renderer and engine else False
+        if not _ocr_backend_classes:
+            print("OCR libraries not available. Install pypdfium2 (or pdf2image), tesserocr (or pytesseract), "
+                  "and Pillow for OCR support.")
+    return bool(_ocr_backend_classes)
+
+def get_ocr_backends() -> Tuple[PageRenderer, OCREngine]:
+    """This process's page renderer and OCR engine, created on first use and reused for every page."""
+    global _ocr_backends
+    with _ocr_backends_lock:
+        if _ocr_backends is None:
+            if not ocr_available():
+                raise RuntimeError("OCR is not available")
+            renderer_class, engine_class = _ocr_backend_classes
+            _ocr_backends = (renderer_class(), engine_class())
+            print(f"🔍 OCR backends in process {os.getpid()}: {renderer_class.name} + {engine_class.name}")
+        return _ocr_backends
+
+# A PDF is passed around either as its content or as a path to a file on disk
+PDFSource = Union[bytes, str]
+
+_ocr_executor: Optional[ProcessPoolExecutor] = None
+
+def _get_ocr_executor() -> ProcessPoolExecutor:
+    global _ocr_executor
+    if _ocr_executor is None:
+        _ocr_executor = ProcessPoolExecutor(max_workers=OCR_WORKERS)
+    return _ocr_executor
+
+@contextmanager
+def open_pdf_stream(pdf: PDFSource) -> Iterator[IO]:
+    """File-like view of a PDF: a BytesIO for bytes, a read-only mmap for a path (no copy)."""
+    if isinstance(pdf, (bytes, bytearray)):
+        yield BytesIO(pdf)
+        return
+    with open(pdf, "rb") as pdf_file, mmap.mmap(pdf_file.fileno(), 0, access=mmap.ACCESS_READ) as pdf_map:
+        yield pdf_map
+
+@contextmanager
+def pdf_file_path(pdf: PDFSource) -> Iterator[str]:
+    """Path of a PDF on disk, writing bytes to a temporary file when needed."""
+    if not isinstance(pdf, (bytes, bytearray)):
+        yield pdf
+        return
+    with tempfile.NamedTemporaryFile(suffix=".pdf") as pdf_file:
+        pdf_file.write(pdf)
+        pdf_file.flush()
+        yield pdf_file.name
+
+class PageReport(NamedTuple):
+    """How one page's text was obtained and how long it took."""
+    page: int
+    source: str  # "text" for the embedded text layer, "ocr" for a rasterized page
+    dpi: Optional[int]
+    seconds: float
+    chars: int
+    rasterize_seconds: float = 0.0  # part of seconds spent rendering the page for OCR
+
+class ExtractionReport:
+    """
+    Pages read and seconds spent per stage during one extraction.
+    Plain data so it can be returned from extraction worker processes.
+    """
+
+    def __init__(self):
+        self.pages: List[PageReport] = []
+        # stage name -> durations in seconds, one per page or call
+        self.stages: Dict[str, List[float]] = {}
+
+    def record(self, stage: str, seconds: float):
+        self.stages.setdefault(stage, []).append(seconds)
+
+    def add_page(self, page: PageReport):
+        self.pages.append(page)
+        if page.source == "ocr":
+            self.record("rasterize", page.rasterize_seconds)
+            self.record("tesseract", page.seconds - page.rasterize_seconds)
+
+    def extract_fields(self, text: str) -> PatientFields:
+        started = time.perf_counter()
+        fields = extract_fields(text)
+        self.record("field_extraction", time.perf_counter() - started)
+        return fields
+
+def extract_patient_info_from_pdf(pdf: PDFSource) -> Optional[PatientInfo]:
     """
-    Extract patient information from PDF content.
+    Extract patient information from PDF content or a path to a PDF file.
     Returns PatientInfo object with first_name, last_name, and date_of_birth.
     """
+    patient_info, _ = extract_patient_info_with_report(pdf)
+    return patient_info
+
+def extract_patient_info_with_report(pdf: PDFSource) -> Tuple[Optional[PatientInfo], ExtractionReport]:
+    """
+    Extract patient information and report how each page was read and how long each stage took.
+    Pages with a text layer are never OCR'd; pages without one are OCR'd at OCR_FAST_DPI
+    and re-OCR'd at OCR_DPI only while the extracted fields stay below OCR_CONFIDENCE_THRESHOLD.
+    """
+    import PyPDF2
+
+    report = ExtractionReport()
     try:
-        # Create a BytesIO object to make bytes file-like
-        from io import BytesIO
-        pdf_file = BytesIO(pdf_content)
+        parse_started = time.perf_counter()
+        with open_pdf_stream(pdf) as pdf_file:
+            # Create PDF reader object
+            pdf_reader = PyPDF2.PdfReader(pdf_file)
+            
+            # Check if PDF is encrypted
+            if pdf_reader.is_encrypted:
+                print("PDF is encrypted/password protected")
+                return None, report
+            
+            # Extract the text layer of every page
+            page_texts = []
+            for page_number, page in enumerate(pdf_reader.pages, start=1):
+                started = time.perf_counter()
+                page_text = page.extract_text() or ""
+                page_texts.append(page_text)
+                report.add_page(PageReport(page_number, "text", None, time.perf_counter() - started, len(page_text)))
+        report.record("pdf_parse", time.perf_counter() - parse_started)
         
-        # Create PDF reader object
-        pdf_reader = PyPDF2.PdfReader(pdf_file)
+        fields = report.extract_fields("".join(page_texts))
         
-        # Check if PDF is encrypted
-        if pdf_reader.is_encrypted:
-            print("PDF is encrypted/password protected")
-            return None
-        
-        # Extract text from all pages
-        text = ""
-        for page in pdf_reader.pages:
-            text += page.extract_text()
-        
-        # If no text extracted, try OCR for image-based PDFs
-        if not text.strip():
-            if OCR_AVAILABLE:
-                print("📄 Extracting patient info using OCR...")
-                ocr_text = extract_text_with_ocr(pdf_content)
-                if ocr_text:
-                    # Extract patient information from OCR text
-                    first_name = extract_first_name(ocr_text)
-                    last_name = extract_last_name(ocr_text)
-                    date_of_birth = extract_date_of_birth(ocr_text)
-                    
-                    print(f"✅ Patient Info: {first_name} {last_name}, DOB: {date_of_birth}")
-                    
-                    if first_name and last_name and date_of_birth:
-                        return PatientInfo(
-                            first_name=first_name,
-                            last_name=last_name,
-                            date_of_birth=date_of_birth
-                        )
-                else:
-                    print("❌ Failed to extract patient info from PDF")
+        # OCR only the pages without a usable text layer, and only if the text layer was not enough
+        scanned_pages = [number for number, page_text in enumerate(page_texts, start=1)
+                         if len(page_text.strip()) < OCR_MIN_TEXT_CHARS]
+        if scanned_pages and not _is_confident(fields):
+            if ocr_available():
+                print(f"📄 Extracting patient info using OCR ({len(scanned_pages)} of {len(page_texts)} pages)...")
+                fields = _ocr_scanned_pages(pdf, page_texts, scanned_pages, report)
+                _print_ocr_report(report)
             else:
                 print("❌ OCR not available for image-based PDFs")
-            return None
-        
-        # Extract patient information using regex patterns
-        first_name = extract_first_name(text)
-        last_name = extract_last_name(text)
-        date_of_birth = extract_date_of_birth(text)
         
-        if first_name and last_name and date_of_birth:
-            print(f"✅ Patient Info: {first_name} {last_name}, DOB: {date_of_birth}")
+        if fields.complete:
+            print(f"✅ Patient Info: {_describe_fields(fields)}")
             return PatientInfo(
-                first_name=first_name,
-                last_name=last_name,
-                date_of_birth=date_of_birth
-            )
+                first_name=fields.first_name.value,
+                last_name=fields.last_name.value,
+                date_of_birth=fields.date_of_birth.value
+            ), report
         
-        return None
+        if scanned_pages:
+            print("❌ Failed to extract patient info from PDF")
+        return None, report
         
     except Exception as e:
         print(f"Error parsing PDF: {str(e)}")
-        return None
+        return None, report
+
+def warm_up():
+    """Import the PDF and OCR stacks and exercise them once, so their lazy setup is not paid by a request."""
+    import PyPDF2
+
+    writer = PyPDF2.PdfWriter()
+    writer.add_blank_page(width=72, height=72)
+    pdf = BytesIO()
+    writer.write(pdf)
+    for page in PyPDF2.PdfReader(BytesIO(pdf.getvalue())).pages:
+        page.extract_text()
+    extract_fields("Patient Name: John Smith\nDate of Birth: 01/02/1990")
+    if ocr_available() and OCR_WORKERS <= 1:
+        # This process OCRs pages itself: load the engine (the Tesseract model, for tesserocr) now
+        from PIL import Image
+        try:
+            get_ocr_backends()[1].image_to_string(Image.new("L", (32, 32), 255))
+        except Exception as e:
+            print(f"❌ OCR engine is not usable: {str(e)}")
+
+def _is_confident(fields: PatientFields) -> bool:
+    return fields.complete and fields.confidence >= OCR_CONFIDENCE_THRESHOLD
+
+def _ocr_passes() -> List[int]:
+    """DPIs to OCR scanned pages at, cheapest first."""
+    if 0 < OCR_FAST_DPI < OCR_DPI:
+        return [OCR_FAST_DPI, OCR_DPI]
+    return [OCR_DPI]
+
+def _ocr_scanned_pages(pdf: PDFSource, page_texts: List[str], scanned_pages: List[int],
+                       report: ExtractionReport) -> PatientFields:
+    """
+    OCR the scanned pages, one pass per DPI, replacing their text as results arrive.
+    The first pass goes in page order; later passes skip or defer the pages whose matches are confident
+    already (see _reocr_order). Stops as soon as the whole document yields all three fields with enough
+    confidence.
+    """
+    page_texts = list(page_texts)
+    fields = report.extract_fields("".join(page_texts))
+    pages = scanned_pages
+    try:
+        with pdf_file_path(pdf) as pdf_path:
+            for dpi in _ocr_passes():
+                for page_number, page_text, rasterize_seconds, ocr_seconds in ocr_pages(pdf_path, pages, dpi):
+                    page_texts[page_number - 1] = page_text + "\n"
+                    report.add_page(PageReport(
+                        page_number, "ocr", dpi, rasterize_seconds + ocr_seconds, len(page_text), rasterize_seconds
+                    ))
+                    fields = report.extract_fields("".join(page_texts))
+                    if _is_confident(fields):
+                        return fields
+                pages = _reocr_order(fields, page_texts, scanned_pages, report)
+    except Exception as e:
+        print(f"❌ OCR Error: {str(e)}")
+    return fields
+
+def _reocr_order(fields: PatientFields, page_texts: List[str], scanned_pages: List[int],
+                 report: ExtractionReport) -> List[int]:
+    """
+    Scanned pages to re-OCR, in order: pages that yielded a winning match below the confidence threshold,
+    then pages that yielded none. Pages whose winning matches are all confident keep their text, unless a
+    field was not found at all and may be on them, in which case they come last. A page is credited with
+    a match when extracting from its text alone finds the same one.
+    """
+    weak, unmatched, settled = [], [], []
+    for page_number in scanned_pages:
+        page_fields = report.extract_fields(page_texts[page_number - 1])
+        won = [match for match, page_match in zip(fields, page_fields)
+               if match is not None and page_match is not None
+               and (page_match.value, page_match.rule) == (match.value, match.rule)]
+        if any(match.confidence < OCR_CONFIDENCE_THRESHOLD for match in won):
+            weak.append(page_number)
+        elif won:
+            settled.append(page_number)
+        else:
+            unmatched.append(page_number)
+    if fields.complete:
+        return weak + unmatched
+    return weak + unmatched + settled
+
+def _print_ocr_report(report: ExtractionReport):
+    ocr_reports = [page for page in report.pages if page.source == "ocr"]
+    pages = ", ".join(f"p{page.page}@{page.dpi}dpi {page.seconds:.2f}s" for page in ocr_reports)
+    print(f"⏱️ OCR time {sum(page.seconds for page in ocr_reports):.2f}s: {pages}")
+
+def _describe_fields(fields: PatientFields) -> str:
+    values = [match.value if match else None for match in fields]
+    rules = [match.rule if match else None for match in fields]
+    return f"{values[0]} {values[1]}, DOB: {values[2]} (rules: {', '.join(map(str, rules))}; confidence {fields.confidence:.2f})"
 
 def extract_first_name(text: str) -> Optional[str]:
     """Extract first name from text using various patterns."""
-    # Look for the specific pattern in your PDF
-    specific_pattern = r"Patient Name[^:]*?Patient Date of Birth\s*([A-Z][a-z]+)\s+([A-Z][a-z]+)"
-    match = re.search(specific_pattern, text, re.IGNORECASE)
-    if match:
-        first_name = match.group(1).strip()
-        last_name = match.group(2).strip()
-        # Filter out common non-name words
-        if (first_name.lower() not in ['patient', 'name', 'first', 'last', 'given', 'surname', 'and', 'address'] and
-            last_name.lower() not in ['patient', 'name', 'first', 'last', 'given', 'surname', 'and', 'address']):
-            return first_name
-    
-    # Fallback patterns
-    patterns = [
-        r"Name[:\s]*([A-Z][a-z]+)\s+[A-Z][a-z]+",  # "Name: John Doe"
-        r"First Name[:\s]*([A-Za-z]+)",
-        r"Given Name[:\s]*([A-Za-z]+)",
-        r"Patient First Name[:\s]*([A-Za-z]+)",
-        r"First[:\s]*([A-Za-z]+)",
-        r"F\.?Name[:\s]*([A-Za-z]+)",
-        r"Patient[:\s]*([A-Za-z]+)\s+[A-Za-z]+",  # First word after "Patient:"
-        r"([A-Z][a-z]+)\s+[A-Z][a-z]+",  # Two capitalized words (common name pattern)
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            name = match.group(1).strip()
-            # Filter out common non-name words
-            if name.lower() not in ['patient', 'name', 'first', 'last', 'given', 'surname']:
-                return name
-    
-    return None
+    match = extract_fields(text).first_name
+    return match.value if match else None
 
 def extract_last_name(text: str) -> Optional[str]:
     """Extract last name from text using various patterns."""
-    # Look for the specific pattern in your PDF
-    specific_pattern = r"Patient Name[^:]*?Patient Date of Birth\s*([A-Z][a-z]+)\s+([A-Z][a-z]+)"
-    match = re.search(specific_pattern, text, re.IGNORECASE)
-    if match:
-        first_name = match.group(1).strip()
-        last_name = match.group(2).strip()
-        # Filter out common non-name words
-        if (first_name.lower() not in ['patient', 'name', 'first', 'last', 'given', 'surname', 'and', 'address'] and
-            last_name.lower() not in ['patient', 'name', 'first', 'last', 'given', 'surname', 'and', 'address']):
-            return last_name
-    
-    # Fallback patterns
-    patterns = [
-        r"Name[:\s]*[A-Za-z]+\s+([A-Za-z]+)",  # Second word in "Name: John Doe"
-        r"Last Name[:\s]*([A-Za-z]+)",
-        r"Surname[:\s]*([A-Za-z]+)",
-        r"Patient Last Name[:\s]*([A-Za-z]+)",
-        r"Last[:\s]*([A-Za-z]+)",
-        r"L\.?Name[:\s]*([A-Za-z]+)",
-        r"Patient[:\s]*[A-Za-z]+\s+([A-Za-z]+)",  # Second word after "Patient:"
-        r"[A-Z][a-z]+\s+([A-Z][a-z]+)",  # Second capitalized word (common name pattern)
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            name = match.group(1).strip()
-            # Filter out common non-name words
-            if name.lower() not in ['patient', 'name', 'first', 'last', 'given', 'surname']:
-                return name
-    
-    return None
+    match = extract_fields(text).last_name
+    return match.value if match else None
 
 def extract_date_of_birth(text: str) -> Optional[datetime]:
     """Extract date of birth from text using various patterns."""
-    patterns = [
-        r"Date of Birth[:\s]*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})",
-        r"DOB[:\s]*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})",
-        r"Birth Date[:\s]*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})",
-        r"Born[:\s]*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})",
-        r"Birth[:\s]*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})",
-        r"(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})",  # Any date pattern
-        r"(\d{4}-\d{2}-\d{2})",  # YYYY-MM-DD format
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            date_str = match.group(1)
-            try:
-                # Try different date formats
-                for fmt in ["%m/%d/%Y", "%m/%d/%y", "%m-%d-%Y", "%m-%d-%y", "%Y-%m-%d"]:
-                    try:
-                        return datetime.strptime(date_str, fmt)
-                    except ValueError:
-                        continue
-            except:
-                continue
+    match = extract_fields(text).date_of_birth
+    return match.value if match else None
+
+def ocr_page(pdf_path: str, page_number: int, dpi: int = OCR_DPI) -> str:
+    """Rasterize and OCR a single page (1-based) of a PDF file."""
+    return timed_ocr_page(pdf_path, page_number, dpi)[0]
+
+def timed_ocr_page(pdf_path: str, page_number: int, dpi: int = OCR_DPI) -> Tuple[str, float, float]:
+    """OCR a page and return its text with the seconds spent rasterizing it and running the OCR engine."""
+    renderer, engine = get_ocr_backends()
+    started = time.perf_counter()
+    image = renderer.render(pdf_path, page_number, dpi)
+    rasterized = time.perf_counter()
+    page_text = engine.image_to_string(image)
+    return page_text, rasterized - started, time.perf_counter() - rasterized
+
+def ocr_pages(pdf_path: str, page_numbers: List[int], dpi: int = OCR_DPI) -> Iterator[Tuple[int, str, float, float]]:
+    """
+    OCR pages across OCR_WORKERS processes and yield (page_number, text, rasterize seconds, OCR seconds)
+    in page order. At most OCR_WORKERS pages are in flight; closing the generator cancels pages not yet started.
+    """
+    if OCR_WORKERS <= 1:
+        for page_number in page_numbers:
+            yield (page_number, *timed_ocr_page(pdf_path, page_number, dpi))
+        return
     
-    return None 
+    executor = _get_ocr_executor()
+    queued = deque(page_numbers)
+    pending = deque()
+    try:
+        while queued or pending:
+            while queued and len(pending) < OCR_WORKERS:
+                page_number = queued.popleft()
+                pending.append((page_number, executor.submit(timed_ocr_page, pdf_path, page_number, dpi)))
+            page_number, future = pending.popleft()
+            yield (page_number, *future.result())
+    finally:
+        for _, future in pending:
+            future.cancel()
+
+def has_patient_info(text: str) -> bool:
+    """Check whether first name, last name and date of birth can all be extracted."""
+    return extract_fields(text).complete
 
-def extract_text_with_ocr(pdf_content: bytes) -> Optional[str]:
+def extract_text_with_ocr(pdf: PDFSource, page_count: Optional[int] = None, dpi: int = OCR_DPI) -> Optional[str]:
     """
-    Extract text from image-based PDF using OCR.
+    Extract text from image-based PDF (content or file path) using OCR.
+    Pages are rasterized one at a time and OCR'd across OCR_WORKERS processes, in page order.
+    Stops as soon as the text read so far contains the patient's name and date of birth.
     """
     try:
-        # Convert PDF pages to images
-        images = convert_from_bytes(pdf_content, dpi=300)
-        
-        # Extract text from each image using OCR
-        all_text = ""
-        for image in images:
-            # Configure OCR for better accuracy
-            custom_config = r'--oem 3 --psm 6'
-            page_text = pytesseract.image_to_string(image, config=custom_config)
-            all_text += page_text + "\n"
-        
-        return all_text
+        with pdf_file_path(pdf) as pdf_path:
+            if page_count is None:
+                import PyPDF2
+                with open_pdf_stream(pdf_path) as pdf_stream:
+                    page_count = len(PyPDF2.PdfReader(pdf_stream).pages)
+            
+            all_text = ""
+            for _, page_text, _, _ in ocr_pages(pdf_path, list(range(1, page_count + 1)), dpi):
+                all_text += page_text + "\n"
+                if has_patient_info(all_text):
+                    break
+            return all_text
         
     except Exception as e:
         print(f"❌ OCR Error: {str(e)}")
-        return None 
\ No newline at end of file
+        return None
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the extraction pipeline: extract_patient_info_from_pdf per document kind and page count,
+extract_first_name / extract_last_name / extract_date_of_birth on the documents' text, and page rendering
+of the scanned documents with every installed OCR renderer.
+Scanned documents are extracted only when the configured OCR backends (OCR_RENDERER, OCR_ENGINE) work.
+Run with: python benchmarks/bench_extraction.py [--documents 30] [--pages 1,5,20] [--scanned 0.25] [--repeat 3]
+                                                [--corpus DIR] [--save-baseline FILE | --baseline FILE --threshold 0.2]
+"""
+
+import argparse
+import contextlib
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Callable, Dict, List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from corpus import generate, load_corpus, parse_page_counts
+from results import add_baseline_arguments, check_baseline, print_report, summarize
+
+def ocr_installed() -> bool:
+    """Whether the configured OCR backends can read an image, including any binaries they need."""
+    from PIL import Image
+    from app import utils
+
+    if not utils.ocr_available():
+        return False
+    try:
+        utils.get_ocr_backends()[1].image_to_string(Image.new("L", (32, 32), 255))
+        return True
+    except Exception:
+        return False
+
+def time_renderers(documents: List[bytes], dpi: int, repeat: int) -> Dict[str, Dict[str, float]]:
+    """Render the first page of every document with each installed renderer."""
+    from app.utils import OCR_RENDERERS, pdf_file_path
+
+    results = {}
+    for name, renderer_class in OCR_RENDERERS.items():
+        if not renderer_class.available():
+            continue
+        renderer = renderer_class()
+        timings = []
+        try:
+            for pdf in documents:
+                with pdf_file_path(pdf) as pdf_path:
+                    page_timings, _ = time_calls(lambda path: renderer.render(path, 1, dpi), [pdf_path], repeat)
+                timings.extend(page_timings)
+        except Exception as e:  # e.g. pdftoppm not installed
+            print(f"skipping renderer {name}: {str(e)}")
+            continue
+        results[f"render_page[{name},{dpi}dpi]"] = summarize(timings)
+    return results
+
+def time_calls(func: Callable, inputs: List, repeat: int) -> Tuple[List[float], list]:
+    """Per-call timings over repeat rounds, and the outputs of the last round. Pipeline logging is silenced."""
+    timings = []
+    outputs = []
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(repeat):
+            outputs = []
+            for value in inputs:
+                started = time.perf_counter()
+                outputs.append(func(value))
+                timings.append(time.perf_counter() - started)
+    return timings, outputs
+
+def is_correct(entry: Dict, patient_info) -> bool:
+    return bool(patient_info) and (
+        patient_info.first_name == entry["first_name"]
+        and patient_info.last_name == entry["last_name"]
+        and patient_info.date_of_birth == datetime.strptime(entry["date_of_birth"], "%Y-%m-%d")
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--corpus", help="directory written by corpus.py (default: generate in memory)")
+    parser.add_argument("--documents", type=int, default=30)
+    parser.add_argument("--pages", type=parse_page_counts, default=[1, 5, 20], help="comma-separated page counts")
+    parser.add_argument("--scanned", type=float, default=0.25, help="share of scanned documents")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1234)
+    add_baseline_arguments(parser)
+    args = parser.parse_args()
+
+    from app.utils import extract_date_of_birth, extract_first_name, extract_last_name, extract_patient_info_from_pdf
+    import PyPDF2
+    from io import BytesIO
+
+    if args.corpus:
+        corpus = load_corpus(args.corpus)
+    else:
+        corpus = list(generate(random.Random(args.seed), args.documents, args.pages, args.scanned))
+    scanned = [pdf for entry, pdf in corpus if entry["kind"] == "scanned"]
+    if scanned and not ocr_installed():
+        print("OCR backends not usable: skipping extraction of scanned documents")
+        corpus = [(entry, pdf) for entry, pdf in corpus if entry["kind"] != "scanned"]
+
+    groups = defaultdict(list)
+    for entry, pdf in corpus:
+        groups[(entry["kind"], entry["pages"])].append((entry, pdf))
+
+    results = {}
+    accuracy = {}
+    for (kind, pages), documents in sorted(groups.items()):
+        name = f"extract_patient_info_from_pdf[{kind},{pages}p]"
+        # Scanned documents are slow enough that one round is representative
+        timings, outputs = time_calls(extract_patient_info_from_pdf, [pdf for _, pdf in documents],
+                                      args.repeat if kind == "text" else 1)
+        correct = sum(1 for (entry, _), patient_info in zip(documents, outputs) if is_correct(entry, patient_info))
+        results[name] = summarize(timings, errors=len(documents) - correct)
+        accuracy[name] = f"{correct}/{len(documents)}"
+
+    texts = []
+    for entry, pdf in corpus:
+        if entry["kind"] == "text":
+            texts.append("".join(page.extract_text() or "" for page in PyPDF2.PdfReader(BytesIO(pdf)).pages))
+    for func in (extract_first_name, extract_last_name, extract_date_of_birth):
+        timings, _ = time_calls(func, texts, args.repeat)
+        results[func.__name__] = summarize(timings)
+
+    if scanned:
+        from app.utils import OCR_DPI, OCR_FAST_DPI
+        for dpi in sorted({OCR_FAST_DPI, OCR_DPI} - {0}):
+            results.update(time_renderers(scanned, dpi, args.repeat))
+
+    print(f"{len(corpus)} documents, {args.repeat} rounds (errors = documents extracted incorrectly)")
+    print_report(results)
+    for name, correct in accuracy.items():
+        print(f"accuracy {name}: {correct}")
+    return check_baseline(results, args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: compiled single-pass extractor vs. the original per-field regex functions.
+Run with: python benchmarks/bench_extractor.py [--pages 40] [--documents 50] [--repeat 3]
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+from datetime import datetime
+from typing import List, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from app.extractor import extract_fields
+
+# Original implementations from app/utils.py, kept as the baseline
+
+def legacy_extract_first_name(text: str) -> Optional[str]:
+    """Extract first name from text using various patterns."""
+    # Look for the specific pattern in your PDF
+    specific_pattern = r"Patient Name[^:]*?Patient Date of Birth\s*([A-Z][a-z]+)\s+([A-Z][a-z]+)"
+    match = re.search(specific_pattern, text, re.IGNORECASE)
+    if match:
+        first_name = match.group(1).strip()
+        last_name = match.group(2).strip()
+        # Filter out common non-name words
+        if (first_name.lower() not in ['patient', 'name', 'first', 'last', 'given', 'surname', 'and', 'address'] and
+            last_name.lower() not in ['patient', 'name', 'first', 'last', 'given', 'surname', 'and', 'address']):
+            return first_name
+    
+    # Fallback patterns
+    patterns = [
+        r"Name[:\s]*([A-Z][a-z]+)\s+[A-Z][a-z]+",  # "Name: John Doe"
+        r"First Name[:\s]*([A-Za-z]+)",
+        r"Given Name[:\s]*([A-Za-z]+)",
+        r"Patient First Name[:\s]*([A-Za-z]+)",
+        r"First[:\s]*([A-Za-z]+)",
+        r"F\.?Name[:\s]*([A-Za-z]+)",
+        r"Patient[:\s]*([A-Za-z]+)\s+[A-Za-z]+",  # First word after "Patient:"
+        r"([A-Z][a-z]+)\s+[A-Z][a-z]+",  # Two capitalized words (common name pattern)
+    ]
+    
+    for pattern in patterns:
+        match = re.search(pattern, text, re.IGNORECASE)
+        if match:
+            name = match.group(1).strip()
+            # Filter out common non-name words
+            if name.lower() not in ['patient', 'name', 'first', 'last', 'given', 'surname']:
+                return name
+    
+    return None
+
+def legacy_extract_last_name(text: str) -> Optional[str]:
+    """Extract last name from text using various patterns."""
+    # Look for the specific pattern in your PDF
+    specific_pattern = r"Patient Name[^:]*?Patient Date of Birth\s*([A-Z][a-z]+)\s+([A-Z][a-z]+)"
+    match = re.search(specific_pattern, text, re.IGNORECASE)
+    if match:
+        first_name = match.group(1).strip()
+        last_name = match.group(2).strip()
+        # Filter out common non-name words
+        if (first_name.lower() not in ['patient', 'name', 'first', 'last', 'given', 'surname', 'and', 'address'] and
+            last_name.lower() not in ['patient', 'name', 'first', 'last', 'given', 'surname', 'and', 'address']):
+            return last_name
+    
+    # Fallback patterns
+    patterns = [
+        r"Name[:\s]*[A-Za-z]+\s+([A-Za-z]+)",  # Second word in "Name: John Doe"
+        r"Last Name[:\s]*([A-Za-z]+)",
+        r"Surname[:\s]*([A-Za-z]+)",
+        r"Patient Last Name[:\s]*([A-Za-z]+)",
+        r"Last[:\s]*([A-Za-z]+)",
+        r"L\.?Name[:\s]*([A-Za-z]+)",
+        r"Patient[:\s]*[A-Za-z]+\s+([A-Za-z]+)",  # Second word after "Patient:"
+        r"[A-Z][a-z]+\s+([A-Z][a-z]+)",  # Second capitalized word (common name pattern)
+    ]
+    
+    for pattern in patterns:
+        match = re.search(pattern, text, re.IGNORECASE)
+        if match:
+            name = match.group(1).strip()
+            # Filter out common non-name words
+            if name.lower() not in ['patient', 'name', 'first', 'last', 'given', 'surname']:
+                return name
+    
+    return None
+
+def legacy_extract_date_of_birth(text: str) -> Optional[datetime]:
+    """Extract date of birth from text using various patterns."""
+    patterns = [
+        r"Date of Birth[:\s]*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})",
+        r"DOB[:\s]*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})",
+        r"Birth Date[:\s]*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})",
+        r"Born[:\s]*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})",
+        r"Birth[:\s]*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})",
+        r"(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})",  # Any date pattern
+        r"(\d{4}-\d{2}-\d{2})",  # YYYY-MM-DD format
+    ]
+    
+    for pattern in patterns:
+        match = re.search(pattern, text, re.IGNORECASE)
+        if match:
+            date_str = match.group(1)
+            try:
+                # Try different date formats
+                for fmt in ["%m/%d/%Y", "%m/%d/%y", "%m-%d-%Y", "%m-%d-%y", "%Y-%m-%d"]:
+                    try:
+                        return datetime.strptime(date_str, fmt)
+                    except ValueError:
+                        continue
+            except:
+                continue
+    
+    return None
+
+
+FILLER_WORDS = (
+    "referral clinic diagnosis history medication dosage insurance provider "
+    "physician notes signature fax page of the and for with order request "
+    "continued assessment plan follow up laboratory results reviewed"
+).split()
+FIRST_NAMES = ["John", "Maria", "Ahmed", "Li", "Grace", "Oluwaseun", "Sofia", "Peter"]
+LAST_NAMES = ["Smith", "Garcia", "Khan", "Chen", "Okafor", "Rossi", "Novak", "Jones"]
+LAYOUTS = [
+    "Patient Name: {first} {last}\nDate of Birth: {dob}",
+    "Patient Name Patient Date of Birth\n{first} {last} {dob}",
+    "First Name: {first}\nLast Name: {last}\nDOB: {dob}",
+    "Patient: {first} {last} Born {dob}",
+    "{first} {last}\nBirth Date {dob}",
+]
+
+# Characters that re.IGNORECASE matches with ASCII letters although str.lower() does not map them to them
+# (LATIN SMALL LETTER LONG S, KELVIN SIGN) or that change length when lowercased; checked for equality only
+UNICODE_CASE_DOCUMENTS = [
+    "Firſt Name: John\nLaſt Name: Smith\nDOB: 01/02/1990",
+    "Patient: Maria Garcia Born 03/04/1985\nſurname: Rossi",
+    "Patient Name: \u212aaren Jones\nDate of Birth: 05/06/1970",
+    "Notes by \u0130brahim Okafor\nPatient Name: Peter Novak\nDOB: 07/08/1960",
+]
+
+def _ocr_line(rng: random.Random) -> str:
+    words = [rng.choice(FILLER_WORDS) for _ in range(rng.randint(6, 14))]
+    if rng.random() < 0.1:
+        words.append(f"{rng.randint(1, 12)}/{rng.randint(1, 28)}/{rng.randint(2000, 2024)}")
+    return " ".join(words)
+
+def make_document(rng: random.Random, pages: int) -> str:
+    """Synthetic OCR output: noisy filler pages with the patient block on a random page."""
+    patient_page = rng.choice([0, 0, 0, rng.randrange(pages)])
+    layout = rng.choice(LAYOUTS)
+    dob = f"{rng.randint(1, 12):02d}/{rng.randint(1, 28):02d}/{rng.randint(1930, 2020)}"
+    text_pages = []
+    for page in range(pages):
+        lines = [_ocr_line(rng) for _ in range(40)]
+        if page == patient_page and rng.random() < 0.9:
+            lines.insert(rng.randrange(len(lines)), layout.format(
+                first=rng.choice(FIRST_NAMES), last=rng.choice(LAST_NAMES), dob=dob
+            ))
+        text_pages.append("\n".join(lines))
+    return "\n\f".join(text_pages)
+
+def run_legacy(text: str):
+    return legacy_extract_first_name(text), legacy_extract_last_name(text), legacy_extract_date_of_birth(text)
+
+def run_compiled(text: str):
+    fields = extract_fields(text)
+    return tuple(match.value if match else None for match in fields)
+
+def time_it(func, documents: List[str], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for document in documents:
+            func(document)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--documents", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    documents = [make_document(rng, args.pages) for _ in range(args.documents)]
+    total_mb = sum(len(document) for document in documents) / 1e6
+
+    mismatches = sum(1 for document in documents + UNICODE_CASE_DOCUMENTS if run_legacy(document) != run_compiled(document))
+    legacy_time = time_it(run_legacy, documents, args.repeat)
+    compiled_time = time_it(run_compiled, documents, args.repeat)
+
+    print(f"{args.documents} documents x {args.pages} pages ({total_mb:.1f} MB of text)")
+    print(f"legacy   : {legacy_time * 1000 / args.documents:8.2f} ms/document")
+    print(f"compiled : {compiled_time * 1000 / args.documents:8.2f} ms/document")
+    print(f"speedup  : {legacy_time / compiled_time:8.2f}x")
+    print(f"mismatches: {mismatches}")
+    return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Benchmark: list responses of /orders/ and /activity-logs/ built from Pydantic models (ORM objects validated
+one by one, then JSON-encoded) vs. the fast path (row tuples of the needed columns serialized with orjson).
+Times the query plus serialization in-process and the whole GET request through the app, and checks that
+both paths return the same JSON. Builds a throwaway SQLite database.
+Run with: python benchmarks/bench_list_serialization.py [--rows 20000] [--limit 1000] [--repeat 50]
+                                                        [--save-baseline FILE | --baseline FILE --threshold 0.2]
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# The app binds its engine at import time, so point it at the benchmark database first
+DATABASE_DIRECTORY = tempfile.mkdtemp(prefix="bench_list_serialization_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(DATABASE_DIRECTORY, 'lists.db')}"
+os.environ["METRICS_ENABLED"] = "false"
+os.environ["WARMUP_ENABLED"] = "false"
+
+from results import add_baseline_arguments, check_baseline, print_report, summarize
+
+LETTERS = "abcdefghijklmnopqrstuvwxyz"
+ENDPOINTS = ["/orders/", "/orders/{order_id}", "/upload/", "/activity-logs/"]
+
+def load_rows(engine, count: int, seed: int):
+    rng = random.Random(seed)
+    started = datetime.utcnow() - timedelta(days=1)
+    orders, logs = [], []
+    for index in range(count):
+        created_at = started + timedelta(seconds=index)
+        orders.append((
+            "".join(rng.choice(LETTERS) for _ in range(8)).capitalize(),
+            "".join(rng.choice(LETTERS) for _ in range(10)).capitalize(),
+            datetime(1930, 1, 1) + timedelta(days=rng.randrange(33000)), created_at, created_at
+        ))
+        endpoint = rng.choice(ENDPOINTS)
+        logs.append((
+            rng.choice(["CREATE", "READ", "UPDATE", "UPLOAD"]), endpoint, endpoint, rng.choice(["GET", "POST", "PUT"]),
+            created_at, None, rng.random() * 50, rng.choice([200, 200, 200, 404]), rng.randrange(100, 5000), "127.0.0.1"
+        ))
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.executemany(
+            "INSERT INTO orders (first_name, last_name, date_of_birth, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+            orders
+        )
+        cursor.executemany(
+            "INSERT INTO activity_logs (action, endpoint, route, method, timestamp, details, duration_ms, status_code, "
+            "response_bytes, client) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", logs
+        )
+        connection.commit()
+    finally:
+        connection.close()
+
+def time_calls(func: Callable[[], bytes], repeat: int) -> List[float]:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000, help="orders and activity logs to load")
+    parser.add_argument("--limit", type=int, default=1000, help="page size requested")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=1234)
+    add_baseline_arguments(parser)
+    args = parser.parse_args()
+
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+    from fastapi.testclient import TestClient
+    from app import crud, schemas, serialization
+    from app.database import SessionLocal, create_tables, engine
+    from app.main import app
+
+    try:
+        create_tables()
+        load_rows(engine, args.rows, args.seed)
+
+        lists = {
+            "orders": (crud.get_orders, schemas.Order, crud.ORDER_RESPONSE_COLUMNS, crud.ORDER_RESPONSE_FIELDS),
+            "activity_logs": (crud.get_activity_logs, schemas.ActivityLog, crud.ACTIVITY_LOG_RESPONSE_COLUMNS,
+                              crud.ACTIVITY_LOG_RESPONSE_FIELDS),
+        }
+        results: Dict[str, Dict[str, float]] = {}
+        db = SessionLocal()
+        try:
+            for name, (query, schema, columns, fields) in lists.items():
+                def models_path() -> bytes:
+                    # What FastAPI does with a response_model: validate every object, then encode
+                    objects = query(db, limit=args.limit)
+                    return JSONResponse(jsonable_encoder([schema.from_orm(item) for item in objects])).body
+
+                def rows_path() -> bytes:
+                    return serialization.rows_response(query(db, limit=args.limit, columns=columns), fields).body
+
+                if json.loads(models_path()) != json.loads(rows_path()):
+                    print(f"{name}: the two paths return different JSON")
+                    return 1
+                results[f"{name}[models]"] = summarize(time_calls(models_path, args.repeat))
+                results[f"{name}[rows]"] = summarize(time_calls(rows_path, args.repeat))
+        finally:
+            db.close()
+
+        with TestClient(app) as client:
+            for path in ("/orders/", "/activity-logs/"):
+                url = f"{path}?limit={args.limit}"
+                for label, fast in (("models", False), ("rows", True)):
+                    serialization.FAST_LIST_RESPONSES = fast
+                    results[f"GET {path}[{label}]"] = summarize(time_calls(lambda: client.get(url).content, args.repeat))
+    finally:
+        shutil.rmtree(DATABASE_DIRECTORY, ignore_errors=True)
+
+    encoder = "orjson" if serialization.orjson is not None else "json (orjson not installed)"
+    print(f"{args.limit} rows per page of {args.rows}, {args.repeat} rounds, fast path encoder: {encoder}")
+    print_report(results, unit="pages/s")
+    return check_baseline(results, args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Benchmark: /orders/search queries with the name and date of birth indexes vs. the same queries on a full scan.
+Also checks that the /orders/ last_name and /activity-logs/ endpoint prefix filters are served by their indexes
+and match case the documented way (exits 1 if not).
+Builds a throwaway SQLite database; 10M orders take a few minutes to load and about 1.5 GB of disk.
+Run with: python benchmarks/bench_order_search.py [--orders 10000000] [--queries 200] [--fuzzy]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from typing import Callable, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# The app binds its engine at import time, so point it at the benchmark database first
+DATABASE_PATH = os.path.join(tempfile.mkdtemp(prefix="bench_order_search_"), "orders.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DATABASE_PATH}"
+os.environ["METRICS_ENABLED"] = "false"
+
+SYLLABLES = ["an", "ber", "car", "dan", "el", "fer", "gar", "hol", "is", "jen", "kar", "lin", "mor", "nel",
+             "os", "par", "quin", "ros", "son", "tor", "ul", "van", "wil", "xan", "yor", "zel"]
+INSERT_BATCH = 50000
+
+def make_name(rng: random.Random) -> str:
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))).capitalize()
+
+def load_orders(engine, count: int, seed: int):
+    rng = random.Random(seed)
+    first_dob = datetime(1930, 1, 1)
+    now = datetime.utcnow()
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        for start in range(0, count, INSERT_BATCH):
+            rows = [
+                (make_name(rng), make_name(rng), first_dob + timedelta(days=rng.randrange(33000)), now, now)
+                for _ in range(min(INSERT_BATCH, count - start))
+            ]
+            cursor.executemany(
+                "INSERT INTO orders (first_name, last_name, date_of_birth, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)", rows
+            )
+            connection.commit()
+    finally:
+        connection.close()
+
+def make_queries(rng: random.Random, count: int) -> List[dict]:
+    queries = []
+    for index in range(count):
+        kind = index % 4
+        if kind == 0:
+            queries.append({"last_name": make_name(rng)})
+        elif kind == 1:
+            queries.append({"last_name": make_name(rng)[:3].lower()})
+        elif kind == 2:
+            queries.append({"last_name": make_name(rng).upper(), "first_name": make_name(rng)[:2]})
+        else:
+            queries.append({"date_of_birth": date(1930, 1, 1) + timedelta(days=rng.randrange(33000))})
+    return queries
+
+def time_queries(run: Callable[[dict], list], queries: List[dict]) -> List[float]:
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        run(query)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def report(label: str, timings: List[float]):
+    timings = sorted(timings)
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    print(f"{label:<10}: p50 {statistics.median(timings) * 1000:9.2f} ms   p95 {p95 * 1000:9.2f} ms")
+
+def check_list_filters(db, engine) -> List[str]:
+    """Problems with the list filters: a plan that scans instead of using the index, or the wrong case rule."""
+    from sqlalchemy import text
+    from app import crud, models
+
+    def plan(query) -> str:
+        sql = str(query.statement.compile(engine, compile_kwargs={"literal_binds": True}))
+        with engine.connect() as connection:
+            return " / ".join(row[-1] for row in connection.exec_driver_sql("EXPLAIN QUERY PLAN " + sql))
+
+    problems = []
+    orders = crud.filter_orders(db.query(models.Order), last_name="Sm")
+    if "ix_orders_name_search" not in plan(orders):
+        problems.append(f"last_name filter does not use ix_orders_name_search: {plan(orders)}")
+    # Case-insensitive: any casing of the prefix returns the same orders
+    name = db.query(models.Order.last_name).first()[0]
+    found = [{order.id for order in crud.get_orders(db, limit=100000, last_name=prefix)}
+             for prefix in (name[:3], name[:3].upper(), name[:3].lower())]
+    if not found[0] or found[1] != found[0] or found[2] != found[0]:
+        problems.append(f"last_name filter is not case-insensitive for {name[:3]!r}")
+
+    logs = crud.filter_activity_logs(db.query(models.ActivityLog), endpoint="/orders")
+    if "ix_activity_logs_endpoint_timestamp" not in plan(logs):
+        problems.append(f"endpoint filter does not use ix_activity_logs_endpoint_timestamp: {plan(logs)}")
+    # Case-sensitive: paths differing only in case are different endpoints
+    with engine.begin() as connection:
+        for endpoint in ("/orders/1", "/Orders/2", "/orders%/3"):
+            connection.execute(text(
+                "INSERT INTO activity_logs (action, endpoint, method, timestamp) VALUES ('READ', :endpoint, 'GET', :now)"
+            ), {"endpoint": endpoint, "now": datetime.utcnow()})
+    matched = sorted(log.endpoint for log in crud.get_activity_logs(db, endpoint="/orders"))
+    if matched != ["/orders%/3", "/orders/1"] or [log.endpoint for log in crud.get_activity_logs(db, endpoint="/orders%")] != ["/orders%/3"]:
+        problems.append(f"endpoint filter is not an exact case-sensitive prefix match: {matched}")
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--orders", type=int, default=10_000_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--scan-queries", type=int, default=8, help="queries timed without indexes (each is a full scan)")
+    parser.add_argument("--fuzzy", action="store_true", help="also time trigram (FTS5) search")
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args()
+    if args.fuzzy:
+        os.environ["ORDER_SEARCH_FUZZY"] = "true"
+
+    from sqlalchemy import text
+    from app.database import SessionLocal, create_tables, engine
+    from app import search
+
+    create_tables()
+    start = time.perf_counter()
+    # Loading first and indexing afterwards is much faster than maintaining the indexes row by row
+    with engine.begin() as connection:
+        connection.execute(text("DROP INDEX ix_orders_name_search"))
+        connection.execute(text("DROP INDEX ix_orders_date_of_birth"))
+    load_orders(engine, args.orders, args.seed)
+    create_tables()
+    print(f"loaded and indexed {args.orders} orders in {time.perf_counter() - start:.1f} s ({DATABASE_PATH})")
+    with engine.begin() as connection:
+        connection.execute(text("ANALYZE"))
+
+    queries = make_queries(random.Random(args.seed + 1), args.queries)
+    db = SessionLocal()
+    try:
+        def run(query):
+            return search.search_orders(db, **query)
+
+        problems = check_list_filters(db, engine)
+        for problem in problems:
+            print(f"list filters: {problem}")
+
+        indexed = time_queries(run, queries)
+        report("indexed", indexed)
+        if args.fuzzy:
+            fuzzy_queries = [query for query in queries if "last_name" in query and len(query["last_name"]) >= 3]
+            report("fuzzy", time_queries(lambda query: search.search_orders(db, fuzzy=True, **query), fuzzy_queries))
+
+        with engine.begin() as connection:
+            connection.execute(text("DROP INDEX ix_orders_name_search"))
+            connection.execute(text("DROP INDEX ix_orders_date_of_birth"))
+        # Every query kind once per round, so the scan sample matches the indexed mix
+        scan_queries = queries[:max(args.scan_queries, 4)]
+        scanned = time_queries(run, scan_queries)
+        report("full scan", scanned)
+        print(f"speedup   : {statistics.median(scanned) / statistics.median(indexed[:len(scan_queries)]):9.1f}x (p50)")
+    finally:
+        db.close()
+        os.remove(DATABASE_PATH)
+        os.rmdir(os.path.dirname(DATABASE_PATH))
+    return 1 if problems else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Synthetic PDF corpus: referral-style documents with a known patient, as text-layer or scanned (image-only) PDFs.
+Used by the other benchmarks; can also write a corpus to disk with a manifest of the expected fields.
+Run with: python benchmarks/corpus.py OUTPUT_DIR [--documents 40] [--pages 1,5,20] [--scanned 0.25]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+from io import BytesIO
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+FILLER_WORDS = (
+    "referral clinic diagnosis history medication dosage insurance provider "
+    "physician notes signature fax page of the and for with order request "
+    "continued assessment plan follow up laboratory results reviewed"
+).split()
+FIRST_NAMES = ["John", "Maria", "Ahmed", "Grace", "Sofia", "Peter", "Amara", "Daniel", "Helen", "Tomas"]
+LAST_NAMES = ["Smith", "Garcia", "Khan", "Okafor", "Rossi", "Novak", "Jones", "Larsen", "Moreau", "Tanaka"]
+# Patient blocks the extractor recognizes, one line per list item
+LAYOUTS = [
+    ["Patient Name: {first} {last}", "Date of Birth: {dob}"],
+    ["First Name: {first}", "Last Name: {last}", "DOB: {dob}"],
+    ["Patient: {first} {last} Born {dob}"],
+]
+LINES_PER_PAGE = 40
+PAGE_WIDTH, PAGE_HEIGHT = 612, 792  # points (US Letter)
+
+def make_patient(rng: random.Random) -> Dict[str, str]:
+    return {
+        "first_name": rng.choice(FIRST_NAMES),
+        "last_name": rng.choice(LAST_NAMES),
+        "date_of_birth": f"{rng.randint(1930, 2020)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+    }
+
+def document_pages(rng: random.Random, patient: Dict[str, str], page_count: int) -> List[List[str]]:
+    """Lines of every page: filler text with the patient block near the top of the first page."""
+    pages = [
+        [" ".join(rng.choice(FILLER_WORDS) for _ in range(rng.randint(6, 12))) for _ in range(LINES_PER_PAGE)]
+        for _ in range(page_count)
+    ]
+    year, month, day = patient["date_of_birth"].split("-")
+    block = [line.format(first=patient["first_name"], last=patient["last_name"], dob=f"{month}/{day}/{year}")
+             for line in rng.choice(LAYOUTS)]
+    position = rng.randint(2, 8)
+    pages[0][position:position] = block
+    return pages
+
+def _pdf_string(text: str) -> str:
+    return "(" + text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ")"
+
+def make_text_pdf(pages: Sequence[Sequence[str]]) -> bytes:
+    """PDF with a Helvetica text layer, one line of text per list item."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>"]
+    kids = " ".join(f"{3 + 2 * index} 0 R" for index in range(len(pages)))
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>")
+    font_id = 3 + 2 * len(pages)
+    for index, lines in enumerate(pages):
+        stream = "BT /F1 10 Tf 12 TL 50 750 Td " + " ".join(f"{_pdf_string(line)} Tj T*" for line in lines) + " ET"
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+            f"/Contents {4 + 2 * index} 0 R /Resources << /Font << /F1 {font_id} 0 R >> >> >>"
+        )
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+    objects.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    output = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    output += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    output += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return output
+
+def make_scanned_pdf(pages: Sequence[Sequence[str]], dpi: int = 150) -> bytes:
+    """Image-only PDF, as a fax or scanner produces: every page is a rendered grayscale bitmap."""
+    from PIL import Image, ImageDraw, ImageFont
+
+    scale = dpi / 72
+    try:
+        font = ImageFont.load_default(size=int(10 * scale))
+    except TypeError:  # Pillow < 10.1 has a single small bitmap font
+        font = ImageFont.load_default()
+    images = []
+    for lines in pages:
+        image = Image.new("L", (int(PAGE_WIDTH * scale), int(PAGE_HEIGHT * scale)), 255)
+        draw = ImageDraw.Draw(image)
+        for number, line in enumerate(lines):
+            draw.text((50 * scale, (42 + 12 * number) * scale), line, fill=0, font=font)
+        images.append(image)
+    output = BytesIO()
+    images[0].save(output, "PDF", resolution=dpi, save_all=True, append_images=images[1:])
+    return output.getvalue()
+
+def generate(
+    rng: random.Random, documents: int, page_counts: Sequence[int] = (1, 5, 20), scanned: float = 0.25
+) -> Iterator[Tuple[Dict, bytes]]:
+    """(manifest entry, PDF bytes) pairs cycling through page_counts; a share of them scanned."""
+    for index in range(documents):
+        patient = make_patient(rng)
+        page_count = page_counts[index % len(page_counts)]
+        kind = "scanned" if rng.random() < scanned else "text"
+        pages = document_pages(rng, patient, page_count)
+        pdf = make_scanned_pdf(pages) if kind == "scanned" else make_text_pdf(pages)
+        yield {"file": f"{index:04d}_{kind}_{page_count}p.pdf", "kind": kind, "pages": page_count, **patient}, pdf
+
+def write_corpus(directory: str, **kwargs) -> List[Dict]:
+    os.makedirs(directory, exist_ok=True)
+    manifest = []
+    for entry, pdf in generate(**kwargs):
+        with open(os.path.join(directory, entry["file"]), "wb") as pdf_file:
+            pdf_file.write(pdf)
+        manifest.append(entry)
+    with open(os.path.join(directory, "manifest.json"), "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    return manifest
+
+def load_corpus(directory: str) -> List[Tuple[Dict, bytes]]:
+    with open(os.path.join(directory, "manifest.json")) as manifest_file:
+        manifest = json.load(manifest_file)
+    corpus = []
+    for entry in manifest:
+        with open(os.path.join(directory, entry["file"]), "rb") as pdf_file:
+            corpus.append((entry, pdf_file.read()))
+    return corpus
+
+def parse_page_counts(value: str) -> List[int]:
+    return [int(count) for count in value.split(",") if count]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("output")
+    parser.add_argument("--documents", type=int, default=40)
+    parser.add_argument("--pages", type=parse_page_counts, default=[1, 5, 20], help="comma-separated page counts")
+    parser.add_argument("--scanned", type=float, default=0.25, help="share of scanned documents")
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args()
+
+    manifest = write_corpus(
+        args.output, rng=random.Random(args.seed), documents=args.documents, page_counts=args.pages, scanned=args.scanned
+    )
+    scanned = sum(1 for entry in manifest if entry["kind"] == "scanned")
+    print(f"wrote {len(manifest)} PDFs ({scanned} scanned) and manifest.json to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+End-to-end load scenarios against the API: order CRUD, cached order reads, order listing, PDF uploads,
+retried PDF uploads (with Idempotency-Key), activity log reads, and uploads mixed with order reads (to see that
+admission control keeps reads fast under OCR load), each run by concurrent clients for a fixed duration.
+Without --url a local uvicorn server is started on a throwaway SQLite database.
+Run with: python benchmarks/load_test.py [--url http://localhost:8000] [--duration 10] [--concurrency 8]
+                                         [--scenarios crud,read,list,upload,upload_retries,activity_logs,
+                                                      mixed]
+                                         [--save-baseline FILE | --baseline FILE --threshold 0.2]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Tuple
+
+import requests
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from corpus import document_pages, make_patient, make_text_pdf
+from results import add_baseline_arguments, check_baseline, print_report, summarize
+
+SCENARIOS = ["crud", "read", "list", "upload", "upload_retries", "activity_logs", "mixed"]
+
+class Recorder:
+    """Latencies and error counts per request label, shared by all client threads."""
+
+    def __init__(self):
+        self.timings: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def request(self, label: str, session: requests.Session, method: str, url: str, **kwargs) -> requests.Response:
+        started = time.perf_counter()
+        try:
+            response = session.request(method, url, timeout=60, **kwargs)
+            ok = response.status_code < 400
+        except requests.RequestException:
+            response, ok = None, False
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.timings[label].append(elapsed)
+            if not ok:
+                self.errors[label] += 1
+        return response
+
+def random_order(rng: random.Random) -> dict:
+    # Random names so duplicate-patient detection does not merge the orders
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return {
+        "first_name": "".join(rng.choice(letters) for _ in range(8)).capitalize(),
+        "last_name": "".join(rng.choice(letters) for _ in range(10)).capitalize(),
+        "date_of_birth": f"{rng.randint(1930, 2020)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T00:00:00",
+    }
+
+def crud_step(recorder: Recorder, session: requests.Session, base: str, rng: random.Random, state: dict):
+    response = recorder.request("orders.create", session, "POST", f"{base}/orders/", json=random_order(rng))
+    if response is None or response.status_code != 200:
+        return
+    order_id = response.json()["id"]
+    recorder.request("orders.read", session, "GET", f"{base}/orders/{order_id}")
+    recorder.request("orders.update", session, "PUT", f"{base}/orders/{order_id}", json={"first_name": "Updated"})
+    recorder.request("orders.delete", session, "DELETE", f"{base}/orders/{order_id}")
+
+def read_step(recorder: Recorder, session: requests.Session, base: str, rng: random.Random, state: dict):
+    recorder.request("orders.read_cached", session, "GET", f"{base}/orders/{rng.choice(state['order_ids'])}")
+
+def list_step(recorder: Recorder, session: requests.Session, base: str, rng: random.Random, state: dict):
+    # Walk the keyset pages from the start, like a client syncing orders
+    params = {"limit": 100}
+    cursor = state.get("cursor")
+    if cursor:
+        params["cursor"] = cursor
+    response = recorder.request("orders.list", session, "GET", f"{base}/orders/", params=params)
+    if response is not None:
+        state["cursor"] = response.headers.get("X-Next-Cursor")
+
+def upload_step(recorder: Recorder, session: requests.Session, base: str, rng: random.Random, state: dict):
+    name, pdf = rng.choice(state["documents"])
+    recorder.request("upload", session, "POST", f"{base}/upload/", files={"file": (name, pdf, "application/pdf")})
+
+def upload_retries_step(recorder: Recorder, session: requests.Session, base: str, rng: random.Random, state: dict):
+    # Clients re-sending a few uploads with their Idempotency-Key, as after client-side timeouts
+    index = rng.randrange(min(10, len(state["documents"])))
+    name, pdf = state["documents"][index]
+    recorder.request("upload.retry", session, "POST", f"{base}/upload/", files={"file": (name, pdf, "application/pdf")},
+                     headers={"Idempotency-Key": f"{state['run_id']}-{index}"})
+
+def activity_logs_step(recorder: Recorder, session: requests.Session, base: str, rng: random.Random, state: dict):
+    recorder.request("activity_logs.list", session, "GET", f"{base}/activity-logs/", params={"limit": 100})
+    recorder.request("activity_logs.stats", session, "GET", f"{base}/activity-logs/stats")
+
+def mixed_step(recorder: Recorder, session: requests.Session, base: str, rng: random.Random, state: dict):
+    # Half the clients upload and half read orders; the reads should stay as fast as in the read scenario
+    if state["client"] % 2 == 0:
+        name, pdf = rng.choice(state["documents"])
+        recorder.request("mixed.upload", session, "POST", f"{base}/upload/", files={"file": (name, pdf, "application/pdf")})
+    else:
+        recorder.request("mixed.read", session, "GET", f"{base}/orders/{rng.choice(state['order_ids'])}")
+
+STEPS: Dict[str, Callable] = {
+    "crud": crud_step,
+    "read": read_step,
+    "list": list_step,
+    "upload": upload_step,
+    "upload_retries": upload_retries_step,
+    "activity_logs": activity_logs_step,
+    "mixed": mixed_step,
+}
+
+def seed(base: str, orders: int, documents: int, seed_value: int) -> dict:
+    """Orders for the read and list scenarios and distinct PDFs for the upload scenario."""
+    # Separate streams for seeding and each client, or clients would recreate (and delete) seeded patients
+    rng = random.Random(f"{seed_value}:seed")
+    order_ids = []
+    with requests.Session() as session:
+        for start in range(0, orders, 1000):
+            batch = [random_order(rng) for _ in range(min(1000, orders - start))]
+            response = session.post(f"{base}/orders/bulk", json=batch, timeout=120)
+            response.raise_for_status()
+            order_ids.extend(result["id"] for result in response.json()["results"])
+    # Uploads of a document after the first hit the extraction cache; raise --seed-documents to avoid repeats
+    pdfs = []
+    for index in range(documents):
+        pages = document_pages(rng, make_patient(rng), rng.choice([1, 2, 5]))
+        pdfs.append((f"load_{index}.pdf", make_text_pdf(pages)))
+    # Idempotency keys are unique per run, so a long-running server does not replay an earlier run's responses
+    return {"order_ids": order_ids, "documents": pdfs, "run_id": uuid.uuid4().hex}
+
+def run_scenario(step: Callable, base: str, state: dict, duration: float, concurrency: int,
+                 seed_value: int) -> Tuple[Recorder, float]:
+    recorder = Recorder()
+    deadline = time.perf_counter() + duration
+
+    def client(number: int):
+        rng = random.Random(f"{seed_value}:client:{number}")
+        client_state = dict(state, client=number)
+        with requests.Session() as session:
+            while time.perf_counter() < deadline:
+                step(recorder, session, base, rng, client_state)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(client, range(concurrency)))
+    return recorder, time.perf_counter() - started
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_server(workers: int) -> Tuple[subprocess.Popen, str, str]:
+    """uvicorn on a free port with a fresh SQLite database; returns (process, base URL, database path)."""
+    database = os.path.join(tempfile.mkdtemp(prefix="genhealth_load_"), "load.db")
+    port = free_port()
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{database}", WEB_CONCURRENCY=str(workers))
+    # Every client connects from 127.0.0.1, so per-client upload rate limits would throttle the whole test
+    env.setdefault("ADMISSION_UPLOAD_RATE", "0")
+    env.setdefault("ADMISSION_UPLOAD_CLIENT_CONCURRENCY", "0")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--workers", str(workers),
+         "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL
+    )
+    base = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f"{base}/", timeout=1).status_code == 200:
+                return process, base, database
+        except requests.RequestException:
+            pass
+        if process.poll() is not None:
+            break
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("Server did not start")
+
+def parse_scenarios(value: str) -> List[str]:
+    scenarios = [scenario for scenario in value.split(",") if scenario]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    return scenarios
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="API to test (default: start a local server)")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers of the local server")
+    parser.add_argument("--scenarios", type=parse_scenarios, default=SCENARIOS, help="comma-separated scenarios")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per scenario")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent clients")
+    parser.add_argument("--seed-orders", type=int, default=2000)
+    parser.add_argument("--seed-documents", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1234)
+    add_baseline_arguments(parser)
+    args = parser.parse_args()
+
+    process = None
+    base = args.url.rstrip("/") if args.url else None
+    if base is None:
+        process, base, database = start_server(args.workers)
+        print(f"started local server at {base} ({database})")
+    try:
+        state = seed(base, args.seed_orders, args.seed_documents, args.seed)
+        results = {}
+        for scenario in args.scenarios:
+            recorder, elapsed = run_scenario(STEPS[scenario], base, state, args.duration, args.concurrency, args.seed)
+            for label, timings in recorder.timings.items():
+                results[label] = summarize(timings, errors=recorder.errors[label], elapsed=elapsed)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+            shutil.rmtree(os.path.dirname(database), ignore_errors=True)
+
+    print(f"{args.concurrency} clients, {args.duration:g} s per scenario against {base}")
+    print_report(results, unit="req/s")
+    return check_baseline(results, args)
+
+if __name__ == "__main__":
+    sys.exit(main())
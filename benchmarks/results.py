@@ -0,0 +1,80 @@
+"""
+Shared result handling for the benchmarks: latency summaries, a report table and
+baseline files for regression checks (--save-baseline, then --baseline with --threshold).
+"""
+
+import json
+import statistics
+from typing import Dict, List, Optional
+
+# Metrics compared against a baseline; latencies regress upwards, throughput downwards
+LATENCY_METRICS = ("p50_ms", "p95_ms")
+THROUGHPUT_METRIC = "throughput"
+
+def summarize(timings: List[float], errors: int = 0, elapsed: Optional[float] = None) -> Dict[str, float]:
+    """Latency percentiles in milliseconds and operations per second (over elapsed, else the summed timings)."""
+    ordered = sorted(timings)
+    if not ordered:
+        return {"count": 0, "errors": errors, "throughput": 0.0, "mean_ms": 0.0, "p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0}
+
+    def percentile(fraction: float) -> float:
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] * 1000
+
+    elapsed = elapsed or sum(ordered)
+    return {
+        "count": len(ordered),
+        "errors": errors,
+        "throughput": len(ordered) / elapsed if elapsed else 0.0,
+        "mean_ms": statistics.mean(ordered) * 1000,
+        "p50_ms": percentile(0.5),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+    }
+
+def print_report(results: Dict[str, Dict[str, float]], unit: str = "ops/s"):
+    width = max([len(name) for name in results] + [9])
+    print(f"{'benchmark':<{width}}  {'count':>7}  {'errors':>6}  {unit:>9}  {'mean ms':>9}  {'p50 ms':>9}  {'p95 ms':>9}  {'p99 ms':>9}")
+    for name, result in results.items():
+        print(
+            f"{name:<{width}}  {result['count']:>7}  {result['errors']:>6}  {result['throughput']:>9.1f}  "
+            f"{result['mean_ms']:>9.2f}  {result['p50_ms']:>9.2f}  {result['p95_ms']:>9.2f}  {result['p99_ms']:>9.2f}"
+        )
+
+def add_baseline_arguments(parser):
+    parser.add_argument("--save-baseline", metavar="FILE", help="write the results as a baseline JSON file")
+    parser.add_argument("--baseline", metavar="FILE", help="compare the results against a saved baseline")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="allowed relative slowdown before a benchmark counts as a regression (default 0.2 = 20%%)")
+
+def regressions(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], threshold: float) -> List[str]:
+    """Descriptions of every metric that got worse than the baseline by more than threshold."""
+    found = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if not previous or not result["count"]:
+            continue
+        for metric in LATENCY_METRICS:
+            if previous[metric] > 0 and result[metric] > previous[metric] * (1 + threshold):
+                found.append(f"{name} {metric}: {previous[metric]:.2f} -> {result[metric]:.2f}")
+        if result[THROUGHPUT_METRIC] < previous[THROUGHPUT_METRIC] * (1 - threshold):
+            found.append(f"{name} {THROUGHPUT_METRIC}: {previous[THROUGHPUT_METRIC]:.1f} -> {result[THROUGHPUT_METRIC]:.1f}")
+    return found
+
+def check_baseline(results: Dict[str, Dict[str, float]], args) -> int:
+    """Save and/or compare against a baseline as requested on the command line; returns the exit status."""
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as baseline_file:
+            json.dump(results, baseline_file, indent=2, sort_keys=True)
+        print(f"saved baseline to {args.save_baseline}")
+    if not args.baseline:
+        return 0
+    with open(args.baseline) as baseline_file:
+        baseline = json.load(baseline_file)
+    found = regressions(results, baseline, args.threshold)
+    if found:
+        print(f"{len(found)} regression(s) beyond {args.threshold:.0%}:")
+        for regression in found:
+            print(f"  {regression}")
+        return 1
+    print(f"no regressions beyond {args.threshold:.0%} against {args.baseline}")
+    return 0
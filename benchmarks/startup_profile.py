@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Cold-start profile: imports the app in fresh interpreters with -X importtime and reports the import time
+of the app and of the packages it pulls in. Fails when a module that should load lazily (PyPDF2 and the
+OCR stack by default) is imported at startup.
+Run with: python benchmarks/startup_profile.py [--runs 10] [--module app.main] [--top 15]
+                                               [--lazy PyPDF2,pypdfium2,tesserocr,pytesseract,pdf2image,PIL]
+                                               [--save-baseline FILE | --baseline FILE --threshold 0.2]
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+from results import add_baseline_arguments, check_baseline, print_report, summarize
+
+# Imported on first use by app.utils and app.uploads; loading them at startup is a regression
+LAZY_MODULES = ["PyPDF2", "pypdfium2", "tesserocr", "pytesseract", "pdf2image", "PIL"]
+
+def import_times(module: str, env: Dict[str, str]) -> List[Tuple[str, float, float]]:
+    """(module, self seconds, cumulative seconds) of every module imported by `import module` in a new interpreter."""
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True
+    )
+    times = []
+    for line in process.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        times.append((name.strip(), int(self_us) / 1e6, int(cumulative_us) / 1e6))
+    return times
+
+def parse_modules(value: str) -> List[str]:
+    return [module for module in value.split(",") if module]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app.main", help="module to import (default: app.main)")
+    parser.add_argument("--runs", type=int, default=10, help="fresh interpreters to import it in")
+    parser.add_argument("--top", type=int, default=15, help="packages to report, by import time")
+    parser.add_argument("--lazy", type=parse_modules, default=LAZY_MODULES,
+                        help="comma-separated modules that must not be imported at startup")
+    add_baseline_arguments(parser)
+    args = parser.parse_args()
+
+    # Importing the app must not touch a real database
+    directory = tempfile.mkdtemp(prefix="genhealth_startup_")
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(directory, 'startup.db')}")
+    totals = []
+    packages: Dict[str, List[float]] = defaultdict(list)
+    imported = set()
+    try:
+        for _ in range(args.runs):
+            times = import_times(args.module, env)
+            per_package: Dict[str, float] = defaultdict(float)
+            for name, self_seconds, cumulative_seconds in times:
+                imported.add(name)
+                # Self time attributed to the top-level package, so each module is counted once
+                per_package[name.split(".")[0]] += self_seconds
+                if name == args.module:
+                    totals.append(cumulative_seconds)
+            for package, seconds in per_package.items():
+                packages[package].append(seconds)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    results = {f"import {args.module}": summarize(totals)}
+    slowest = sorted(packages, key=lambda package: sum(packages[package]), reverse=True)[:args.top]
+    for package in slowest:
+        results[package] = summarize(packages[package])
+
+    print(f"import {args.module} in {args.runs} fresh interpreters ({len(imported)} modules); packages by self time")
+    print_report(results, unit="imports/s")
+
+    status = check_baseline(results, args)
+    eager = [module for module in args.lazy if module in imported]
+    if eager:
+        print(f"imported at startup but expected to load lazily: {', '.join(eager)}")
+        return 1
+    print(f"lazy modules not imported at startup: {', '.join(args.lazy)}")
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())